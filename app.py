@@ -1,40 +1,146 @@
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, g, Response
 import os
-from services.database_service import SessionLocal, VisaApplication, Applicant, Notification, AuditLog
+import time
+import hashlib
+import datetime
+from services.database_service import SessionLocal, VisaApplication, Applicant, Notification, AuditLog, init_db
 from services.openai_service import OpenAIService
 from services.verification_service import VerificationService
 from services.notification_service import NotificationService
-from services.client_alert_service import ClientAlertService
+from services.client_alert_service import ClientAlertService, find_alert_candidates
 from services.assistant_service import AssistantService
+from services.metrics_service import metrics
+from services.retention_service import RetentionService
+from services.extracted_data_service import ExtractedDataService
+from services.application_feed import ApplicationFeed, parse_fields, DEFAULT_PAGE_SIZE
+from services.stats_counters import dashboard_stats
+from services.aggregation_service import AggregationService, parse_group_by
+from services.event_bus import EventBus, format_sse
+from services.service_registry import registry
+from services.job_runner import JobRunner, stage_progress
+from services.conversation_store import ConversationStore
+from core.tracing import stage_latency_percentiles
 from sqlalchemy import desc
 
 app = Flask(__name__)
 
-# Initialize AI Assistant (lazy loading to avoid errors if TAVILY_API_KEY not set)
-assistant = None
+# The web process reads tables and columns added by migrations (stat_counters, summary, extracted_*),
+# so it brings the schema up to date itself instead of relying on an agent run having done it
+init_db()
 
-def get_assistant():
-    global assistant
-    if assistant is None:
-        try:
-            assistant = AssistantService()
-        except ValueError as e:
-            print(f"[WARNING] Assistant service not available: {e}")
-            assistant = None
-    return assistant
+# Web request metrics are shared with the agent and scheduler through the database
+metrics.start_background_flush(interval=10)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+        metrics.inc("visa_web_requests_total", endpoint=endpoint, method=request.method, status=response.status_code)
+        metrics.observe("visa_web_request_seconds", time.perf_counter() - started, endpoint=endpoint)
+    return response
 
 def get_stats():
-    db = SessionLocal()
-    total = db.query(VisaApplication).count()
-    passed = db.query(VisaApplication).filter(VisaApplication.status == 'Passed').count()
-    needs_review = db.query(VisaApplication).filter(VisaApplication.status == 'Needs Review').count()
-    db.close()
+    return dashboard_stats()
+
+def run_client_alerts(params, progress):
+    """Job: generate and send the AI alert emails of the requested types."""
+    alert_service = registry.get('client_alerts')
+    alert_type = params.get('type', 'all')
+    stages = [
+        ('low_confidence', 'Low confidence documents',
+         lambda report: alert_service.send_alerts_for_low_confidence_documents(params.get('threshold', 70), progress=report)),
+        ('expiring', 'Expiring documents',
+         lambda report: alert_service.send_alerts_for_expiring_documents(params.get('days', 90), progress=report)),
+        ('missing_elements', 'Documents with missing elements',
+         lambda report: alert_service.send_alerts_for_missing_elements(progress=report)),
+    ]
+    stages = [stage for stage in stages if alert_type in ('all', stage[0])]
+    results = {"low_confidence": 0, "expiring": 0, "missing_elements": 0}
+    for index, (key, label, send) in enumerate(stages):
+        results[key] = send(stage_progress(progress, index, len(stages), label))
     return {
-        "total": total,
-        "passed": passed,
-        "needs_review": needs_review
+        "success": True,
+        "alerts_generated": sum(results.values()),
+        "breakdown": results
     }
 
+def run_notification_check(params, progress):
+    """Job: create expiry and verification-needed notifications."""
+    notification_service = registry.get('notifications')
+    expiry_count = notification_service.check_expiring_documents(
+        progress=stage_progress(progress, 0, 2, 'Expiring documents'))
+    verification_count = notification_service.check_verification_needed(
+        progress=stage_progress(progress, 1, 2, 'Documents to verify'))
+    return {
+        "expiry_notifications_created": expiry_count,
+        "verification_notifications_created": verification_count,
+        "total": expiry_count + verification_count
+    }
+
+def run_readiness_report(params, progress):
+    """Job: consolidated readiness report for an applicant."""
+    from services.database_service import get_application_summary
+    db = SessionLocal()
+    try:
+        applicant = db.query(Applicant).filter(Applicant.id == params['applicant_id']).first()
+        documents = get_application_summary(db, params['applicant_id'])
+        if not applicant or not documents:
+            raise ValueError("Applicant or documents no longer exist")
+        asst = get_assistant()
+        if not asst:
+            raise RuntimeError("Assistant not available")
+        progress(0.1, f"Reviewing {len(documents)} document(s)")
+        # Use the first document's subclass as the target (simplification)
+        return asst.generate_readiness_report(applicant.full_name, documents[0].visa_subclass, documents)
+    finally:
+        db.close()
+
+def build_job_runner():
+    runner = JobRunner()
+    runner.register('client_alerts', run_client_alerts)
+    runner.register('notification_check', run_notification_check)
+    runner.register('readiness', run_readiness_report)
+    return runner
+
+def job_accepted(job):
+    """202 response for a submitted job, pointing at its status URL."""
+    response = jsonify(dict(job, status_url=f"/api/jobs/{job['id']}"))
+    response.status_code = 202
+    response.headers['Location'] = f"/api/jobs/{job['id']}"
+    return response
+
+# Services are built once per worker process, on first use, instead of per request
+registry.register('verification', VerificationService)
+registry.register('notifications', NotificationService)
+registry.register('client_alerts', ClientAlertService)
+registry.register('extracted_data', ExtractedDataService)
+registry.register('retention', RetentionService)
+# Chat history per browser session (LRU/TTL bounded); the assistant itself is stateless
+registry.register('conversations', ConversationStore)
+registry.register('assistant', lambda: AssistantService(conversations=registry.get('conversations')))
+# One poller thread per web process feeds every open dashboard and alerts tab
+registry.register('events', lambda: EventBus(stats_provider=get_stats), close=lambda bus: bus.stop())
+# Long-running dashboard actions run as background jobs; see services/job_runner.py
+registry.register('jobs', build_job_runner, close=lambda runner: runner.shutdown())
+
+def chat_session_id(data):
+    """The browser's chat session id from a request body, or None (the turn then has no history)."""
+    session_id = str(data.get('session_id') or '').strip()
+    return session_id[:64] or None
+
+def get_assistant():
+    """The AI Assistant, or None if it cannot be configured (e.g. TAVILY_API_KEY not set); retried on the next call."""
+    try:
+        return registry.get('assistant')
+    except ValueError as e:
+        print(f"[WARNING] Assistant service not available: {e}")
+        return None
+
 @app.route('/')
 def index():
     db = SessionLocal()
@@ -43,6 +149,35 @@ def index():
     db.close()
     return render_template('index.html', apps=recent_apps, stats=stats)
 
+SSE_KEEPALIVE_S = float(os.getenv("SSE_KEEPALIVE_S", "15"))
+
+@app.route('/api/events')
+def api_events():
+    """
+    Server-sent events: 'application', 'notification' and 'stats' changes.
+    Resumes after the Last-Event-ID header (or ?last_event_id=); a 'reset' event
+    means the client missed changes and should reload.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        return jsonify({"error": "Invalid last event id"}), 400
+    subscription = registry.get('events').subscribe(last_event_id)
+
+    def stream():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                message = subscription.get(timeout=SSE_KEEPALIVE_S)
+                # Comments keep proxies from closing an idle stream
+                yield format_sse(message) if message else ": keepalive\n\n"
+        finally:
+            subscription.close()
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/alerts')
 def dashboard_alerts():
     return render_template('alerts.html')
@@ -51,33 +186,143 @@ def dashboard_alerts():
 def api_stats():
     return jsonify(get_stats())
 
+# ============ Metrics Endpoints ============
+
+@app.route('/metrics')
+def prometheus_metrics():
+    """Prometheus scrape endpoint covering the agent, scheduler and web app."""
+    metrics.flush()
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/metrics')
+def api_metrics():
+    """Metrics as JSON, plus throughput and per-stage latency for the dashboard."""
+    window = request.args.get('window', 5, type=int)
+    metrics.flush()
+    data = metrics.to_json(window_minutes=window)
+    
+    db = SessionLocal()
+    try:
+        since = datetime.datetime.now() - datetime.timedelta(hours=1)
+        data['stages'] = stage_latency_percentiles(db, since=since)
+    finally:
+        db.close()
+    return jsonify(data)
+
+@app.route('/metrics/dashboard')
+def metrics_dashboard():
+    return render_template('metrics.html')
+
 @app.route('/api/applications')
 def api_applications():
+    """
+    Dashboard list, newest first.
+
+    Without parameters this is the full list as a JSON array, with each row's
+    analysis, field_confidence and ocr_metadata (?omit=analysis leaves those out,
+    for clients that load them per row from /analysis). With any of the parameters
+    below the response is an object with 'items', 'total' and cursors:
+        fields: Comma-separated projection, e.g. fields=id,file_name,status
+        limit, after: Keyset pages; pass the previous response's 'next' as after
+        since: Delta mode; rows changed after the cursor, oldest first. Pass the
+               previous 'cursor' back (empty for a first sync) and call again while
+               'more' is true. A 'total' different from the client's row count
+               means rows were removed, so resync.
+    Every response has an ETag; an unchanged table answers If-None-Match with 304.
+    The tag ignores the since cursor, so skip If-None-Match while following 'more'.
+    """
+    try:
+        fields = parse_fields(request.args.get('fields'))
+        limit = request.args.get('limit', type=int)
+        if limit is not None and limit <= 0:
+            raise ValueError("limit must be positive")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    feed = ApplicationFeed()
+    total, newest = feed.state()
+    delta = 'since' in request.args
+    tag = hashlib.md5(repr((
+        total, newest, request.args.get('fields'), limit, request.args.get('after'),
+        request.args.get('omit'), delta
+    )).encode()).hexdigest()
+    if request.if_none_match.contains(tag):
+        response = Response(status=304)
+    else:
+        try:
+            if delta:
+                result = feed.changes(since=request.args.get('since'), fields=fields, limit=limit or DEFAULT_PAGE_SIZE)
+                payload = dict(result, total=total)
+            elif any(name in request.args for name in ('fields', 'limit', 'after')):
+                payload = dict(feed.page(fields, limit=limit, after=request.args.get('after')), total=total)
+            else:
+                payload = feed.page()['items']
+                if request.args.get('omit') != 'analysis':
+                    analyses = feed.analyses([item['id'] for item in payload])
+                    empty = {'analysis': None, 'field_confidence': None, 'ocr_metadata': None}
+                    for item in payload:
+                        item.update(analyses.get(item['id'], empty))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        response = jsonify(payload)
+    response.set_etag(tag)
+    # Revalidate every poll; the table state is the only thing compared
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/applications/<int:application_id>/analysis')
+def api_application_analysis(application_id):
+    """The full analysis payloads of one document, loaded on demand."""
     db = SessionLocal()
-    apps = db.query(VisaApplication).order_by(desc(VisaApplication.updated_at)).all()
-    result = []
-    for app in apps:
-        result.append({
+    try:
+        app = db.query(VisaApplication).filter(VisaApplication.id == application_id).first()
+        if not app:
+            return jsonify({"error": "Document not found"}), 404
+        return jsonify({
             "id": app.id,
             "document_id": app.document_id,
-            "file_name": app.file_name,
-            "visa_subclass": app.visa_subclass,
-            "status": app.status,
-            "score": app.completeness_score,
             "analysis": app.ai_analysis,
-            "processed_at": app.upload_date.strftime("%Y-%m-%d %H:%M:%S") if app.upload_date else "N/A",
-            "applicant_id": app.applicant_id,
-            "expiry_date": app.expiry_date.strftime("%Y-%m-%d") if app.expiry_date else None,
-            # Add confidence scoring fields
-            "confidence_score": app.confidence_score,
             "field_confidence": app.field_confidence,
-            "ocr_metadata": app.ocr_metadata,
-            "verification_status": app.verification_status,
-            "verified_by": app.verified_by,
-            "verified_at": app.verified_at.strftime("%Y-%m-%d %H:%M:%S") if app.verified_at else None
+            "ocr_metadata": app.ocr_metadata
         })
-    db.close()
-    return jsonify(result)
+    finally:
+        db.close()
+
+@app.route('/api/applications/history')
+def api_application_history():
+    """Looks documents up across the hot table and the archive (by document, file name or applicant)."""
+    retention = registry.get('retention')
+    applicant_id = request.args.get('applicant_id')
+    if applicant_id:
+        return jsonify(retention.applicant_history(applicant_id))
+    document_id = request.args.get('document_id')
+    file_name = request.args.get('file_name')
+    if not document_id and not file_name:
+        return jsonify({"error": "applicant_id, document_id or file_name is required"}), 400
+    record = retention.find_application(document_id=document_id, file_name=file_name)
+    if not record:
+        return jsonify({"error": "Document not found"}), 404
+    return jsonify(record)
+
+@app.route('/api/extracted/dates')
+def api_extracted_dates():
+    """Documents by extracted date, e.g. ?type=expiry_date&from=2026-10-01&to=2026-11-01&document_type=translation."""
+    try:
+        start = datetime.datetime.strptime(request.args['from'], "%Y-%m-%d") if request.args.get('from') else None
+        end = datetime.datetime.strptime(request.args['to'], "%Y-%m-%d") if request.args.get('to') else None
+    except ValueError:
+        return jsonify({"error": "from and to must be YYYY-MM-DD"}), 400
+    return jsonify(registry.get('extracted_data').documents_with_date(
+        request.args.get('type', 'expiry_date'), start, end, document_type=request.args.get('document_type')))
+
+@app.route('/api/extracted/references/shared')
+def api_shared_references():
+    """Reference numbers found on more than one applicant's documents."""
+    return jsonify(registry.get('extracted_data').shared_references(min_applicants=request.args.get('min_applicants', 2, type=int)))
+
+@app.route('/api/extracted/references/<reference>')
+def api_reference_documents(reference):
+    """Documents mentioning a reference number, e.g. a passport number."""
+    return jsonify(registry.get('extracted_data').documents_with_reference(reference))
 
 @app.route('/api/checklist/<subclass>')
 def api_checklist(subclass):
@@ -104,16 +349,52 @@ def api_chat():
             'error': 'AI Assistant not available. Please set TAVILY_API_KEY in .env file.'
         }), 503
     
-    data = request.json
+    data = request.json or {}
     user_message = data.get('message', '')
     context = data.get('context', None)
     
     if not user_message:
         return jsonify({'error': 'Message is required'}), 400
+    if asst.question_too_long(user_message):
+        return jsonify({'error': 'Message is too long'}), 400
     
-    response = asst.chat(user_message, context=context)
+    response = asst.chat(user_message, context=context, session_id=chat_session_id(data))
     return jsonify(response)
 
+@app.route('/api/chat/stream', methods=['POST'])
+def api_chat_stream():
+    """
+    Streaming AI Assistant chat: server-sent events 'sources' (first, once the
+    search is done), 'token' per completion delta, then 'done' or 'error'.
+    """
+    asst = get_assistant()
+    if not asst:
+        return jsonify({
+            'error': 'AI Assistant not available. Please set TAVILY_API_KEY in .env file.'
+        }), 503
+
+    data = request.json or {}
+    user_message = data.get('message', '')
+    context = data.get('context', None)
+
+    if not user_message:
+        return jsonify({'error': 'Message is required'}), 400
+    if asst.question_too_long(user_message):
+        return jsonify({'error': 'Message is too long'}), 400
+    session_id = chat_session_id(data)
+
+    def stream():
+        started = time.perf_counter()
+        first_token = True
+        for message in asst.chat_stream(user_message, context=context, session_id=session_id):
+            if first_token and message['event'] == 'token':
+                first_token = False
+                metrics.observe("visa_chat_first_token_seconds", time.perf_counter() - started)
+            yield format_sse(message)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/chat/document-help', methods=['POST'])
 def api_document_help():
     """Get AI help for a specific document."""
@@ -134,9 +415,12 @@ def api_document_help():
     response = asst.get_document_help(document_type, visa_subclass, analysis)
     return jsonify(response)
 
-@app.route('/api/applicant/<int:applicant_id>/readiness')
+@app.route('/api/applicant/<int:applicant_id>/readiness', methods=['POST'])
 def api_applicant_readiness(applicant_id):
-    """Generate or retrieve readiness report for an applicant."""
+    """
+    Start a readiness report for an applicant; returns a job to poll at /api/jobs/<id>.
+    POST only: each call starts an LLM job, which prefetches and link previews must not.
+    """
     db = SessionLocal()
     from services.database_service import get_application_summary
     applicant = db.query(Applicant).filter(Applicant.id == applicant_id).first()
@@ -145,52 +429,49 @@ def api_applicant_readiness(applicant_id):
         return jsonify({'error': 'Applicant not found'}), 404
     
     documents = get_application_summary(db, applicant_id)
+    db.close()
     if not documents:
-        db.close()
         return jsonify({'error': 'No documents found for this applicant'}), 404
     
-    asst = get_assistant()
-    if not asst:
-        db.close()
+    if not get_assistant():
         return jsonify({'error': 'Assistant not available'}), 503
     
-    # Use the first document's subclass as the target (simplification)
-    visa_subclass = documents[0].visa_subclass
-    report = asst.generate_readiness_report(applicant.full_name, visa_subclass, documents)
-    
-    db.close()
-    return jsonify(report)
+    return job_accepted(registry.get('jobs').submit('readiness', {'applicant_id': applicant_id}))
 
 @app.route('/api/chat/clear', methods=['POST'])
 def api_chat_clear():
-    """Clear chat history."""
-    asst = get_assistant()
-    if asst:
-        asst.clear_history()
+    """Clear the chat history of the session in the body."""
+    session_id = chat_session_id(request.get_json(silent=True) or {})
+    if session_id:
+        registry.get('conversations').clear(session_id)
     return jsonify({'status': 'ok'})
 
 # ============ Verification Endpoints ============
 
 @app.route('/api/verifications/pending')
 def api_pending_verifications():
-    """Get documents requiring manual verification."""
+    """Get documents requiring manual verification (?include=analysis adds the analysis payloads)."""
     applicant_id = request.args.get('applicant_id')
-    verification_service = VerificationService()
-    pending = verification_service.get_pending_verifications(applicant_id)
+    include_analysis = request.args.get('include') == 'analysis'
+    verification_service = registry.get('verification')
+    pending = verification_service.get_pending_verifications(applicant_id, include_analysis=include_analysis)
     
     result = []
     for doc in pending:
-        result.append({
+        item = {
             "id": doc.id,
             "document_id": doc.document_id,
             "file_name": doc.file_name,
             "confidence_score": doc.confidence_score,
-            "field_confidence": doc.field_confidence,
-            "ocr_metadata": doc.ocr_metadata,
             "verification_status": doc.verification_status,
-            "analysis": doc.ai_analysis,
+            "summary": doc.summary,
+            "missing_elements_count": doc.missing_elements_count,
+            "compliance_status": doc.compliance_status,
             "upload_date": doc.upload_date.strftime("%Y-%m-%d %H:%M:%S") if doc.upload_date else None
-        })
+        }
+        if include_analysis:
+            item.update(analysis=doc.ai_analysis, field_confidence=doc.field_confidence, ocr_metadata=doc.ocr_metadata)
+        result.append(item)
     
     return jsonify(result)
 
@@ -201,7 +482,7 @@ def api_approve_verification(document_id):
     verified_by = data.get('verified_by', 'admin')
     notes = data.get('notes')
     
-    verification_service = VerificationService()
+    verification_service = registry.get('verification')
     result = verification_service.approve_extraction(document_id, verified_by, notes)
     
     if result:
@@ -221,7 +502,7 @@ def api_reject_verification(document_id):
     reason = data.get('reason', 'No reason provided')
     reprocess = data.get('reprocess', True)
     
-    verification_service = VerificationService()
+    verification_service = registry.get('verification')
     result = verification_service.reject_and_reprocess(document_id, verified_by, reason, reprocess)
     
     if result:
@@ -233,12 +514,25 @@ def api_reject_verification(document_id):
     else:
         return jsonify({"error": "Document not found"}), 404
 
+def dimension_filters(source):
+    """Query parameters naming a dimension of an aggregation source (applicant_id is passed on its own)."""
+    return {name: request.args[name] for name in AggregationService.dimensions(source)
+            if name in request.args and name != 'applicant_id'}
+
 @app.route('/api/verifications/stats')
 def api_verification_stats():
-    """Get verification statistics."""
+    """
+    Get verification statistics. ?group_by=document_type,visa_subclass (or status, verification_status,
+    compliance_status, age, applicant_id) returns a breakdown; the same names filter it, e.g. ?verification_status=pending.
+    """
     applicant_id = request.args.get('applicant_id')
-    verification_service = VerificationService()
-    stats = verification_service.get_verification_stats(applicant_id)
+    verification_service = registry.get('verification')
+    try:
+        stats = verification_service.get_verification_stats(
+            applicant_id, group_by=parse_group_by(request.args.get('group_by')),
+            filters=dimension_filters('applications'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(stats)
 
 # ============ Notification Endpoints ============
@@ -252,7 +546,7 @@ def api_notifications():
     if not applicant_id:
         return jsonify({"error": "applicant_id is required"}), 400
     
-    notification_service = NotificationService()
+    notification_service = registry.get('notifications')
     notifications = notification_service.get_applicant_notifications(applicant_id, unread_only)
     
     result = []
@@ -272,7 +566,7 @@ def api_notifications():
 @app.route('/api/notifications/<int:notification_id>/read', methods=['POST'])
 def api_mark_notification_read(notification_id):
     """Mark a notification as read."""
-    notification_service = NotificationService()
+    notification_service = registry.get('notifications')
     success = notification_service.mark_notification_read(notification_id)
     
     if success:
@@ -283,7 +577,7 @@ def api_mark_notification_read(notification_id):
 @app.route('/api/notifications/<int:notification_id>/dismiss', methods=['POST'])
 def api_dismiss_notification(notification_id):
     """Dismiss a notification."""
-    notification_service = NotificationService()
+    notification_service = registry.get('notifications')
     success = notification_service.dismiss_notification(notification_id)
     
     if success:
@@ -293,25 +587,51 @@ def api_dismiss_notification(notification_id):
 
 @app.route('/api/notifications/stats')
 def api_notification_stats():
-    """Get notification statistics."""
+    """
+    Get notification statistics. ?group_by=applicant_id,severity (or notification_type, document_id, age)
+    returns a breakdown; the same names filter it, e.g. ?severity=critical.
+    """
     applicant_id = request.args.get('applicant_id')
-    notification_service = NotificationService()
-    stats = notification_service.get_notification_stats(applicant_id)
+    notification_service = registry.get('notifications')
+    try:
+        stats = notification_service.get_notification_stats(
+            applicant_id, group_by=parse_group_by(request.args.get('group_by')),
+            filters=dimension_filters('notifications'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(stats)
 
 @app.route('/api/notifications/check', methods=['POST'])
 def api_check_notifications():
-    """Manually trigger notification checks."""
-    notification_service = NotificationService()
-    
-    expiry_count = notification_service.check_expiring_documents()
-    verification_count = notification_service.check_verification_needed()
-    
-    return jsonify({
-        "expiry_notifications_created": expiry_count,
-        "verification_notifications_created": verification_count,
-        "total": expiry_count + verification_count
-    })
+    """Start the expiry and verification notification checks; returns a job to poll at /api/jobs/<id>."""
+    return job_accepted(registry.get('jobs').submit('notification_check'))
+
+
+# ============ Background Job Endpoints ============
+
+@app.route('/api/jobs', methods=['POST'])
+def api_submit_job():
+    """Submit a background job: {"kind": "client_alerts" | "notification_check" | "readiness", "params": {...}}."""
+    data = request.json or {}
+    try:
+        job = registry.get('jobs').submit(data.get('kind'), data.get('params') or {})
+    except ValueError as e:
+        return jsonify({"error": str(e), "kinds": registry.get('jobs').kinds}), 400
+    return job_accepted(job)
+
+@app.route('/api/jobs')
+def api_jobs():
+    """Recent jobs, newest first (?kind=, ?limit=)."""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    return jsonify(registry.get('jobs').recent(kind=request.args.get('kind'), limit=limit))
+
+@app.route('/api/jobs/<job_id>')
+def api_job(job_id):
+    """Status, progress (0..1), current message and, once finished, the result or error of a job."""
+    job = registry.get('jobs').get(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
 
 
 # ============================================================================
@@ -320,34 +640,27 @@ def api_check_notifications():
 
 @app.route('/api/alerts/generate', methods=['POST'])
 def generate_client_alerts():
-    """Generate AI-powered alert emails for documents needing attention"""
-    alert_service = ClientAlertService()
+    """Start generating and sending AI alert emails; returns a job to poll at /api/jobs/<id>."""
     data = request.json or {}
-    
-    alert_type = data.get('type', 'all')  # all, low_confidence, expiring, missing_elements
-    threshold = data.get('threshold', 70)
-    days = data.get('days', 90)
-    
-    results = {
-        "low_confidence": 0,
-        "expiring": 0,
-        "missing_elements": 0
+    params = {
+        'type': data.get('type', 'all'),  # all, low_confidence, expiring, missing_elements
+        'threshold': data.get('threshold', 70),
+        'days': data.get('days', 90)
     }
-    
-    if alert_type in ['all', 'low_confidence']:
-        results['low_confidence'] = alert_service.send_alerts_for_low_confidence_documents(threshold)
-    
-    if alert_type in ['all', 'expiring']:
-        results['expiring'] = alert_service.send_alerts_for_expiring_documents(days)
-    
-    if alert_type in ['all', 'missing_elements']:
-        results['missing_elements'] = alert_service.send_alerts_for_missing_elements()
-    
-    return jsonify({
-        "success": True,
-        "alerts_generated": sum(results.values()),
-        "breakdown": results
-    })
+    return job_accepted(registry.get('jobs').submit('client_alerts', params))
+
+@app.route('/api/alerts/candidates', methods=['GET'])
+def get_alert_candidates():
+    """Alerts inbox page: documents to alert on, filtered and classified in SQL (?limit=, ?after=<next>)."""
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    db = SessionLocal()
+    try:
+        return jsonify(find_alert_candidates(db, limit=limit, after=request.args.get('after'),
+                                             confidence_threshold=request.args.get('threshold', 70, type=int)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    finally:
+        db.close()
 
 @app.route('/api/alerts/history', methods=['GET'])
 def get_alert_history():
@@ -401,7 +714,7 @@ def send_client_alert():
         db.close()
         return jsonify({"error": "Applicant email not found and no override provided"}), 400
         
-    alert_service = ClientAlertService()
+    alert_service = registry.get('client_alerts')
     
     # Map type if needed
     if issue_type == 'missing': issue_type = 'missing_elements'
@@ -461,7 +774,7 @@ def preview_alert_email(document_id):
         
     applicant = db.query(Applicant).filter(Applicant.id == document.applicant_id).first()
     
-    alert_service = ClientAlertService()
+    alert_service = registry.get('client_alerts')
     issue_type = request.args.get('type', 'missing_elements')
     
     email_content = alert_service.generate_alert_email(document, issue_type, applicant)
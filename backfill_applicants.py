@@ -1,4 +1,4 @@
-from services.database_service import SessionLocal, VisaApplication, Applicant
+from services.database_service import SessionLocal, VisaApplication, Applicant, init_db
 import os
 
 def backfill():
@@ -32,4 +32,5 @@ def backfill():
     print("Backfill complete.")
 
 if __name__ == "__main__":
+    init_db()
     backfill()
@@ -0,0 +1 @@
+"""Offline benchmarks for the document pipeline (fake Drive and OpenAI stand-ins)."""
@@ -0,0 +1,125 @@
+"""
+Benchmark Corpus Generator
+Creates a reproducible mix of text PDFs, scanned (image-only) PDFs, photos and
+ZIP batches so every branch of the agent pipeline is exercised.
+"""
+
+import os
+import random
+import zipfile
+
+import fitz  # PyMuPDF
+
+from benchmarks.fake_openai import DOCUMENT_TYPES
+
+# Share of each kind of file in the corpus
+DEFAULT_MIX = {
+    'text_pdf': 0.60,
+    'scanned_pdf': 0.15,
+    'image': 0.15,
+    'zip': 0.10,
+}
+
+ZIP_MEMBERS = 3
+
+
+def _document_lines(rng, document_type):
+    lines = [
+        f"Document Type: {document_type}",
+        "Commonwealth of Australia - Supporting Document",
+        f"Full Name: Applicant {rng.randint(1000, 9999)}",
+        f"Reference Number: PA{rng.randint(1000000, 9999999)}",
+        f"Date of Issue: 20{rng.randint(15, 24)}-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+        f"Date of Expiry: 20{rng.randint(26, 35)}-0{rng.randint(1, 9)}-2{rng.randint(0, 8)}",
+    ]
+    lines += ["This record certifies the particulars above for visa assessment purposes."] * 6
+    return lines
+
+
+def _write_text_pdf(path, rng, pages=None):
+    document_type = rng.choice(DOCUMENT_TYPES)
+    doc = fitz.open()
+    for _ in range(pages or rng.randint(1, 3)):
+        page = doc.new_page()
+        page.insert_text((72, 72), "\n".join(_document_lines(rng, document_type)), fontsize=11)
+    doc.save(path)
+    doc.close()
+
+
+def _render_page(rng):
+    """Renders a document page to a pixmap, standing in for a scan or phone photo."""
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "\n".join(_document_lines(rng, rng.choice(DOCUMENT_TYPES))), fontsize=11)
+    pixmap = page.get_pixmap(matrix=fitz.Matrix(1, 1))
+    doc.close()
+    return pixmap
+
+
+def _write_scanned_pdf(path, rng):
+    doc = fitz.open()
+    for _ in range(rng.randint(1, 2)):
+        pixmap = _render_page(rng)
+        page = doc.new_page(width=pixmap.width, height=pixmap.height)
+        page.insert_image(page.rect, pixmap=pixmap)
+    doc.save(path)
+    doc.close()
+
+
+def _write_image(path, rng):
+    _render_page(rng).save(path)
+
+
+def _write_zip(path, rng, directory):
+    with zipfile.ZipFile(path, 'w') as archive:
+        for i in range(ZIP_MEMBERS):
+            member = os.path.join(directory, f".member_{i}.pdf")
+            _write_text_pdf(member, rng, pages=1)
+            archive.write(member, f"document_{i + 1}.pdf")
+            os.remove(member)
+
+
+def generate_corpus(directory, size, mix=None, seed=7):
+    """
+    Generates `size` files in `directory`, reusing an existing complete corpus.
+
+    Args:
+        directory: Output directory
+        size: Number of top-level files (ZIPs count once)
+        mix: Optional dict of kind -> share, defaults to DEFAULT_MIX
+        seed: Random seed
+
+    Returns:
+        Sorted list of generated file paths
+    """
+    os.makedirs(directory, exist_ok=True)
+    existing = sorted(os.path.join(directory, f) for f in os.listdir(directory) if not f.startswith('.'))
+    if len(existing) == size:
+        return existing
+
+    for path in existing:
+        os.remove(path)
+
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[k] for k in kinds]
+
+    paths = []
+    for i in range(size):
+        kind = rng.choices(kinds, weights)[0]
+        stem = f"bench_{i:05d}"
+        if kind == 'text_pdf':
+            path = os.path.join(directory, f"{stem}.pdf")
+            _write_text_pdf(path, rng)
+        elif kind == 'scanned_pdf':
+            path = os.path.join(directory, f"{stem}_scan.pdf")
+            _write_scanned_pdf(path, rng)
+        elif kind == 'image':
+            path = os.path.join(directory, f"{stem}.jpg")
+            _write_image(path, rng)
+        else:
+            path = os.path.join(directory, f"Applicant_{i:05d}.zip")
+            _write_zip(path, rng, directory)
+        paths.append(path)
+    return sorted(paths)
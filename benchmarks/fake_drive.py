@@ -0,0 +1,85 @@
+"""
+Fake Google Drive
+Serves a local directory of files through the subset of the GoogleDriveService
+interface the agent uses (list, download, move), with optional per-call latency.
+"""
+
+import os
+import time
+import shutil
+import datetime
+import threading
+import mimetypes
+
+
+class FakeDriveService:
+    """
+    In-memory folder tree backed by files on local disk.
+
+    Args:
+        latency_ms: Simulated round-trip time added to every API call
+    """
+
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+        self.files = {}  # file id -> metadata including local 'path'
+        self.parents = {}  # file id -> folder id
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def _wait(self):
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000.0)
+
+    def add_file(self, folder_id, path, created_time=None, name=None):
+        """
+        Registers a local file as living in `folder_id` and returns its Drive-style metadata.
+        `name` overrides the file name (e.g. to upload the same file again as a new document).
+        """
+        with self._lock:
+            self._next_id += 1
+            file_id = f"fake-{self._next_id:06d}"
+            created = created_time or datetime.datetime.now(datetime.timezone.utc)
+            self.files[file_id] = {
+                'id': file_id,
+                'name': name or os.path.basename(path),
+                'mimeType': mimetypes.guess_type(path)[0] or 'application/octet-stream',
+                'createdTime': created.strftime("%Y-%m-%dT%H:%M:%S.000Z"),
+                'size': str(os.path.getsize(path)),
+                'path': path
+            }
+            self.parents[file_id] = folder_id
+            return self.files[file_id]
+
+    def list_files_in_folder(self, folder_id):
+        """Lists files in a folder (same fields as the real service)."""
+        self._wait()
+        with self._lock:
+            return [{k: v for k, v in meta.items() if k != 'path'}
+                    for file_id, meta in self.files.items() if self.parents[file_id] == folder_id]
+
+    def download_file(self, file_id, destination_path):
+        """Copies the backing file to `destination_path`."""
+        self._wait()
+        shutil.copyfile(self.files[file_id]['path'], destination_path)
+        return destination_path
+
+    def move_file(self, file_id, source_folder_id, destination_folder_id):
+        """Moves a file between folders."""
+        self._wait()
+        with self._lock:
+            if file_id not in self.parents:
+                raise FileNotFoundError(f"File not found: {file_id}")
+            self.parents[file_id] = destination_folder_id
+        return {'id': file_id, 'parents': [destination_folder_id]}
+
+    def count(self, folder_id):
+        with self._lock:
+            return sum(1 for parent in self.parents.values() if parent == folder_id)
+
+    def forget_folder(self, folder_id):
+        """Drops every file in a folder (long soak runs would otherwise keep them all in memory)."""
+        with self._lock:
+            for file_id in [f for f, parent in self.parents.items() if parent == folder_id]:
+                del self.files[file_id]
+                del self.parents[file_id]
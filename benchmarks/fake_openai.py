@@ -0,0 +1,302 @@
+"""
+Fake OpenAI Chat Completions
+Builds chat-completion responses shaped like the real API for every prompt the
+services send (classify, analyze, vision OCR, alert/follow-up emails, assistant
+chat), with simulated latency, 429/5xx injection and token accounting.
+`FakeOpenAIClient` is a drop-in replacement for `openai.OpenAI` in-process.
+"""
+
+import re
+import json
+import time
+import uuid
+import random
+import hashlib
+import datetime
+import threading
+
+import httpx
+import openai
+from openai.types.chat import ChatCompletion
+
+DOCUMENT_TYPES = ['Passport', 'Birth Certificate', 'Marriage Certificate', 'Bank Statement', 'Police Clearance']
+VISA_SUBCLASSES = ['189', '190', '500', '820']
+
+# Rough vision cost of one high-detail page image
+IMAGE_TOKENS = 765
+# Prompt caching applies to prefixes of at least this many tokens
+CACHE_MIN_TOKENS = 1024
+
+
+def count_tokens(text):
+    """Approximate token count (about 4 characters per token)."""
+    return max(1, len(text or '') // 4)
+
+
+class LatencyModel:
+    """
+    Samples simulated response latency in seconds.
+
+    Args:
+        distribution: 'constant', 'uniform' or 'lognormal'
+        median_ms: Median (or constant) latency in milliseconds
+        spread: Uniform half-width as a fraction of the median, or lognormal sigma
+        per_token_ms: Extra latency per completion token (models generation time)
+    """
+
+    def __init__(self, distribution='lognormal', median_ms=400, spread=0.5, per_token_ms=0.0):
+        if distribution not in ('constant', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution: {distribution}")
+        self.distribution = distribution
+        self.median_ms = median_ms
+        self.spread = spread
+        self.per_token_ms = per_token_ms
+
+    def sample(self, rng, completion_tokens=0):
+        if self.distribution == 'constant':
+            ms = self.median_ms
+        elif self.distribution == 'uniform':
+            ms = rng.uniform(self.median_ms * (1 - self.spread), self.median_ms * (1 + self.spread))
+        else:
+            ms = rng.lognormvariate(0, self.spread) * self.median_ms
+        return max(0.0, ms + completion_tokens * self.per_token_ms) / 1000.0
+
+
+def _message_text(message):
+    """Concatenates the text parts of a message and counts its images."""
+    content = message.get('content')
+    if isinstance(content, str):
+        return content, 0
+    texts, images = [], 0
+    for part in content or []:
+        if part.get('type') == 'text':
+            texts.append(part.get('text', ''))
+        elif part.get('type') == 'image_url':
+            images += 1
+    return '\n'.join(texts), images
+
+
+def detect_purpose(messages):
+    """Works out which service prompt a request came from."""
+    system = next((m.get('content') or '' for m in messages if m.get('role') == 'system'), '')
+    if 'classification expert' in system:
+        return 'classify'
+    if 'OCR engine' in system:
+        return 'ocr'
+    if 'visa document verifier' in system:
+        return 'analyze'
+    if 'follow-up' in system:
+        return 'followup_email'
+    if 'immigration consultant' in system:
+        return 'alert_email'
+    return 'chat'
+
+
+def _document_type_from(text, rng):
+    """Prefers a 'Document Type:' line (as written by the benchmark corpus) over a random pick."""
+    match = re.search(r'Document Type:\s*([A-Za-z ]+)', text or '')
+    if match and match.group(1).strip() in DOCUMENT_TYPES:
+        return match.group(1).strip()
+    return rng.choice(DOCUMENT_TYPES)
+
+
+def _date(rng, start_year, end_year):
+    day = datetime.date(start_year, 1, 1) + datetime.timedelta(days=rng.randint(0, 365 * (end_year - start_year)))
+    return day.isoformat()
+
+
+def build_content(purpose, prompt, rng):
+    """Builds the assistant message content for a request, matching the service's JSON schema."""
+    if purpose == 'classify':
+        return json.dumps({
+            'document_type': _document_type_from(prompt, rng),
+            'visa_subclass': rng.choice(VISA_SUBCLASSES),
+            'confidence': round(rng.uniform(0.7, 0.99), 2),
+            'summary': 'Synthetic classification produced by the local OpenAI stand-in.'
+        })
+
+    if purpose == 'analyze':
+        completeness = rng.randint(40, 100)
+        field_confidence = {key: rng.randint(60, 100) for key in
+                            ('names', 'dates', 'reference_numbers', 'signature_seal', 'overall_text_quality')}
+        confidence = round(sum(field_confidence.values()) / len(field_confidence))
+        missing = [] if completeness >= 90 else rng.sample(
+            ['Certified translation', 'Issuing authority seal', 'Signature of holder', 'Page 2 of document'], 2)
+        return json.dumps({
+            'is_correct_type': True,
+            'document_type_detected': _document_type_from(prompt, rng),
+            'extracted_data': {
+                'names': ['Alex Citizen'],
+                'dates': {
+                    'date_of_birth': _date(rng, 1960, 2005),
+                    'issue_date': _date(rng, 2015, 2024),
+                    'expiry_date': _date(rng, 2025, 2035),
+                    'other_dates': {}
+                },
+                'reference_numbers': [f"PA{rng.randint(1000000, 9999999)}"],
+                'has_signature': rng.random() > 0.2,
+                'has_official_seal': rng.random() > 0.3
+            },
+            'field_confidence': field_confidence,
+            'confidence_score': confidence,
+            'confidence_factors': {
+                'text_clarity': 'Synthetic text',
+                'format_consistency': 'Consistent',
+                'expected_elements_present': 'Most elements present'
+            },
+            'completeness_score': completeness,
+            'findings': ['Document structure matches the expected type'],
+            'missing_elements': missing,
+            'compliance_status': 'Passed' if completeness >= 90 else 'Partial',
+            'detailed_justification': 'Generated by the local OpenAI stand-in.',
+            'summary': 'Synthetic analysis result.',
+            'requires_manual_review': confidence < 70
+        })
+
+    if purpose == 'ocr':
+        document_type = rng.choice(DOCUMENT_TYPES)
+        body = ' '.join(['Commonwealth of Australia sample record line.'] * 8)
+        return json.dumps({
+            'transcribed_text': f"Document Type: {document_type}\nName: Alex Citizen\n{body}",
+            'ocr_confidence': rng.randint(60, 98),
+            'quality_issues': [] if rng.random() > 0.3 else ['slight blur'],
+            'text_clarity': rng.choice(['excellent', 'good', 'fair'])
+        })
+
+    if purpose in ('alert_email', 'followup_email'):
+        subject = re.search(r'"subject":\s*"([^"]+)"', prompt or '')
+        return json.dumps({
+            'subject': subject.group(1) if subject else 'Australia Visa Application Update',
+            'body': '<p>Dear Applicant,</p><p>This is a synthetic email from the local OpenAI stand-in.</p>'
+                    '<p>Kind regards,<br><strong>Senior Immigration Consultant</strong></p>'
+        })
+
+    return ("Thanks for your question. This reply comes from the local OpenAI stand-in, "
+            "so it does not reflect real visa guidance.")
+
+
+class CompletionSimulator:
+    """
+    Turns chat-completion request bodies into response bodies. Shared by the
+    in-process client and the HTTP stand-in server.
+
+    Args:
+        latency: LatencyModel used for every request
+        rate_limit_rate: Probability of answering with HTTP 429
+        server_error_rate: Probability of answering with HTTP 500
+        seed: Random seed so runs are reproducible
+    """
+
+    def __init__(self, latency=None, rate_limit_rate=0.0, server_error_rate=0.0, seed=42):
+        self.latency = latency or LatencyModel()
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._seen_prefixes = set()
+        self.stats = {'requests': 0, 'rate_limited': 0, 'server_errors': 0,
+                      'prompt_tokens': 0, 'completion_tokens': 0, 'cached_tokens': 0}
+
+    def simulate(self, body):
+        """
+        Returns (status_code, response_body, delay_seconds) for a request body.
+        Callers are responsible for sleeping `delay_seconds`.
+        """
+        messages = body.get('messages', [])
+        with self._lock:
+            self.stats['requests'] += 1
+            roll = self._rng.random()
+            if roll < self.rate_limit_rate:
+                self.stats['rate_limited'] += 1
+                return 429, _error_body('Rate limit reached for requests', 'rate_limit_exceeded'), \
+                    self.latency.sample(self._rng) * 0.1
+            if roll < self.rate_limit_rate + self.server_error_rate:
+                self.stats['server_errors'] += 1
+                return 500, _error_body('The server had an error while processing your request', 'server_error'), \
+                    self.latency.sample(self._rng)
+
+            purpose = detect_purpose(messages)
+            prompt = '\n'.join(_message_text(m)[0] for m in messages if m.get('role') == 'user')
+            # Seed content from the prompt so the same document gets the same answer
+            content_rng = random.Random(hashlib.sha1(f"{purpose}:{prompt}".encode()).hexdigest())
+            content = build_content(purpose, prompt, content_rng)
+
+            prompt_tokens = 0
+            for m in messages:
+                text, images = _message_text(m)
+                prompt_tokens += count_tokens(text) + images * IMAGE_TOKENS + 4
+            completion_tokens = count_tokens(content)
+            cached_tokens = self._cached_tokens(messages, prompt_tokens)
+
+            self.stats['prompt_tokens'] += prompt_tokens
+            self.stats['completion_tokens'] += completion_tokens
+            self.stats['cached_tokens'] += cached_tokens
+            delay = self.latency.sample(self._rng, completion_tokens)
+
+        response = {
+            'id': f"chatcmpl-{uuid.uuid4().hex[:24]}",
+            'object': 'chat.completion',
+            'created': int(time.time()),
+            'model': body.get('model', 'gpt-4o-mini'),
+            'choices': [{
+                'index': 0,
+                'message': {'role': 'assistant', 'content': content},
+                'finish_reason': 'stop'
+            }],
+            'usage': {
+                'prompt_tokens': prompt_tokens,
+                'completion_tokens': completion_tokens,
+                'total_tokens': prompt_tokens + completion_tokens,
+                'prompt_tokens_details': {'cached_tokens': cached_tokens}
+            }
+        }
+        return 200, response, delay
+
+    def _cached_tokens(self, messages, prompt_tokens):
+        """Mimics prompt caching: a repeated long system prompt is served from cache in 128-token steps."""
+        system = next((_message_text(m)[0] for m in messages if m.get('role') == 'system'), '')
+        prefix = hashlib.sha1(system.encode()).hexdigest()
+        seen = prefix in self._seen_prefixes
+        self._seen_prefixes.add(prefix)
+        if not seen or prompt_tokens < CACHE_MIN_TOKENS:
+            return 0
+        return min(prompt_tokens, max(CACHE_MIN_TOKENS, count_tokens(system))) // 128 * 128
+
+
+def _error_body(message, code):
+    return {'error': {'message': message, 'type': code, 'param': None, 'code': code}}
+
+
+class _Completions:
+    def __init__(self, client):
+        self._client = client
+
+    def create(self, **kwargs):
+        return self._client._create(kwargs)
+
+
+class FakeOpenAIClient:
+    """
+    In-process stand-in for `openai.OpenAI` that raises the SDK's own error
+    types, so retry handling in the LLM ledger behaves as it would in production.
+    """
+
+    def __init__(self, simulator=None, **simulator_options):
+        self.simulator = simulator or CompletionSimulator(**simulator_options)
+        self.chat = type('Chat', (), {})()
+        self.chat.completions = _Completions(self)
+
+    def with_options(self, **options):
+        return self
+
+    def _create(self, kwargs):
+        status, body, delay = self.simulator.simulate(kwargs)
+        if delay:
+            time.sleep(delay)
+        if status == 200:
+            return ChatCompletion.model_validate(body)
+
+        request = httpx.Request('POST', 'http://fake-openai.local/v1/chat/completions')
+        response = httpx.Response(status, request=request, json=body)
+        error_class = openai.RateLimitError if status == 429 else openai.InternalServerError
+        raise error_class(body['error']['message'], response=response, body=body)
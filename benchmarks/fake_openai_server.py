@@ -0,0 +1,178 @@
+"""
+Local OpenAI-Compatible Stand-in Server
+Speaks the chat-completions protocol (including streaming) with JSON-mode
+responses matching the schemas in services/openai_service.py, simulated latency,
+429/5xx injection and token accounting. Point the services at it with
+OPENAI_BASE_URL=http://127.0.0.1:8089/v1 to exercise them offline.
+
+Usage:
+    python -m benchmarks.fake_openai_server --port 8089 --latency-ms 600 --rate-limit 0.05
+    curl http://127.0.0.1:8089/stats
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.fake_openai import CompletionSimulator, LatencyModel
+
+MODELS = ['gpt-4o', 'gpt-4o-mini']
+STREAM_CHUNK_CHARS = 24
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip('/').endswith('/models'):
+            self._send_json(200, {'object': 'list', 'data': [
+                {'id': model, 'object': 'model', 'created': 0, 'owned_by': 'fake-openai'} for model in MODELS]})
+        elif self.path.rstrip('/') == '/stats':
+            self._send_json(200, self.server.simulator.stats)
+        else:
+            self._send_json(404, {'error': {'message': f"Unknown path {self.path}", 'type': 'invalid_request_error'}})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f"Unknown path {self.path}", 'type': 'invalid_request_error'}})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            self._send_json(400, {'error': {'message': 'Invalid JSON body', 'type': 'invalid_request_error'}})
+            return
+
+        status, response, delay = self.server.simulator.simulate(body)
+        if status != 200:
+            time.sleep(delay)
+            headers = {'Retry-After': '1', 'x-should-retry': 'true'} if status == 429 else None
+            self._send_json(status, response, headers)
+            return
+
+        if body.get('stream'):
+            include_usage = (body.get('stream_options') or {}).get('include_usage', False)
+            self._stream(response, delay, include_usage)
+        else:
+            time.sleep(delay)
+            self._send_json(200, response)
+
+    def _stream(self, response, delay, include_usage):
+        """Sends the completion as server-sent event chunks spread over the simulated latency."""
+        content = response['choices'][0]['message']['content']
+        pieces = [content[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(content), STREAM_CHUNK_CHARS)] or ['']
+        base = {k: response[k] for k in ('id', 'created', 'model')}
+        base['object'] = 'chat.completion.chunk'
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+        def send(chunk):
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            self.wfile.flush()
+
+        # First token arrives after about a third of the latency, the rest is spread evenly
+        time.sleep(delay / 3)
+        per_chunk = (delay * 2 / 3) / len(pieces)
+        send({**base, 'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}]})
+        for piece in pieces:
+            send({**base, 'choices': [{'index': 0, 'delta': {'content': piece}, 'finish_reason': None}]})
+            time.sleep(per_chunk)
+        send({**base, 'choices': [{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]})
+        if include_usage:
+            send({**base, 'choices': [], 'usage': response['usage']})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server wrapping a CompletionSimulator.
+
+    Args:
+        simulator: CompletionSimulator deciding latency, errors and content
+        host: Bind address
+        port: Port (0 picks a free one)
+        verbose: Log every request
+    """
+
+    daemon_threads = True
+
+    def __init__(self, simulator=None, host='127.0.0.1', port=8089, verbose=False):
+        super().__init__((host, port), _Handler)
+        self.simulator = simulator or CompletionSimulator()
+        self.verbose = verbose
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL to pass as OPENAI_BASE_URL."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        """Serves in a background daemon thread and returns self."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True, name="fake-openai")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local OpenAI-compatible stand-in server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    parser.add_argument('--latency-ms', type=float, default=400, help='Median response latency')
+    parser.add_argument('--latency-dist', default='lognormal', choices=['constant', 'uniform', 'lognormal'])
+    parser.add_argument('--latency-spread', type=float, default=0.5, help='Uniform half-width fraction or lognormal sigma')
+    parser.add_argument('--per-token-ms', type=float, default=0.0, help='Extra latency per completion token')
+    parser.add_argument('--rate-limit', type=float, default=0.0, help='Probability of a 429 per request')
+    parser.add_argument('--server-errors', type=float, default=0.0, help='Probability of a 500 per request')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true', help='Log every request')
+    args = parser.parse_args()
+
+    simulator = CompletionSimulator(
+        latency=LatencyModel(args.latency_dist, args.latency_ms, args.latency_spread, args.per_token_ms),
+        rate_limit_rate=args.rate_limit,
+        server_error_rate=args.server_errors,
+        seed=args.seed
+    )
+    server = FakeOpenAIServer(simulator, args.host, args.port, verbose=args.verbose)
+    print(f"✓ Fake OpenAI server listening on {server.url}")
+    print(f"  export OPENAI_BASE_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nStats: {json.dumps(simulator.stats)}")
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,260 @@
+"""
+End-to-end Agent Throughput Benchmark
+Runs the real VisaAgent pipeline against a generated corpus served by a fake
+Drive, with a fake OpenAI client that simulates latency and rate limits.
+Each (corpus size, worker count) configuration runs in its own subprocess so
+peak RSS is measured per configuration.
+
+Usage:
+    python -m benchmarks.run_benchmark --sizes 10 100 1000 --workers 1 4
+    python -m benchmarks.run_benchmark --sizes 100 --compare benchmarks/results/<previous>.json
+"""
+
+import os
+import sys
+import json
+import time
+import resource
+import argparse
+import datetime
+import tempfile
+import threading
+import subprocess
+import contextlib
+
+# Add project root to sys.path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_DIR = os.path.join(BENCHMARK_DIR, '.corpus')
+RESULTS_DIR = os.path.join(BENCHMARK_DIR, 'results')
+
+FOLDERS = {
+    'GOOGLE_DRIVE_INCOMING_FOLDER_ID': 'incoming',
+    'GOOGLE_DRIVE_PROCESSING_FOLDER_ID': 'processing',
+    'GOOGLE_DRIVE_VERIFIED_FOLDER_ID': 'verified',
+    'GOOGLE_DRIVE_NEEDS_REVIEW_FOLDER_ID': 'needs_review',
+}
+
+# Minimal notification templates so the benchmark does not need mail_config.json
+BENCH_MAIL_CONFIG = {
+    'email_templates': {
+        'verified': {'subject': '{file_name} verified ({visa_subclass})', 'body': 'Score {score}. {summary}'},
+        'needs_review': {'subject': '{file_name} needs review', 'body': 'Score {score}. {summary}'},
+    }
+}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB."""
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return round(usage / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def run_single(size, workers, options):
+    """
+    Runs one configuration in the current process.
+
+    Returns:
+        Dict of throughput, per-stage latency, LLM and memory figures
+    """
+    from sqlalchemy import create_engine
+    from services.database_service import Base, SessionLocal, PipelineSpan
+    from core.tracing import tracer, stage_latency_percentiles
+    from benchmarks.corpus import generate_corpus
+    from benchmarks.fake_drive import FakeDriveService
+    from benchmarks.fake_openai import CompletionSimulator, FakeOpenAIClient, LatencyModel
+    from benchmarks.fake_openai_server import FakeOpenAIServer
+
+    corpus = generate_corpus(os.path.join(CORPUS_DIR, f"{size}-seed{options['seed']}"), size, seed=options['seed'])
+
+    # Isolated database and working directory (the agent writes temp files to the cwd)
+    workdir = tempfile.mkdtemp(prefix="visa_bench_")
+    engine = create_engine(f"sqlite:///{os.path.join(workdir, 'bench.db')}", connect_args={"timeout": 30})
+    Base.metadata.create_all(bind=engine)
+    SessionLocal.configure(bind=engine)
+    os.environ.update(FOLDERS)
+    os.chdir(workdir)
+    tracer.enabled = True
+
+    drive = FakeDriveService(latency_ms=options['drive_latency_ms'])
+    for path in corpus:
+        drive.add_file(FOLDERS['GOOGLE_DRIVE_INCOMING_FOLDER_ID'], path)
+
+    simulator = CompletionSimulator(
+        latency=LatencyModel(options['latency_dist'], options['latency_ms'], options['latency_spread']),
+        rate_limit_rate=options['rate_limit'],
+        server_error_rate=options['server_errors'],
+        seed=options['seed']
+    )
+
+    from core.agent import VisaAgent
+    from services.openai_service import OpenAIService
+
+    server = None
+    if options['openai_transport'] == 'http':
+        # Real SDK over HTTP, including connection handling and response parsing
+        server = FakeOpenAIServer(simulator, port=0).start()
+
+    def make_agent():
+        if server:
+            openai_service = OpenAIService(api_key="benchmark", base_url=server.url)
+        else:
+            openai_service = OpenAIService(api_key="benchmark")
+            openai_service.client = FakeOpenAIClient(simulator=simulator)
+        return VisaAgent(drive=drive, openai_service=openai_service, mail_config=BENCH_MAIL_CONFIG)
+
+    log = open(os.devnull, 'w') if options['quiet'] else sys.stdout
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(log):
+        if workers == 1:
+            make_agent().run_once()
+        else:
+            # Independent pollers over the same inbox, coordinated only by document leases
+            threads = [threading.Thread(target=make_agent().run_once) for _ in range(workers)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+    wall_seconds = time.perf_counter() - start
+    tracer.flush()
+    if server:
+        server.stop()
+
+    session = SessionLocal()
+    try:
+        outcomes = {}
+        for (outcome,) in session.query(PipelineSpan.outcome).filter(PipelineSpan.stage == 'document'):
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        stages = stage_latency_percentiles(session)
+    finally:
+        session.close()
+
+    documents = sum(outcomes.values())
+    return {
+        'size': size,
+        'workers': workers,
+        'wall_seconds': round(wall_seconds, 3),
+        'files': len(corpus),
+        'documents': documents,
+        'files_per_sec': round(len(corpus) / wall_seconds, 3),
+        'docs_per_sec': round(documents / wall_seconds, 3),
+        'document_outcomes': outcomes,
+        'left_in_processing': drive.count(FOLDERS['GOOGLE_DRIVE_PROCESSING_FOLDER_ID']),
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': stages,
+        'llm': dict(simulator.stats),
+    }
+
+
+def run_in_subprocess(size, workers, args):
+    """Runs one configuration in a fresh interpreter and returns its result dict."""
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        result_file = f.name
+    command = [sys.executable, '-m', 'benchmarks.run_benchmark', '--single',
+               '--sizes', str(size), '--workers', str(workers), '--result-file', result_file,
+               '--latency-ms', str(args.latency_ms), '--latency-dist', args.latency_dist,
+               '--latency-spread', str(args.latency_spread), '--rate-limit', str(args.rate_limit),
+               '--server-errors', str(args.server_errors), '--drive-latency-ms', str(args.drive_latency_ms),
+               '--openai-transport', args.openai_transport, '--seed', str(args.seed)]
+    if args.verbose:
+        command.append('--verbose')
+    try:
+        subprocess.run(command, cwd=PROJECT_ROOT, check=True)
+        with open(result_file) as f:
+            return json.load(f)
+    finally:
+        os.remove(result_file)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return None
+
+
+def print_report(results, baseline=None):
+    previous = {(r['size'], r['workers']): r for r in (baseline or {}).get('results', [])}
+    print(f"\n{'Files':>6} | {'Workers':>7} | {'Docs':>5} | {'Docs/s':>8} | {'vs base':>8} | {'Wall s':>8} | {'RSS MB':>7} | {'429s':>5}")
+    print("-" * 78)
+    for r in results:
+        base = previous.get((r['size'], r['workers']))
+        change = f"{(r['docs_per_sec'] / base['docs_per_sec'] - 1) * 100:+.0f}%" if base and base['docs_per_sec'] else "-"
+        print(f"{r['size']:>6} | {r['workers']:>7} | {r['documents']:>5} | {r['docs_per_sec']:>8} | {change:>8} | "
+              f"{r['wall_seconds']:>8} | {r['peak_rss_mb']:>7} | {r['llm']['rate_limited']:>5}")
+
+    for r in results:
+        print(f"\nStage latency, {r['size']} files x {r['workers']} workers:")
+        for stage, row in sorted(r['stages'].items()):
+            print(f"  {stage:<14} n={row['count']:<6} p50={row['p50_ms']:>9}ms  p95={row['p95_ms']:>9}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end VisaAgent throughput benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 100, 1000], help='Corpus sizes (files)')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 4], help='Worker counts')
+    parser.add_argument('--latency-ms', type=float, default=400, help='Median fake OpenAI latency')
+    parser.add_argument('--latency-dist', default='lognormal', choices=['constant', 'uniform', 'lognormal'])
+    parser.add_argument('--latency-spread', type=float, default=0.5, help='Uniform half-width fraction or lognormal sigma')
+    parser.add_argument('--rate-limit', type=float, default=0.02, help='Probability of a 429 per request')
+    parser.add_argument('--server-errors', type=float, default=0.0, help='Probability of a 500 per request')
+    parser.add_argument('--drive-latency-ms', type=float, default=20, help='Fake Drive API round trip')
+    parser.add_argument('--openai-transport', default='inprocess', choices=['inprocess', 'http'],
+                        help='Call the fake OpenAI in-process or through the local stand-in server')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='Results JSON path (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='Previous results JSON to compare docs/sec against')
+    parser.add_argument('--verbose', action='store_true', help='Show agent output')
+    parser.add_argument('--single', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    options = {
+        'latency_ms': args.latency_ms,
+        'latency_dist': args.latency_dist,
+        'latency_spread': args.latency_spread,
+        'rate_limit': args.rate_limit,
+        'server_errors': args.server_errors,
+        'drive_latency_ms': args.drive_latency_ms,
+        'openai_transport': args.openai_transport,
+        'seed': args.seed,
+    }
+
+    if args.single:
+        result = run_single(args.sizes[0], args.workers[0], {**options, 'quiet': not args.verbose})
+        with open(args.result_file, 'w') as f:
+            json.dump(result, f)
+        return
+
+    results = []
+    for size in args.sizes:
+        for workers in args.workers:
+            print(f"▶ Running {size} files with {workers} worker(s)...")
+            results.append(run_in_subprocess(size, workers, args))
+            print(f"  ✓ {results[-1]['docs_per_sec']} docs/sec")
+
+    report = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'options': options,
+        'results': results,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+    print(f"\n✓ Results saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Agent Memory Soak Test
+Runs one long-lived VisaAgent through many polling cycles (a small corpus is
+uploaded again under new names every cycle) and samples the process's memory
+as the processed-document count grows. A leak in the agent, such as ORM rows
+piling up in a long-lived session, shows up as steady growth after warm-up.
+
+Memory is read from RssAnon (anonymous memory) where available. Pages of the
+SQLite file mapped by mmap_size are file-backed and would otherwise make RSS
+track the database size.
+
+Usage:
+    python -m benchmarks.soak --documents 10000
+    python -m benchmarks.soak --documents 2000 --max-growth-mb 15
+"""
+
+import gc
+import os
+import sys
+import json
+import time
+import argparse
+import datetime
+import tempfile
+import contextlib
+
+# Add project root to sys.path
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.append(PROJECT_ROOT)
+
+from benchmarks.run_benchmark import CORPUS_DIR, RESULTS_DIR, FOLDERS, BENCH_MAIL_CONFIG, peak_rss_mb, git_commit
+
+
+def current_memory_mb():
+    """Anonymous resident memory of this process in MB (falls back to peak RSS off Linux)."""
+    try:
+        with open('/proc/self/status') as f:
+            fields = dict(line.split(':', 1) for line in f if ':' in line)
+        value = fields.get('RssAnon') or fields['VmRSS']
+        return round(int(value.split()[0]) / 1024, 1)
+    except (OSError, KeyError):
+        return peak_rss_mb()
+
+
+def growth_per_1k(samples):
+    """Least-squares slope of memory (MB) per 1000 documents."""
+    if len(samples) < 2:
+        return 0.0
+    xs = [s['documents'] for s in samples]
+    ys = [s['memory_mb'] for s in samples]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    var_x = sum((x - mean_x) ** 2 for x in xs)
+    if not var_x:
+        return 0.0
+    return round(1000 * sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x, 3)
+
+
+def run_soak(documents, batch_size, sample_every, warmup_fraction, seed, verbose=False):
+    """
+    Processes at least `documents` documents and samples memory along the way.
+
+    Returns:
+        Dict with samples, warm-up baseline, growth and slope
+    """
+    # A small page cache keeps SQLite's own (bounded) growth from masking a leak in the agent
+    os.environ.setdefault("SQLITE_CACHE_SIZE_KB", "4096")
+
+    from services.database_service import Base, SessionLocal, VisaApplication, build_engine
+    from services.openai_service import OpenAIService
+    from core.agent import VisaAgent
+    from core.tracing import tracer
+    from benchmarks.corpus import generate_corpus
+    from benchmarks.fake_drive import FakeDriveService
+    from benchmarks.fake_openai import FakeOpenAIClient, LatencyModel
+
+    corpus = generate_corpus(os.path.join(CORPUS_DIR, f"soak-{batch_size}-seed{seed}"), batch_size, seed=seed)
+
+    workdir = tempfile.mkdtemp(prefix="visa_soak_")
+    engine = build_engine(f"sqlite:///{os.path.join(workdir, 'soak.db')}")
+    Base.metadata.create_all(bind=engine)
+    SessionLocal.configure(bind=engine)
+    os.environ.update(FOLDERS)
+    os.chdir(workdir)
+
+    drive = FakeDriveService()
+    openai_service = OpenAIService(api_key="soak")
+    openai_service.client = FakeOpenAIClient(latency=LatencyModel('constant', 0), seed=seed)
+    agent = VisaAgent(drive=drive, openai_service=openai_service, mail_config=BENCH_MAIL_CONFIG)
+
+    def processed():
+        session = SessionLocal()
+        try:
+            return session.query(VisaApplication).count()
+        finally:
+            session.close()
+
+    samples, cycle, next_sample = [], 0, 0
+    start = time.perf_counter()
+    log = sys.stdout if verbose else open(os.devnull, 'w')
+    done = 0
+    while done < documents:
+        for path in corpus:
+            drive.add_file(FOLDERS['GOOGLE_DRIVE_INCOMING_FOLDER_ID'], path,
+                           name=f"c{cycle:05d}_{os.path.basename(path)}")
+        with contextlib.redirect_stdout(log):
+            agent.run_once()
+        for folder in ('GOOGLE_DRIVE_VERIFIED_FOLDER_ID', 'GOOGLE_DRIVE_NEEDS_REVIEW_FOLDER_ID'):
+            drive.forget_folder(FOLDERS[folder])
+        cycle += 1
+
+        done = processed()
+        if done >= next_sample or done >= documents:
+            tracer.flush()
+            gc.collect()
+            samples.append({'documents': done, 'memory_mb': current_memory_mb(),
+                            'elapsed_s': round(time.perf_counter() - start, 1)})
+            print(f"  {done:>7} docs  {samples[-1]['memory_mb']:>8} MB  {samples[-1]['elapsed_s']:>8}s")
+            next_sample = done + sample_every
+
+    warm = [s for s in samples if s['documents'] >= documents * warmup_fraction] or samples[-1:]
+    baseline = warm[0]['memory_mb']
+    return {
+        'documents': done,
+        'cycles': cycle,
+        'wall_seconds': round(time.perf_counter() - start, 1),
+        'baseline_mb': baseline,
+        'final_mb': samples[-1]['memory_mb'],
+        'growth_mb': round(samples[-1]['memory_mb'] - baseline, 1),
+        'growth_mb_per_1k_docs': growth_per_1k(warm),
+        'samples': samples,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Long-running VisaAgent memory soak test')
+    parser.add_argument('--documents', type=int, default=10000, help='Documents to process')
+    parser.add_argument('--batch', type=int, default=50, help='Files uploaded per polling cycle')
+    parser.add_argument('--sample-every', type=int, default=500, help='Documents between memory samples')
+    parser.add_argument('--warmup', type=float, default=0.1, help='Share of the run before the baseline sample')
+    parser.add_argument('--max-growth-mb', type=float, default=None, help='Exit non-zero if memory grows more than this after warm-up')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--output', help='Results JSON path (default: benchmarks/results/soak_<timestamp>.json)')
+    parser.add_argument('--verbose', action='store_true', help='Show agent output')
+    args = parser.parse_args()
+
+    print(f"▶ Soaking the agent with {args.documents} documents ({args.batch} files per cycle)...")
+    result = run_soak(args.documents, args.batch, args.sample_every, args.warmup, args.seed, args.verbose)
+    report = {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'git_commit': git_commit(),
+        'options': vars(args),
+        'result': result,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"soak_{datetime.datetime.now():%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print(f"\nBaseline {result['baseline_mb']} MB after warm-up, final {result['final_mb']} MB "
+          f"({result['growth_mb']:+} MB, {result['growth_mb_per_1k_docs']:+} MB per 1k docs)")
+    print(f"✓ Results saved to {output}")
+    if args.max_growth_mb is not None and result['growth_mb'] > args.max_growth_mb:
+        print(f"✗ Memory grew by more than {args.max_growth_mb} MB")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
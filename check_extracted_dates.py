@@ -1,4 +1,4 @@
-from services.database_service import SessionLocal, VisaApplication
+from services.database_service import SessionLocal, VisaApplication, init_db
 import json
 
 def check_dates():
@@ -20,4 +20,5 @@ def check_dates():
         print(f"{app.file_name:<40} | AI: {extracted_expiry} | DB: {expiry_in_db}")
 
 if __name__ == "__main__":
+    init_db()
     check_dates()
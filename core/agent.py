@@ -7,22 +7,45 @@ from dotenv import load_dotenv
 # Add project root to sys.path
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from services.database_service import SessionLocal, VisaApplication, Applicant, DocumentChecklist, init_db, cleanup_database
+from services.database_service import SessionLocal, VisaApplication, DocumentChecklist, init_db
 from services.google_drive_service import GoogleDriveService
 from services.openai_service import OpenAIService
 from services.email_service import EmailService
 from core.utils import extract_text_from_pdf, get_file_extension, is_archive, extract_archive
+from core.tracing import tracer
+from services.metrics_service import metrics
+from services.lease_service import LeaseService, LeaseLost
+from services.application_store import ApplicationBatch, ApplicantCache, upsert_applications
 import json
 import shutil
+from contextlib import contextmanager
 from dateutil.parser import parse
 
 load_dotenv()
 
+# Document outcomes that leave no result; the file's lease is released for a retry
+FAILED_OUTCOMES = ('unsupported', 'classify_failed', 'analyze_failed')
+
+class DocumentFailed(Exception):
+    """A standalone document ended without a result (see FAILED_OUTCOMES)."""
+
 class VisaAgent:
-    def __init__(self):
-        self.db = SessionLocal()
-        self.drive = GoogleDriveService()
-        self.openai = OpenAIService()
+    def __init__(self, drive=None, openai_service=None, mail_config=None, leases=None):
+        """
+        Args:
+            drive: Drive client; defaults to GoogleDriveService (benchmarks pass a local fake)
+            openai_service: OpenAIService instance; defaults to one using OPENAI_API_KEY
+            mail_config: Notification templates; defaults to mail_config.json
+            leases: LeaseService coordinating with other workers; defaults to a new worker ID
+        """
+        self._db = None  # Opened per job, see session_scope()
+        self._scope_depth = 0
+        self.drive = drive or GoogleDriveService()
+        self.openai = openai_service or OpenAIService()
+        self.leases = leases or LeaseService()
+        self.applicants = ApplicantCache()
+        self.batch = None  # ApplicationBatch while an archive is being processed
+        self.lease_lost = None  # Event set by the lease heartbeat if the current file's lease is lost
         # Email service might require interaction for first-time OAuth, 
         # so we initialize it only when needed or if token exists.
         self.email = None 
@@ -33,9 +56,50 @@ class VisaAgent:
         self.needs_review_folder_id = os.getenv("GOOGLE_DRIVE_NEEDS_REVIEW_FOLDER_ID")
         
         # Load mail configuration
-        config_path = os.path.join(os.path.dirname(__file__), '..', 'mail_config.json')
-        with open(config_path, 'r') as f:
-            self.mail_config = json.load(f)
+        if mail_config is None:
+            config_path = os.path.join(os.path.dirname(__file__), '..', 'mail_config.json')
+            with open(config_path, 'r') as f:
+                mail_config = json.load(f)
+        self.mail_config = mail_config
+
+    @property
+    def db(self):
+        """Session for the current job, opened on first use."""
+        if self._db is None:
+            # Nothing outlives the job's scope, so there is no point expiring (and reloading) rows on commit
+            self._db = SessionLocal(expire_on_commit=False)
+        return self._db
+
+    @db.setter
+    def db(self, session):
+        # Use a caller-provided session until the current scope ends
+        self._db = session
+
+    @contextmanager
+    def session_scope(self):
+        """
+        Scopes the agent's session to one job. When the outermost scope exits the
+        session is closed, dropping its identity map, so a long-running agent
+        neither accumulates rows over days of uptime nor serves rows cached
+        before another process changed them.
+        """
+        self._scope_depth += 1
+        try:
+            yield self.db
+        except Exception:
+            if self._db is not None:
+                self._db.rollback()
+            raise
+        finally:
+            self._scope_depth -= 1
+            if self._scope_depth == 0:
+                self.close_session()
+
+    def close_session(self):
+        """Closes the current session, if any; the next use of `db` opens a fresh one."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
 
     def run_once(self):
         """Runs one iteration of the document processing pipeline."""
@@ -44,17 +108,19 @@ class VisaAgent:
         
         print(f"\n[{timestamp}] === AGENT POLLING CYCLE START ===")
         
-        # Perform database cleanup
-        cleanup_database(self.db)
-        
         print(f"[{timestamp}] Checking for new documents in Google Drive...")
+        listed_at = datetime.now()
         try:
-            all_files = self.drive.list_files_in_folder(self.incoming_folder_id)
+            with tracer.trace("list", folder="incoming") as list_span:
+                all_files = self.drive.list_files_in_folder(self.incoming_folder_id)
+                list_span.set(file_count=len(all_files))
             print(f"[{timestamp}] ✓ Successfully queried Google Drive")
         except Exception as e:
             print(f"[{timestamp}] ✗ ERROR querying Google Drive: {e}")
             import traceback
             traceback.print_exc()
+            metrics.inc("visa_agent_poll_cycles_total", outcome="list_error")
+            metrics.flush()
             return
         
         # Filter out folders to avoid processing errors
@@ -64,9 +130,12 @@ class VisaAgent:
         if folders:
             print(f"[{timestamp}] Skipping {len(folders)} subfolders in incoming (Recursive scanning not yet implemented).")
         
+        self.record_inbox_metrics(files)
         if not files:
             print(f"[{timestamp}] No new files found.")
             print(f"[{timestamp}] === AGENT POLLING CYCLE END (No files) ===")
+            metrics.inc("visa_agent_poll_cycles_total", outcome="empty")
+            metrics.flush()
             return
         
         print(f"[{timestamp}] Found {len(files)} file(s) to process:")
@@ -74,38 +143,129 @@ class VisaAgent:
             print(f"[{timestamp}]   - {f['name']} (ID: {f['id']})")
 
         for file in files:
-            try:
-                self.process_file(file)
-            except Exception as e:
-                print(f"[{timestamp}] ✗ ERROR processing file {file['name']}: {e}")
-                import traceback
-                traceback.print_exc()
-                self.db.rollback()  # Ensure session is clean for next file
+            # Other workers may be polling the same folder; only the lease winner touches the file
+            if not self.leases.claim(file['id'], file['name'], seen_at=listed_at):
+                print(f"[{timestamp}] ↷ Skipping {file['name']} (claimed by another worker)")
+                metrics.inc("visa_agent_leases_total", outcome="contended")
+                continue
+            metrics.inc("visa_agent_leases_total", outcome="claimed")
+            self.process_claimed_file(file)
         
+        metrics.inc("visa_agent_poll_cycles_total", outcome="processed")
+        metrics.flush()
         print(f"[{timestamp}] === AGENT POLLING CYCLE END ===")
 
-    def process_file(self, file_info):
-        """Main entry point for file processing. Handles both archives and single files."""
+    def process_claimed_file(self, file_info, source_folder_id=None):
+        """
+        Processes a file this worker holds the lease for, heartbeating while it runs.
+        On failure the lease is released for a retry, or the file is moved to the
+        Needs Review folder once it has used up its attempts.
+        """
+        file_id = file_info['id']
+        start = time.perf_counter()
+        try:
+            with self.leases.keep_alive(file_id) as lost, self.session_scope():
+                self.lease_lost = lost
+                try:
+                    self.process_file(file_info, source_folder_id=source_folder_id)
+                finally:
+                    self.lease_lost = None
+            if lost.is_set():
+                raise LeaseLost(f"Lease on {file_info['name']} was lost before it completed")
+            self.leases.complete(file_id)
+            metrics.inc("visa_agent_files_total", outcome="ok")
+        except LeaseLost as e:
+            # Another worker owns the file now; leave the lease and the file to it
+            print(f"⚠ {e}; abandoning it")
+            metrics.inc("visa_agent_files_total", outcome="lease_lost")
+        except Exception as e:
+            print(f"✗ ERROR processing file {file_info['name']}: {e}")
+            import traceback
+            traceback.print_exc()
+            metrics.inc("visa_agent_files_total", outcome="error")
+            self.release_failed_file(file_info, e)
+        metrics.observe("visa_agent_file_seconds", time.perf_counter() - start)
+
+    def check_lease(self):
+        """Raises LeaseLost if the lease on the file being processed was lost; called before writing results."""
+        if self.lease_lost is not None and self.lease_lost.is_set():
+            raise LeaseLost("Lease was lost to another worker")
+
+    def release_failed_file(self, file_info, error):
+        """Releases a failed file's lease for a retry, or parks it in Needs Review when out of attempts."""
+        if self.leases.release(file_info['id'], error=error) == 'failed':
+            print(f"  ✗ {file_info['name']} failed {self.leases.max_attempts} times, moving to Needs Review")
+            try:
+                self.drive.move_file(file_info['id'], self.processing_folder_id, self.needs_review_folder_id)
+            except Exception as move_error:
+                print(f"  ✗ Failed to move {file_info['name']} to Needs Review: {move_error}")
+
+    def record_inbox_metrics(self, files):
+        """Publishes inbox depth and the age of the oldest waiting file as gauges."""
+        metrics.set_gauge("visa_agent_inbox_depth", len(files))
+        oldest_age = 0
+        now = datetime.datetime.now(datetime.timezone.utc)
+        for f in files:
+            try:
+                created = parse(f['createdTime'])
+                oldest_age = max(oldest_age, (now - created).total_seconds())
+            except Exception:
+                continue
+        metrics.set_gauge("visa_agent_inbox_oldest_age_seconds", round(oldest_age, 1))
+
+    def process_traced_document(self, span_attributes=None, **kwargs):
+        """Runs `process_single_document` inside a document span and records its outcome."""
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            with tracer.span("document", **(span_attributes or {})) as document_span:
+                self.process_single_document(**kwargs)
+            outcome = document_span.outcome
+        finally:
+            metrics.inc("visa_agent_documents_total", outcome=outcome)
+            metrics.observe("visa_agent_document_seconds", time.perf_counter() - start)
+        return outcome
+
+    def process_file(self, file_info, source_folder_id=None):
+        """
+        Main entry point for file processing. Handles both archives and single files.
+
+        Args:
+            file_info: Drive file metadata (id, name, size, ...)
+            source_folder_id: Folder the file is in; defaults to the incoming folder
+        """
         file_id = file_info['id']
         file_name = file_info['name']
         print(f"Processing {file_name}...")
 
-        # 1. Move to processing
-        self.drive.move_file(file_id, self.incoming_folder_id, self.processing_folder_id)
-        
-        # 2. Download file
-        temp_path = f"tmp_{file_name}"
-        self.drive.download_file(file_id, temp_path)
-        
-        # 3. Check if archive
-        if is_archive(temp_path):
-            self.process_archive(file_id, file_name, temp_path)
-        else:
-            self.process_single_document(file_id, file_name, temp_path, applicant_name=None)
-        
-        # Cleanup
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        file_size = int(file_info['size']) if file_info.get('size') else None
+        with tracer.trace("process_file", file_id=file_id, file_name=file_name, file_size=file_size):
+            # 1. Move to processing (reclaimed files are already there)
+            source_folder_id = source_folder_id or self.incoming_folder_id
+            if source_folder_id != self.processing_folder_id:
+                with tracer.span("move", destination="processing"):
+                    self.drive.move_file(file_id, source_folder_id, self.processing_folder_id)
+            
+            # 2. Download file
+            temp_path = f"tmp_{file_name}"
+            with tracer.span("download") as download_span:
+                self.drive.download_file(file_id, temp_path)
+                if os.path.exists(temp_path):
+                    download_span.set(file_size=os.path.getsize(temp_path))
+            
+            # 3. Check if archive
+            outcome = None
+            if is_archive(temp_path):
+                self.process_archive(file_id, file_name, temp_path)
+            else:
+                outcome = self.process_traced_document(file_id=file_id, file_name=file_name, file_path=temp_path, applicant_name=None)
+            
+            # Cleanup
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            # Transient OpenAI failures end here too, so the lease must not be marked done
+            if outcome in FAILED_OUTCOMES:
+                raise DocumentFailed(f"{file_name}: {outcome}")
         print(f"Finished processing {file_name}")
 
     def process_archive(self, archive_file_id, archive_file_name, archive_path):
@@ -116,57 +276,110 @@ class VisaAgent:
         
         # 2. Extract archive to temporary directory
         extract_dir = f"tmp_extract_{applicant_name}"
-        extracted_files = extract_archive(archive_path, extract_dir)
+        with tracer.span("extract", kind="archive") as extract_span:
+            extracted_files = extract_archive(archive_path, extract_dir)
+            extract_span.set(member_count=len(extracted_files))
         
         if not extracted_files:
             print(f"No files extracted from {archive_file_name}")
+            tracer.current().set(outcome="empty_archive")
             return
         
-        # Process each extracted file
-        for extracted_file_path in extracted_files:
-            try:
-                # Use absolute path for OS operations
-                abs_file_path = os.path.abspath(extracted_file_path)
-                
-                # Get filename for display and DB
-                file_name_for_db = os.path.basename(abs_file_path)
-                
-                # Skip macOS metadata files and empty directories
-                if file_name_for_db.startswith('._') or '__MACOSX' in abs_file_path or os.path.isdir(abs_file_path):
-                    continue
-                    
-                print(f"  → Processing {file_name_for_db} from archive...")
-                
-                # Process document
-                # Create a composite document ID to satisfy uniqueness
-                composite_id = f"{archive_file_id}:{file_name_for_db}"
-                
-                # Get or Create Applicant
-                applicant = self.db.query(Applicant).filter(Applicant.full_name == applicant_name).first()
-                if not applicant:
-                    applicant = Applicant(full_name=applicant_name, application_status="Processing")
-                    self.db.add(applicant)
-                    self.db.commit()
-                
-                self.process_single_document(
-                    file_id=composite_id,
-                    file_name=file_name_for_db,
-                    file_path=abs_file_path,
-                    applicant_name=applicant_name,
-                    applicant_id=applicant.id
-                )
-            except Exception as e:
-                print(f"  ✗ Error processing {extracted_file_path}: {e}")
-                self.db.rollback()
+        # Process each extracted file; results are written together at the end
+        self.batch = ApplicationBatch(self.db)
+        try:
+            for extracted_file_path in extracted_files:
+                try:
+                    self.process_archive_member(archive_file_id, applicant_name, extracted_file_path)
+                except Exception as e:
+                    print(f"  ✗ Error processing {extracted_file_path}: {e}")
+                    self.db.rollback()
+            self.check_lease()
+            with tracer.span("db_commit", rows=len(self.batch)):
+                self.batch.flush()
+        finally:
+            self.batch = None
         
         # Cleanup extraction directory AFTER loop
         if os.path.exists(extract_dir):
             shutil.rmtree(extract_dir)
         
         # Move archive to verified folder
-        self.drive.move_file(archive_file_id, self.processing_folder_id, self.verified_folder_id)
+        with tracer.span("move", destination="verified"):
+            self.drive.move_file(archive_file_id, self.processing_folder_id, self.verified_folder_id)
         print(f"✓ Batch processing complete for {applicant_name} ({len(extracted_files)} documents)")
 
+    def get_or_create_applicant(self, applicant_name):
+        """Returns the id of the applicant for a batch upload, creating it on first sight."""
+        return self.applicants.get_or_create(applicant_name)
+
+    def save_application(self, row):
+        """
+        Stores a document result: added to the current archive batch, or upserted
+        and committed straight away for a standalone document.
+        """
+        if self.batch is not None:
+            self.batch.add(row)
+            return
+        self.check_lease()
+        try:
+            with tracer.span("db_commit"):
+                upsert_applications(self.db, [row])
+                self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+
+    def process_archive_member(self, archive_file_id, applicant_name, extracted_file_path):
+        """
+        Processes one file extracted from an applicant's archive.
+
+        Returns:
+            Document outcome, or None if the entry was skipped (macOS metadata, directories)
+        """
+        # Use absolute path for OS operations
+        abs_file_path = os.path.abspath(extracted_file_path)
+        
+        # Get filename for display and DB
+        file_name_for_db = os.path.basename(abs_file_path)
+        
+        # Skip macOS metadata files and empty directories
+        if file_name_for_db.startswith('._') or '__MACOSX' in abs_file_path or os.path.isdir(abs_file_path):
+            return None
+            
+        print(f"  → Processing {file_name_for_db} from archive...")
+        
+        # Process document
+        # Create a composite document ID to satisfy uniqueness
+        composite_id = f"{archive_file_id}:{file_name_for_db}"
+        
+        applicant_id = self.get_or_create_applicant(applicant_name)
+        
+        return self.process_traced_document(
+            span_attributes={
+                "file_id": composite_id,
+                "file_name": file_name_for_db,
+                "file_size": os.path.getsize(abs_file_path),
+                "applicant_id": applicant_id
+            },
+            file_id=composite_id,
+            file_name=file_name_for_db,
+            file_path=abs_file_path,
+            applicant_name=applicant_name,
+            applicant_id=applicant_id
+        )
+
+    @staticmethod
+    def application_row(**values):
+        """A visa_applications row for the store; every row has the same columns so batches share one statement."""
+        row = dict.fromkeys((
+            'applicant_id', 'visa_subclass', 'document_type', 'status', 'completeness_score', 'ai_analysis',
+            'processing_stage', 'expiry_date', 'confidence_score', 'field_confidence', 'ocr_metadata'
+        ))
+        row.update(upload_date=datetime.datetime.now(), verification_status='pending', version=1)
+        row.update(values)
+        return row
+
     def process_single_document(self, file_id, file_name, file_path, applicant_name=None, applicant_id=None):
         """Process a single document (either standalone or from archive)."""
         doc_type = "Unknown"
@@ -178,7 +391,8 @@ class VisaAgent:
         file_ext = file_path.lower()
         
         if file_ext.endswith('.pdf'):
-            result = extract_text_from_pdf(file_path, openai_service=self.openai)
+            with tracer.span("extract", kind="pdf"):
+                result = extract_text_from_pdf(file_path, openai_service=self.openai)
             # Handle both old (string) and new (tuple) return formats
             if isinstance(result, tuple):
                 text, ocr_metadata = result
@@ -186,7 +400,8 @@ class VisaAgent:
                 text = result
         elif file_ext.endswith(('.jpg', '.jpeg', '.png', '.heic')):
             print(f"  → Performing OCR on image: {file_name}")
-            ocr_result = self.openai.ocr_from_images([file_path])
+            with tracer.span("ocr", kind="image", page_count=1):
+                ocr_result = self.openai.ocr_from_images([file_path])
             if isinstance(ocr_result, dict):
                 text = ocr_result.get("transcribed_text", "")
                 ocr_metadata = {
@@ -201,36 +416,38 @@ class VisaAgent:
         else:
             # Handle other file types (images etc if added later)
             print(f"Skipping text extraction for unsupported file type: {file_name}")
+            tracer.current().set(outcome="unsupported")
             return
         
         if not text.strip():
             print(f"  ✗ OCR failed or no text extracted from {file_name}, flagging as Needs Review")
             # Store in database even if text extraction fails, so it shows on dashboard
             unique_file_name = f"{applicant_name}/{file_name}" if applicant_name else file_name
-            app_entry = VisaApplication(
-                document_id=file_id,
-                visa_subclass=visa_subclass or "Unknown",
-                document_type=doc_type or "Unknown",
-                file_name=unique_file_name,
-                status="Needs Review",
-                completeness_score=0,
-                ai_analysis={"error": "OCR/Text extraction failed. Manual review required."},
-                processing_stage="Text Extraction Failed",
-                upload_date=datetime.datetime.now(),
-                applicant_id=applicant_id
-            )
-            self.db.add(app_entry)
             try:
-                self.db.commit()
+                self.save_application(self.application_row(
+                    document_id=file_id,
+                    file_name=unique_file_name,
+                    applicant_id=applicant_id,
+                    visa_subclass=visa_subclass or "Unknown",
+                    document_type=doc_type or "Unknown",
+                    status="Needs Review",
+                    completeness_score=0,
+                    ai_analysis={"error": "OCR/Text extraction failed. Manual review required."},
+                    processing_stage="Text Extraction Failed"
+                ))
             except Exception as e:
                 print(f"  ✗ Database commit failed for {file_name}: {e}")
-                self.db.rollback()
+            tracer.current().set(outcome="no_text")
             return
         
         # Classify document
-        classification = self.openai.classify_document(text)
+        with tracer.span("classify") as classify_span:
+            classification = self.openai.classify_document(text)
+            if not classification:
+                classify_span.set(outcome="failed")
         if not classification:
             print(f"  ✗ Classification failed for {file_name}")
+            tracer.current().set(outcome="classify_failed")
             return
 
         doc_type = classification.get('document_type', 'Unknown')
@@ -239,9 +456,13 @@ class VisaAgent:
         print(f"  ✓ Classified as {doc_type} for Subclass {visa_subclass}")
 
         # AI Verify against requirements
-        analysis = self.openai.analyze_document(text, visa_subclass, doc_type)
+        with tracer.span("analyze", document_type=doc_type) as analyze_span:
+            analysis = self.openai.analyze_document(text, visa_subclass, doc_type)
+            if not analysis:
+                analyze_span.set(outcome="failed")
         if not analysis:
             print(f"  ✗ Analysis failed for {file_name}")
+            tracer.current().set(outcome="analyze_failed")
             return
         
         # --- SMART RETRY LOGIC FOR OCR ---
@@ -253,13 +474,15 @@ class VisaAgent:
             print(f"  ⚠ Low completeness score ({completeness_score}) for {file_name}. Retrying with Forced OCR...")
             
             # 1. Force OCR extraction
-            text_ocr, ocr_metadata_new = extract_text_from_pdf(file_path, openai_service=self.openai, force_ocr=True)
+            with tracer.span("extract", kind="pdf", forced_ocr=True):
+                text_ocr, ocr_metadata_new = extract_text_from_pdf(file_path, openai_service=self.openai, force_ocr=True)
             
             # 2. Re-classify (optional, but good if OCR text changes context)
             # classification_new = self.openai.classify_document(text_ocr)
             
             # 3. Re-analyze with new text
-            analysis_new = self.openai.analyze_document(text_ocr, visa_subclass, doc_type)
+            with tracer.span("analyze", document_type=doc_type, forced_ocr=True):
+                analysis_new = self.openai.analyze_document(text_ocr, visa_subclass, doc_type)
             
             if analysis_new:
                 new_score = analysis_new.get('completeness_score', 0)
@@ -276,7 +499,6 @@ class VisaAgent:
         # Store/Update in Database
         # For batch uploads, use "applicant_name/file_name" as unique identifier
         unique_file_name = f"{applicant_name}/{file_name}" if applicant_name else file_name
-        existing_app = self.db.query(VisaApplication).filter(VisaApplication.file_name == unique_file_name).first()
         
         # Extract potential expiry date
         expiry_date = None
@@ -318,79 +540,48 @@ class VisaAgent:
                 except:
                     print(f"  ! Could not parse expiry date: {expiry_str}")
 
-        if existing_app:
-            print(f"  → Updating existing record for {file_name}")
-            
-            # Smart ID Update Logic:
-            # Only update document_id if the new ID is a real Drive file (no ':') 
-            # OR if the existing ID is already a composite/broken ID (has ':').
-            # This prevents overwriting a valid "Online Link" with a composite archive ID.
-            if ':' not in file_id or (existing_app.document_id and ':' in existing_app.document_id):
-                existing_app.document_id = file_id
-            else:
-                print(f"  ℹ Preserving valid link {existing_app.document_id} (ignoring composite {file_id})")
-            existing_app.visa_subclass = visa_subclass
-            existing_app.document_type = doc_type
-            completeness_score = analysis.get('completeness_score', 0)
-            existing_app.status = "Passed" if completeness_score >= 90 else "Needs Review"
-            existing_app.completeness_score = completeness_score
-            existing_app.ai_analysis = analysis
-            existing_app.processing_stage = "Verified"
-            existing_app.upload_date = datetime.datetime.now()
-            existing_app.expiry_date = expiry_date
-            # Save confidence scoring fields
-            existing_app.confidence_score = analysis.get('confidence_score')
-            existing_app.field_confidence = analysis.get('field_confidence')
-            existing_app.ocr_metadata = ocr_metadata if ocr_metadata else None
-            existing_app.verification_status = 'verified' if analysis.get('confidence_score', 100) >= 70 else 'pending'
-        else:
-            print(f"  → Creating new record for {file_name}")
-            completeness_score = analysis.get('completeness_score', 0)
-            # Determine compliance status based on completeness score
-            compliance_status = "Passed" if completeness_score >= 90 else "Needs Review"
-            
-            # Extract confidence fields from analysis
-            confidence_score = analysis.get('confidence_score')
-            field_confidence = analysis.get('field_confidence')
-            verification_status = 'verified' if (confidence_score or 100) >= 70 else 'pending'
-
-            app_entry = VisaApplication(
+        # Inserted, or updated in place if this file was processed before
+        print(f"  → Saving record for {file_name}")
+        completeness_score = analysis.get('completeness_score', 0)
+        confidence_score = analysis.get('confidence_score')
+        try:
+            self.save_application(self.application_row(
                 document_id=file_id,
-                file_name=unique_file_name, # Use unique_file_name here
+                file_name=unique_file_name,
+                applicant_id=applicant_id,
                 visa_subclass=visa_subclass,
                 document_type=doc_type,
-                status=compliance_status,
+                status="Passed" if completeness_score >= 90 else "Needs Review",
                 completeness_score=completeness_score,
                 ai_analysis=analysis,
                 processing_stage="Verified",
-                upload_date=datetime.datetime.now(),
-                applicant_id=applicant_id,
                 expiry_date=expiry_date,
-                # Add confidence scoring fields
                 confidence_score=confidence_score,
-                field_confidence=field_confidence,
+                field_confidence=analysis.get('field_confidence'),
                 ocr_metadata=ocr_metadata if ocr_metadata else None,
-                verification_status=verification_status
-            )
-            self.db.add(app_entry)
-            
-        try:
-            self.db.commit()
+                verification_status='verified' if (confidence_score or 100) >= 70 else 'pending'
+            ))
         except Exception as e:
             print(f"  ✗ Database commit failed: {e}")
-            self.db.rollback()
             raise
+        tracer.current().set(status="Passed" if completeness_score >= 90 else "Needs Review")
 
         # For standalone files (not from archive), move to verified folder
         if not applicant_name:
-            self.drive.move_file(file_id, self.processing_folder_id, self.verified_folder_id)
-            self.notify_applicant(file_name, "Verified", visa_subclass=visa_subclass, score=analysis.get('completeness_score', 100))
+            with tracer.span("move", destination="verified"):
+                self.drive.move_file(file_id, self.processing_folder_id, self.verified_folder_id)
+            with tracer.span("notify"):
+                self.notify_applicant(file_name, "Verified", visa_subclass=visa_subclass, score=analysis.get('completeness_score', 100))
             print(f"  ✓ {file_name} processed and moved to Verified")
 
     def sync_folders(self):
         """Reconciles database status with actual file locations in Google Drive."""
         print("Syncing folder states with database...")
         
+        with self.session_scope():
+            self._sync_folder_statuses()
+
+    def _sync_folder_statuses(self):
         # 1. Check Verified Folder
         verified_files = self.drive.list_files_in_folder(self.verified_folder_id)
         for f in verified_files:
@@ -444,24 +635,42 @@ class VisaAgent:
                 # Optional: log traceback
                 import traceback
                 traceback.print_exc()
+            finally:
+                # Nothing is carried from one cycle to the next
+                self.close_session()
             
             time.sleep(interval)
 
     def recover_stuck_files(self):
-        """Checks for files stuck in process folder and moves them back to incoming."""
+        """
+        Reclaims files in the processing folder whose worker has gone away (lease
+        expired, released after a failure, or never recorded) and processes them
+        in place. Files with a live lease are left to their owner.
+        """
         print("Checking for stuck files in processing folder...")
         stuck_files = self.drive.list_files_in_folder(self.processing_folder_id)
         # Filter out folders from recovery as well
         stuck_files = [f for f in stuck_files if f.get('mimeType') != 'application/vnd.google-apps.folder']
         
-        if stuck_files:
-            print(f"Found {len(stuck_files)} potentially stuck files. Moving back to incoming for retry.")
-            for f in stuck_files:
-                try:
-                    self.drive.move_file(f['id'], self.processing_folder_id, self.incoming_folder_id)
-                    print(f"  → Recovered {f['name']}")
-                except Exception as e:
-                    print(f"  ✗ Failed to recover {f['name']}: {e}")
+        for f in stuck_files:
+            lease = self.leases.get(f['id'])
+            if lease and lease.status in ('done', 'failed'):
+                continue
+            # The claim only succeeds if the lease is missing, released or expired
+            if not self.leases.claim(f['id'], f['name']):
+                if self.leases.fail_exhausted(f['id']):
+                    print(f"  ✗ {f['name']} ran out of attempts, moving to Needs Review")
+                    try:
+                        self.drive.move_file(f['id'], self.processing_folder_id, self.needs_review_folder_id)
+                    except Exception as e:
+                        print(f"  ✗ Failed to move {f['name']} to Needs Review: {e}")
+                continue
+            print(f"  → Reclaimed {f['name']} from {lease.owner if lease else 'an unknown worker'}")
+            metrics.inc("visa_agent_leases_total", outcome="reclaimed")
+            try:
+                self.process_claimed_file(f, source_folder_id=self.processing_folder_id)
+            except Exception as e:
+                print(f"  ✗ Failed to recover {f['name']}: {e}")
 
 if __name__ == "__main__":
     init_db()
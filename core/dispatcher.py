@@ -0,0 +1,310 @@
+"""
+Document Dispatcher
+Fans the inbox out as one task per standalone file or archive member, runs the
+tasks through an executor with bounded concurrency, and collects the results
+back onto the document lease rows.
+
+Executors:
+    LocalExecutor - thread pool in this process (tests, local runs, benchmarks)
+    ModalExecutor - one Modal function call per task via `.map()` (see modal_app.py)
+
+Each archive is downloaded once, by the dispatcher. Local member tasks extract
+their member from that copy; Modal member tasks run in other containers, so
+they carry the member's bytes (up to MAX_INLINE_MEMBER_BYTES; a larger member's
+task downloads the archive itself).
+"""
+
+import os
+import sys
+import time
+import shutil
+import datetime
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.utils import is_archive, list_archive_members, extract_archive_member, read_archive_member
+from core.tracing import tracer
+from services.metrics_service import metrics
+
+FOLDER_MIME_TYPE = 'application/vnd.google-apps.folder'
+MAX_INLINE_MEMBER_BYTES = int(os.getenv("DISPATCH_MAX_INLINE_MEMBER_BYTES", str(20 * 1024 * 1024)))
+
+_thread_state = threading.local()
+
+
+def _task_agent(agent_factory=None):
+    """One VisaAgent per worker thread (each agent opens its own session per task)."""
+    agent = getattr(_thread_state, 'agent', None)
+    if agent is None:
+        if agent_factory is None:
+            from core.agent import VisaAgent
+            agent_factory = VisaAgent
+        agent = _thread_state.agent = agent_factory()
+    return agent
+
+
+def run_task(task, agent_factory=None):
+    """
+    Processes one dispatched task. Runs locally or inside a Modal container.
+
+    Args:
+        task: Dict with kind 'file' (file_info) or 'archive_member'
+              (archive_info, member, applicant_name, and the member as either
+              archive_path, a local copy of the archive, or member_bytes; with
+              neither the archive is downloaded)
+        agent_factory: Callable returning a VisaAgent; defaults to VisaAgent()
+
+    Returns:
+        Result dict: task_id, kind, outcome ('ok', document outcome or 'error'), error, duration_ms
+    """
+    start = time.perf_counter()
+    result = {'task_id': task['task_id'], 'kind': task['kind'], 'outcome': 'error', 'error': None}
+    agent = _task_agent(agent_factory)
+    try:
+        # One session per task; the thread's agent is reused but carries no rows between tasks
+        with agent.session_scope():
+            if task['kind'] == 'file':
+                # The dispatcher already moved the file to processing under its lease
+                agent.process_file(task['file_info'], source_folder_id=agent.processing_folder_id)
+                result['outcome'] = 'ok'
+            else:
+                archive = task['archive_info']
+                member_name = os.path.basename(task['member'])
+                work_dir = tempfile.mkdtemp(prefix="member_")
+                try:
+                    with tracer.trace("process_member", file_id=f"{archive['id']}:{member_name}",
+                                      file_name=member_name, archive_id=archive['id']):
+                        extract_dir = os.path.join(work_dir, 'extract')
+                        if task.get('member_bytes') is not None:
+                            os.makedirs(extract_dir)
+                            member_path = os.path.join(extract_dir, member_name)
+                            with open(member_path, 'wb') as f:
+                                f.write(task['member_bytes'])
+                        else:
+                            archive_path = task.get('archive_path')
+                            if not archive_path:
+                                archive_path = os.path.join(work_dir, archive['name'])
+                                with tracer.span("download") as download_span:
+                                    agent.drive.download_file(archive['id'], archive_path)
+                                    download_span.set(file_size=os.path.getsize(archive_path))
+                            with tracer.span("extract", kind="archive_member"):
+                                member_path = extract_archive_member(archive_path, task['member'], extract_dir)
+                        result['outcome'] = agent.process_archive_member(archive['id'], task['applicant_name'], member_path) or 'skipped'
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+    except Exception as e:
+        print(f"  ✗ Task {task['task_id']} failed: {e}")
+        result['error'] = str(e)[:1000]
+    finally:
+        metrics.flush()
+    result['duration_ms'] = round((time.perf_counter() - start) * 1000, 1)
+    return result
+
+
+class LocalExecutor:
+    """Runs tasks on a bounded thread pool in this process."""
+
+    shares_filesystem = True  # Tasks can read files the dispatcher downloaded
+
+    def __init__(self, max_concurrency=4, agent_factory=None):
+        self.max_concurrency = max_concurrency
+        self.agent_factory = agent_factory
+
+    def map(self, tasks):
+        with ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="dispatch") as pool:
+            return list(pool.map(lambda task: run_task(task, self.agent_factory), tasks))
+
+
+class ModalExecutor:
+    """
+    Runs each task as its own Modal function call. Concurrency is bounded by the
+    function's `max_containers` setting.
+
+    Args:
+        function: Modal function wrapping `run_task` (modal_app.process_document_task)
+    """
+
+    shares_filesystem = False
+
+    def __init__(self, function):
+        self.function = function
+
+    def map(self, tasks):
+        results = []
+        for task, result in zip(tasks, self.function.map(tasks, return_exceptions=True, order_outputs=True)):
+            if isinstance(result, Exception):
+                # The container itself failed (timeout, OOM); report it like a task error
+                result = {'task_id': task['task_id'], 'kind': task['kind'], 'outcome': 'error',
+                          'error': str(result)[:1000], 'duration_ms': None}
+            results.append(result)
+        return results
+
+
+class Dispatcher:
+    """
+    Claims inbox files, plans per-document tasks, runs them and records the results.
+
+    Args:
+        agent: VisaAgent used for listing, leases and folder moves
+        executor: LocalExecutor or ModalExecutor
+    """
+
+    def __init__(self, agent, executor):
+        self.agent = agent
+        self.executor = executor
+        self._work_dir = None  # Archives downloaded by `plan`, kept until `run` finishes
+
+    def plan(self):
+        """
+        Claims every inbox file this worker can get a lease on, moves it to
+        processing and expands archives into one task per member.
+
+        Returns:
+            (tasks, claimed) where claimed maps file id -> file info
+        """
+        agent = self.agent
+        listed_at = datetime.datetime.now()
+        with tracer.trace("list", folder="incoming") as list_span:
+            files = [f for f in agent.drive.list_files_in_folder(agent.incoming_folder_id)
+                     if f.get('mimeType') != FOLDER_MIME_TYPE]
+            list_span.set(file_count=len(files))
+        agent.record_inbox_metrics(files)
+
+        tasks, claimed = [], {}
+        for f in files:
+            if not agent.leases.claim(f['id'], f['name'], seen_at=listed_at):
+                metrics.inc("visa_agent_leases_total", outcome="contended")
+                continue
+            metrics.inc("visa_agent_leases_total", outcome="claimed")
+            try:
+                agent.drive.move_file(f['id'], agent.incoming_folder_id, agent.processing_folder_id)
+                if is_archive(f['name']):
+                    tasks.extend(self._archive_tasks(f))
+                else:
+                    tasks.append({'task_id': f['id'], 'kind': 'file', 'file_info': f})
+                claimed[f['id']] = f
+            except Exception as e:
+                print(f"  ✗ Could not dispatch {f['name']}: {e}")
+                agent.release_failed_file(f, e)
+        return tasks, claimed
+
+    def _archive_tasks(self, archive_info):
+        """Downloads an archive once and returns one task per member, each with the member's data."""
+        if self._work_dir is None:
+            self._work_dir = tempfile.mkdtemp(prefix="dispatch_")
+        archive_dir = tempfile.mkdtemp(dir=self._work_dir)
+        archive_path = os.path.join(archive_dir, archive_info['name'])
+        self.agent.drive.download_file(archive_info['id'], archive_path)
+        members = list_archive_members(archive_path)
+        shared = getattr(self.executor, 'shares_filesystem', False)
+
+        applicant_name = os.path.splitext(archive_info['name'])[0]
+        # Create the applicant up front so concurrent member tasks don't race to insert it
+        self.agent.get_or_create_applicant(applicant_name)
+        print(f"📦 Dispatching {len(members)} member(s) of {archive_info['name']}")
+        tasks = []
+        for member in members:
+            task = {
+                'task_id': f"{archive_info['id']}:{member}",
+                'kind': 'archive_member',
+                'archive_info': archive_info,
+                'member': member,
+                'applicant_name': applicant_name
+            }
+            if shared:
+                task['archive_path'] = archive_path
+            else:
+                data = read_archive_member(archive_path, member)
+                if len(data) <= MAX_INLINE_MEMBER_BYTES:
+                    task['member_bytes'] = data
+            tasks.append(task)
+        if not shared:
+            shutil.rmtree(archive_dir, ignore_errors=True)
+        return tasks
+
+    def run(self):
+        """
+        Dispatches the current inbox and waits for all tasks.
+
+        Returns:
+            Dict with files, tasks and per-outcome task counts
+        """
+        try:
+            tasks, claimed = self.plan()
+            if not tasks and not claimed:
+                print("No new files to dispatch.")
+                return {'files': 0, 'tasks': 0, 'outcomes': {}}
+
+            print(f"▶ Dispatching {len(tasks)} task(s) for {len(claimed)} file(s)")
+            with self.agent.leases.keep_alive(list(claimed)) as lost:
+                results = self.executor.map(tasks)
+        finally:
+            if self._work_dir is not None:
+                shutil.rmtree(self._work_dir, ignore_errors=True)
+                self._work_dir = None
+
+        self.collect(claimed, results, lease_lost=lost.is_set())
+        outcomes = {}
+        for result in results:
+            outcomes[result['outcome']] = outcomes.get(result['outcome'], 0) + 1
+        metrics.flush()
+        print(f"✓ Dispatch complete: {outcomes}")
+        return {'files': len(claimed), 'tasks': len(tasks), 'outcomes': outcomes}
+
+    def collect(self, claimed, results, lease_lost=False):
+        """
+        Records task results on each file's lease and finishes archives.
+
+        Args:
+            claimed: File id -> file info, as returned by `plan`
+            results: Task results from the executor
+            lease_lost: The heartbeat lost a lease while the tasks ran; files whose
+                lease this worker no longer holds are left to their new owner
+        """
+        agent = self.agent
+        by_file = {file_id: [] for file_id in claimed}
+        for result in results:
+            by_file[result['task_id'].split(':', 1)[0]].append(result)
+
+        for file_id, file_results in by_file.items():
+            file_info = claimed[file_id]
+            if lease_lost:
+                lease = agent.leases.get(file_id)
+                if not lease or lease.owner != agent.leases.worker_id or lease.status != 'claimed':
+                    print(f"⚠ Lease on {file_info['name']} was lost while it was processed; leaving it to its new owner")
+                    metrics.inc("visa_agent_files_total", outcome="lease_lost")
+                    continue
+            summary = {
+                'tasks': len(file_results),
+                'outcomes': [{k: r[k] for k in ('task_id', 'outcome', 'error', 'duration_ms')} for r in file_results]
+            }
+            errors = [r for r in file_results if r['outcome'] == 'error']
+            if not is_archive(file_info['name']) and errors:
+                metrics.inc("visa_agent_files_total", outcome="error")
+                agent.release_failed_file(file_info, errors[0]['error'])
+                continue
+
+            if is_archive(file_info['name']):
+                # Same as the serial path: failed members are logged, the archive is still filed
+                try:
+                    agent.drive.move_file(file_id, agent.processing_folder_id, agent.verified_folder_id)
+                except Exception as e:
+                    print(f"  ✗ Could not move {file_info['name']} to verified: {e}")
+                    agent.leases.release(file_id, error=e, result=summary)
+                    continue
+            metrics.inc("visa_agent_files_total", outcome="ok")
+            agent.leases.complete(file_id, result=summary)
+
+
+if __name__ == "__main__":
+    from core.agent import VisaAgent
+    from services.database_service import init_db
+
+    init_db()
+    agent = VisaAgent()
+    agent.recover_stuck_files()
+    Dispatcher(agent, LocalExecutor(max_concurrency=int(os.getenv("AGENT_MAX_CONCURRENCY", "4")))).run()
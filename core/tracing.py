@@ -0,0 +1,237 @@
+"""
+Pipeline Span Tracing
+Records timed spans around each stage of the document pipeline (list, move,
+download, extract, render, OCR, classify, analyze, DB commit, notify) into the
+local `pipeline_spans` table so that p50/p95 latency can be queried per stage.
+"""
+
+import os
+import sys
+import math
+import time
+import uuid
+import datetime
+import threading
+import contextvars
+from contextlib import contextmanager
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.database_service import SessionLocal, PipelineSpan
+from services.write_queue import get_writer
+
+# Attributes that describe the document being processed. Child spans inherit
+# them from their parent so every stage row carries the file it worked on.
+SPAN_COLUMNS = ('file_id', 'file_name', 'file_size', 'page_count')
+INHERITED_ATTRIBUTES = SPAN_COLUMNS + ('applicant_id',)
+
+_active_span = contextvars.ContextVar('active_pipeline_span', default=None)
+
+
+class Span:
+    """A single timed stage. Use `set()` to attach attributes or an outcome."""
+
+    def __init__(self, stage, trace_id=None, parent=None, attributes=None):
+        self.stage = stage
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_span_id = parent.span_id if parent else None
+        self.attributes = {}
+        if parent:
+            self.attributes.update({k: v for k, v in parent.attributes.items() if k in INHERITED_ATTRIBUTES})
+        self.attributes.update(attributes or {})
+        self.outcome = 'ok'
+        self.error = None
+        self.started_at = datetime.datetime.now()
+        self.duration_ms = None
+
+    @property
+    def recording(self):
+        return self.trace_id is not None
+
+    def set(self, outcome=None, **attributes):
+        """Updates span attributes (and optionally its outcome)."""
+        if outcome:
+            self.outcome = outcome
+        self.attributes.update(attributes)
+        return self
+
+    def to_record(self):
+        extra = {k: v for k, v in self.attributes.items() if k not in SPAN_COLUMNS}
+        return PipelineSpan(
+            trace_id=self.trace_id,
+            span_id=self.span_id,
+            parent_span_id=self.parent_span_id,
+            stage=self.stage,
+            file_id=self.attributes.get('file_id'),
+            file_name=self.attributes.get('file_name'),
+            file_size=self.attributes.get('file_size'),
+            page_count=self.attributes.get('page_count'),
+            outcome=self.outcome,
+            error=self.error,
+            attributes=extra or None,
+            started_at=self.started_at,
+            duration_ms=self.duration_ms
+        )
+
+
+class Tracer:
+    """Collects spans in memory and writes them to the database in batches."""
+
+    def __init__(self, session_factory=None, flush_threshold=100):
+        self.session_factory = session_factory or SessionLocal
+        self.flush_threshold = flush_threshold
+        self.enabled = os.getenv("PIPELINE_TRACING", "1") != "0"
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def current(self):
+        """Returns the active span, or a non-recording span if none is active."""
+        return _active_span.get() or Span('noop')
+
+    @contextmanager
+    def trace(self, stage, **attributes):
+        """
+        Opens a root span that starts a new trace. Nested inside an existing
+        trace it behaves exactly like `span()`.
+        """
+        parent = _active_span.get()
+        if parent is not None and parent.recording:
+            with self.span(stage, **attributes) as span:
+                yield span
+            return
+
+        trace_id = uuid.uuid4().hex if self.enabled else None
+        span = Span(stage, trace_id=trace_id, attributes=attributes)
+        try:
+            with self._run(span):
+                yield span
+        finally:
+            self.flush()
+
+    @contextmanager
+    def span(self, stage, **attributes):
+        """
+        Times a pipeline stage. Spans opened outside of a trace are not
+        recorded, so helpers can be traced without writing stray rows.
+        """
+        parent = _active_span.get()
+        trace_id = parent.trace_id if parent else None
+        span = Span(stage, trace_id=trace_id, parent=parent, attributes=attributes)
+        with self._run(span):
+            yield span
+
+    @contextmanager
+    def _run(self, span):
+        token = _active_span.set(span)
+        start = time.perf_counter()
+        try:
+            yield span
+        except Exception as e:
+            span.outcome = 'error'
+            span.error = str(e)[:1000]
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - start) * 1000
+            _active_span.reset(token)
+            # Let later siblings see attributes discovered by this stage (e.g. page count)
+            parent = _active_span.get()
+            if parent is not None:
+                for key in INHERITED_ATTRIBUTES:
+                    # None means not known yet, so it does not block what a child found
+                    if span.attributes.get(key) is not None and parent.attributes.get(key) is None:
+                        parent.attributes[key] = span.attributes[key]
+            if span.recording:
+                self._record(span)
+
+    def _record(self, span):
+        with self._lock:
+            self._pending.append(span)
+            should_flush = len(self._pending) >= self.flush_threshold
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """Writes buffered spans. Tracing failures never interrupt processing."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        if not pending:
+            return 0
+
+        records = [span.to_record() for span in pending]
+        try:
+            get_writer(self.session_factory).submit(lambda session: session.add_all(records))
+            return len(pending)
+        except Exception as e:
+            print(f"Warning: Could not write {len(pending)} pipeline spans: {e}")
+            return 0
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def stage_latency_percentiles(session, since=None, stages=None):
+    """
+    Computes per-stage latency percentiles from recorded spans.
+
+    Args:
+        session: Database session
+        since: Optional datetime; only spans started after it are included
+        stages: Optional list of stage names to restrict the report to
+
+    Returns:
+        Dict mapping stage -> {count, errors, p50_ms, p95_ms, max_ms}
+    """
+    query = session.query(PipelineSpan.stage, PipelineSpan.duration_ms, PipelineSpan.outcome)
+    if since:
+        query = query.filter(PipelineSpan.started_at >= since)
+    if stages:
+        query = query.filter(PipelineSpan.stage.in_(stages))
+
+    durations = {}
+    errors = {}
+    for stage, duration_ms, outcome in query.order_by(PipelineSpan.stage, PipelineSpan.duration_ms):
+        durations.setdefault(stage, []).append(duration_ms or 0)
+        if outcome == 'error':
+            errors[stage] = errors.get(stage, 0) + 1
+
+    report = {}
+    for stage, values in durations.items():
+        report[stage] = {
+            'count': len(values),
+            'errors': errors.get(stage, 0),
+            'p50_ms': round(_percentile(values, 50), 2),
+            'p95_ms': round(_percentile(values, 95), 2),
+            'max_ms': round(values[-1], 2)
+        }
+    return report
+
+
+# Process-wide tracer used by the agent and core utilities
+tracer = Tracer()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Pipeline stage latency report')
+    parser.add_argument('--hours', type=float, default=24, help='Only include spans from the last N hours')
+    args = parser.parse_args()
+
+    since = datetime.datetime.now() - datetime.timedelta(hours=args.hours)
+    session = SessionLocal()
+    try:
+        report = stage_latency_percentiles(session, since=since)
+    finally:
+        session.close()
+
+    print(f"{'Stage':<16} | {'Count':>6} | {'Errors':>6} | {'p50 ms':>10} | {'p95 ms':>10} | {'max ms':>10}")
+    print("-" * 72)
+    for stage, row in sorted(report.items()):
+        print(f"{stage:<16} | {row['count']:>6} | {row['errors']:>6} | {row['p50_ms']:>10} | {row['p95_ms']:>10} | {row['max_ms']:>10}")
@@ -1,7 +1,10 @@
 import PyPDF2
 import os
+import shutil
+import tempfile
 import zipfile
 import rarfile
+from core.tracing import tracer
 
 def extract_text_from_pdf(pdf_path, openai_service=None, force_ocr=False):
     """
@@ -19,6 +22,7 @@ def extract_text_from_pdf(pdf_path, openai_service=None, force_ocr=False):
             with open(pdf_path, 'rb') as file:
                 reader = PyPDF2.PdfReader(file)
                 num_pages = len(reader.pages)
+                tracer.current().set(page_count=num_pages)
                 if num_pages == 0:
                     print(f"Warning: PDF {pdf_path} has 0 pages.")
                     return "", None
@@ -35,17 +39,22 @@ def extract_text_from_pdf(pdf_path, openai_service=None, force_ocr=False):
             print(f"  → {reason} for {os.path.basename(pdf_path)}. Falling back to AI OCR...")
             doc = fitz.open(pdf_path)
             temp_images = []
+            # Per-call directory so concurrent workers never overwrite each other's pages
+            temp_dir = tempfile.mkdtemp(prefix="ocr_pages_")
             
             # Convert pages to images (limit to first 10 pages for cost/performance)
-            for i in range(min(len(doc), 10)):
-                page = doc.load_page(i)
-                pix = page.get_pixmap(matrix=fitz.Matrix(2, 2)) # High res for OCR
-                img_path = f"tmp_page_{i}.jpg"
-                pix.save(img_path)
-                temp_images.append(img_path)
+            with tracer.span("render", page_count=len(doc)) as render_span:
+                for i in range(min(len(doc), 10)):
+                    page = doc.load_page(i)
+                    pix = page.get_pixmap(matrix=fitz.Matrix(2, 2)) # High res for OCR
+                    img_path = os.path.join(temp_dir, f"page_{i}.jpg")
+                    pix.save(img_path)
+                    temp_images.append(img_path)
+                render_span.set(rendered_pages=len(temp_images))
             
             # Use OpenAI Vision for OCR - now returns dict with confidence
-            ocr_result = openai_service.ocr_from_images(temp_images)
+            with tracer.span("ocr", kind="pdf", page_count=len(temp_images)):
+                ocr_result = openai_service.ocr_from_images(temp_images)
             
             if isinstance(ocr_result, dict):
                 text = ocr_result.get("transcribed_text", "")
@@ -61,9 +70,7 @@ def extract_text_from_pdf(pdf_path, openai_service=None, force_ocr=False):
                 ocr_metadata = {"ocr_used": True, "ocr_confidence": 50}
             
             # Cleanup temp images
-            for img in temp_images:
-                if os.path.exists(img):
-                    os.remove(img)
+            shutil.rmtree(temp_dir, ignore_errors=True)
             doc.close()
             
     except Exception as e:
@@ -108,3 +115,43 @@ def extract_archive(archive_path, extract_dir):
     except Exception as e:
         print(f"Error extracting archive {archive_path}: {e}")
         return []
+
+def list_archive_members(archive_path):
+    """
+    Lists the file entries of a ZIP/RAR archive without extracting it.
+    Returns list of member names (directories excluded).
+    """
+    ext = get_file_extension(archive_path)
+    if ext == '.zip':
+        with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+            names = zip_ref.namelist()
+    elif ext == '.rar':
+        with rarfile.RarFile(archive_path, 'r') as rar_ref:
+            names = rar_ref.namelist()
+    else:
+        return []
+    return [name for name in names if not name.endswith('/')]
+
+def read_archive_member(archive_path, member):
+    """
+    Reads a single member of a ZIP/RAR archive.
+    Returns its bytes.
+    """
+    if get_file_extension(archive_path) == '.zip':
+        with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+            return zip_ref.read(member)
+    with rarfile.RarFile(archive_path, 'r') as rar_ref:
+        return rar_ref.read(member)
+
+def extract_archive_member(archive_path, member, extract_dir):
+    """
+    Extracts a single member of a ZIP/RAR archive.
+    Returns the extracted file path.
+    """
+    os.makedirs(extract_dir, exist_ok=True)
+    if get_file_extension(archive_path) == '.zip':
+        with zipfile.ZipFile(archive_path, 'r') as zip_ref:
+            return zip_ref.extract(member, extract_dir)
+    with rarfile.RarFile(archive_path, 'r') as rar_ref:
+        rar_ref.extract(member, extract_dir)
+        return os.path.join(extract_dir, member)
@@ -32,6 +32,7 @@ image = (
         "pymupdf",
         "schedule",
         "python-dateutil",
+        "psycopg2-binary",
     )
     .add_local_dir(".", remote_path="/root")
 )
@@ -39,6 +40,9 @@ image = (
 # Create a persistent volume for database and token storage
 volume = modal.Volume.from_name("visa-agent-data", create_if_missing=True)
 
+# Upper bound on concurrent per-document containers when fanning out
+MAX_TASK_CONTAINERS = int(os.environ.get("AGENT_MAX_CONTAINERS", "8"))
+
 def setup_gcp_credentials():
     """Write GCP credentials from env var to file"""
     import json
@@ -70,8 +74,12 @@ def web():
     # Ensure data directory exists
     os.makedirs("/data", exist_ok=True)
     
-    # Override DATABASE_URL to use persistent volume
-    os.environ["DATABASE_URL"] = "sqlite:////data/visa_agent.db"
+    # Use the persistent volume unless a server database is configured in the secret
+    os.environ.setdefault("DATABASE_URL", "sqlite:////data/visa_agent.db")
+    
+    # Bring the schema up to date before serving (app.py also does this on import)
+    from services.database_service import init_db
+    init_db()
     
     # Import and return Flask app
     from app import app as flask_app
@@ -99,11 +107,12 @@ def agent_worker():
     # Ensure data directory exists
     os.makedirs("/data", exist_ok=True)
     
-    # Override DATABASE_URL to use persistent volume
-    os.environ["DATABASE_URL"] = "sqlite:////data/visa_agent.db"
+    # Use the persistent volume unless a server database is configured in the secret
+    os.environ.setdefault("DATABASE_URL", "sqlite:////data/visa_agent.db")
     
     # Import and run agent
     from core.agent import VisaAgent
+    from core.dispatcher import Dispatcher, LocalExecutor, ModalExecutor
     from services.database_service import init_db
     
     print("🤖 Starting agent worker...")
@@ -113,11 +122,46 @@ def agent_worker():
     # Recover any files stuck in processing folder
     agent.recover_stuck_files()
     
-    # Process new files from incoming folder
-    agent.run_once()
+    # Fan out new files from incoming folder, one task per document.
+    # One container per document needs a database every container can write to;
+    # the SQLite file on the shared volume is only safe from a single container.
+    default_executor = "local" if os.environ["DATABASE_URL"].startswith("sqlite") else "modal"
+    if os.environ.get("AGENT_EXECUTOR", default_executor) == "modal":
+        executor = ModalExecutor(process_document_task)
+    else:
+        executor = LocalExecutor(max_concurrency=int(os.environ.get("AGENT_MAX_CONCURRENCY", "4")))
+    Dispatcher(agent, executor).run()
     print("✅ Agent worker completed")
 
 
+@app.function(
+    image=image,
+    secrets=[
+        modal.Secret.from_name("visa-agent-env"),
+        modal.Secret.from_name("gcp-credentials")
+    ],
+    volumes={"/data": volume},
+    max_containers=MAX_TASK_CONTAINERS,
+    timeout=600,
+)
+def process_document_task(task):
+    """Processes one dispatched document (a standalone file or an archive member)"""
+    import sys
+    sys.path.insert(0, "/root")
+    
+    # Setup GCP credentials file
+    setup_gcp_credentials()
+    
+    # Ensure data directory exists
+    os.makedirs("/data", exist_ok=True)
+    
+    # Use the persistent volume unless a server database is configured in the secret
+    os.environ.setdefault("DATABASE_URL", "sqlite:////data/visa_agent.db")
+    
+    from core.dispatcher import run_task
+    return run_task(task)
+
+
 @app.function(
     image=image,
     secrets=[
@@ -139,8 +183,11 @@ def scheduler_worker():
     # Ensure data directory exists
     os.makedirs("/data", exist_ok=True)
     
-    # Override DATABASE_URL to use persistent volume
-    os.environ["DATABASE_URL"] = "sqlite:////data/visa_agent.db"
+    # Use the persistent volume unless a server database is configured in the secret
+    os.environ.setdefault("DATABASE_URL", "sqlite:////data/visa_agent.db")
+    
+    from services.database_service import init_db
+    init_db()
     
     # Import and run scheduler
     from scheduled_notifications import run_all_checks
@@ -150,6 +197,36 @@ def scheduler_worker():
     print("✅ Scheduler worker completed")
 
 
+@app.function(
+    image=image,
+    secrets=[modal.Secret.from_name("visa-agent-env")],
+    volumes={"/data": volume},
+    schedule=modal.Cron("30 * * * *"),  # Hourly, off the agent's 5-minute marks
+    timeout=600,
+)
+def retention_worker():
+    """Moves cold applications and audit logs to the archive tables and reconciles the stats counters"""
+    import sys
+    sys.path.insert(0, "/root")
+    
+    # Use the persistent volume unless a server database is configured in the secret
+    os.environ.setdefault("DATABASE_URL", "sqlite:////data/visa_agent.db")
+    
+    from services.database_service import init_db
+    from services.retention_service import RetentionService
+    from services.event_bus import prune_events
+    from services.stats_counters import reconcile as reconcile_counters
+    from services.metrics_service import metrics
+    
+    print("🗄 Starting retention worker...")
+    init_db()
+    RetentionService().run(max_batches=int(os.environ.get("RETENTION_MAX_BATCHES", "20")))
+    print(f"✓ Pruned {prune_events()} change event(s)")
+    reconcile_counters()
+    metrics.flush()
+    print("✅ Retention worker completed")
+
+
 @app.local_entrypoint()
 def main():
     """Local entrypoint for testing"""
@@ -77,8 +77,9 @@ def check_database():
     print("\n💾 Checking Database...")
     
     try:
-        from services.database_service import SessionLocal, VisaApplication
+        from services.database_service import SessionLocal, VisaApplication, init_db
         
+        init_db()
         db = SessionLocal()
         count = db.query(VisaApplication).count()
         db.close()
@@ -13,14 +13,20 @@ from datetime import datetime
 # Add parent directory to path
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+from services.database_service import init_db
 from services.notification_service import NotificationService
 from services.client_alert_service import ClientAlertService
 from services.followup_service import FollowupService
 from services.gmail_reply_monitor import GmailReplyMonitor
+from services.metrics_service import metrics
+from services.retention_service import RetentionService
+from services.event_bus import prune_events
+from services.stats_counters import reconcile as reconcile_counters
 
 def check_notifications():
     """Main function to check and create notifications."""
     print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Running notification check...")
+    started = time.perf_counter()
     
     notification_service = NotificationService()
     alert_service = ClientAlertService()
@@ -75,25 +81,55 @@ def check_notifications():
         print(f"  📧 Internal notifications: {total_internal}")
         print(f"  ✉️  Client alerts sent: {total_client}")
         
+        metrics.inc("visa_scheduler_notifications_total", expiry_count, kind="expiry")
+        metrics.inc("visa_scheduler_notifications_total", verification_count, kind="verification")
+        metrics.inc("visa_scheduler_notifications_total", low_conf_alerts + expiring_alerts + missing_alerts, kind="client_alert")
+        metrics.inc("visa_scheduler_notifications_total", followup_count, kind="followup")
+        metrics.inc("visa_scheduler_replies_detected_total", replies_detected)
+        metrics.inc("visa_scheduler_runs_total", outcome="ok")
+        
     except Exception as e:
         print(f"  ❌ Error during notification check: {e}")
         import traceback
         traceback.print_exc()
+        metrics.inc("visa_scheduler_runs_total", outcome="error")
+    finally:
+        metrics.observe("visa_scheduler_run_seconds", time.perf_counter() - started)
+        metrics.flush()
+
+def run_retention():
+    """
+    Archives cold applications and audit logs (a bounded number of batches per run), prunes the change feed
+    and reconciles the stats counters.
+    """
+    print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Running retention...")
+    try:
+        RetentionService().run(max_batches=int(os.getenv("RETENTION_MAX_BATCHES", "20")))
+        print(f"  ✓ Pruned {prune_events()} change event(s)")
+        reconcile_counters()
+    except Exception as e:
+        print(f"  ❌ Error during retention: {e}")
+    finally:
+        metrics.flush()
 
 def run_scheduler():
     """Run the scheduler continuously."""
     print("=" * 60)
     print("Notification Scheduler Started")
     print("=" * 60)
-    print("Schedule: Every 6 hours")
+    print("Schedule: Every 6 hours (retention hourly)")
     print("Press Ctrl+C to stop")
     print()
     
     # Schedule checks every 6 hours
     schedule.every(6).hours.do(check_notifications)
     
+    # Move cold rows to the archive tier in small increments
+    schedule.every(1).hours.do(run_retention)
+    
     # Also run once at startup
     check_notifications()
+    run_retention()
     
     # Keep running
     try:
@@ -120,6 +156,9 @@ if __name__ == "__main__":
     
     args = parser.parse_args()
     
+    # Migrate first; the services' queries need the current schema
+    init_db()
+    
     if args.once:
         run_once()
     elif args.daemon:
@@ -0,0 +1,172 @@
+"""
+Aggregation Service
+Sliced statistics for staff, e.g. average confidence by document type and
+subclass, the review backlog by age, or notifications by severity per
+applicant. A source, a list of group-by dimensions and equality filters on
+those dimensions become one `GROUP BY` query; no rows are loaded into Python.
+Results are cached for a few seconds per (source, group_by, filters), so a
+dashboard refreshing the same breakdown does not re-run it.
+
+The plain totals come from the stats counters (services/stats_counters.py).
+"""
+
+import os
+import time
+import datetime
+import threading
+from sqlalchemy import func, case, and_
+from services.database_service import SessionLocal, VisaApplication, Notification
+from services.stats_counters import LOW_CONFIDENCE_THRESHOLD
+
+CACHE_TTL_SECONDS = float(os.getenv("AGGREGATION_CACHE_TTL_S", "30"))
+CACHE_MAX_ENTRIES = 256
+
+# (upper bound in days, label) for age dimensions, youngest first
+AGE_BUCKETS = ((1, '0-1d'), (7, '1-7d'), (30, '7-30d'))
+
+
+def age_bucket(column, now):
+    """CASE expression labelling a timestamp column with its AGE_BUCKETS bucket."""
+    whens = [(column.is_(None), 'unknown')]
+    whens += [(column >= now - datetime.timedelta(days=days), label) for days, label in AGE_BUCKETS]
+    return case(*whens, else_=f"{AGE_BUCKETS[-1][0]}d+")
+
+
+# Source -> dimensions and measures; each is a function of the current time returning a column expression
+SOURCES = {
+    'applications': {
+        'dimensions': {
+            'applicant_id': lambda now: VisaApplication.applicant_id,
+            'document_type': lambda now: VisaApplication.document_type,
+            'visa_subclass': lambda now: VisaApplication.visa_subclass,
+            'status': lambda now: VisaApplication.status,
+            'verification_status': lambda now: VisaApplication.verification_status,
+            'compliance_status': lambda now: VisaApplication.compliance_status,
+            'age': lambda now: age_bucket(VisaApplication.upload_date, now),
+        },
+        'measures': {
+            'count': lambda now: func.count(VisaApplication.id),
+            'avg_confidence': lambda now: func.avg(VisaApplication.confidence_score),
+            'low_confidence': lambda now: func.sum(case(
+                (and_(VisaApplication.confidence_score != 0, VisaApplication.confidence_score < LOW_CONFIDENCE_THRESHOLD), 1),
+                else_=0)),
+            'pending': lambda now: func.sum(case((VisaApplication.verification_status == 'pending', 1), else_=0)),
+        },
+    },
+    'notifications': {
+        'dimensions': {
+            'applicant_id': lambda now: Notification.applicant_id,
+            'document_id': lambda now: Notification.document_id,
+            'notification_type': lambda now: Notification.notification_type,
+            'severity': lambda now: Notification.severity,
+            'age': lambda now: age_bucket(Notification.sent_at, now),
+        },
+        'measures': {
+            'count': lambda now: func.count(Notification.id),
+            'unread': lambda now: func.sum(case((Notification.read_at.is_(None), 1), else_=0)),
+        },
+    },
+}
+
+
+def parse_group_by(value):
+    """Dimension names from a comma-separated ?group_by= value."""
+    return [name.strip() for name in (value or '').split(',') if name.strip()]
+
+
+class AggregationService:
+    """
+    Runs group-by specifications as single SQL queries, with a short-TTL result cache.
+
+    Args:
+        session_factory: Session factory (defaults to SessionLocal)
+        cache_ttl: Seconds a result is reused (0 disables the cache)
+    """
+
+    def __init__(self, session_factory=None, cache_ttl=CACHE_TTL_SECONDS):
+        self.session_factory = session_factory or SessionLocal
+        self.cache_ttl = cache_ttl
+        self._cache = {}  # (source, group_by, filters) -> (expires_at, rows)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def dimensions(source):
+        """Dimension names of a source (what group_by and filters accept)."""
+        return list(SOURCES[source]['dimensions'])
+
+    def aggregate(self, source, group_by=(), filters=None):
+        """
+        Aggregates a source.
+
+        Args:
+            source: 'applications' or 'notifications'
+            group_by: Dimension names to group by (none: one row of totals)
+            filters: Dict of dimension name -> value rows must equal
+
+        Returns:
+            List of dicts, one per group: the dimension values and every measure of the source
+
+        Raises:
+            ValueError: On an unknown source or dimension
+        """
+        spec = SOURCES.get(source)
+        if spec is None:
+            raise ValueError(f"Unknown source: {source}")
+        group_by = list(dict.fromkeys(group_by))
+        filters = {name: value for name, value in (filters or {}).items() if value is not None}
+        unknown = [name for name in group_by + list(filters) if name not in spec['dimensions']]
+        if unknown:
+            raise ValueError(f"Unknown dimension(s): {', '.join(unknown)}")
+
+        key = (source, tuple(group_by), tuple(sorted(filters.items())))
+        if self.cache_ttl > 0:
+            with self._lock:
+                cached = self._cache.get(key)
+            if cached and cached[0] > time.monotonic():
+                return cached[1]
+
+        now = datetime.datetime.now()
+        dimensions = [spec['dimensions'][name](now).label(name) for name in group_by]
+        measures = [expression(now).label(name) for name, expression in spec['measures'].items()]
+        session = self.session_factory()
+        try:
+            query = session.query(*dimensions, *measures)
+            for name, value in filters.items():
+                query = query.filter(spec['dimensions'][name](now) == value)
+            if dimensions:
+                query = query.group_by(*dimensions).order_by(*dimensions)
+            rows = []
+            for row in query.all():
+                item = dict(row._mapping)
+                if 'avg_confidence' in item and item['avg_confidence'] is not None:
+                    item['avg_confidence'] = round(float(item['avg_confidence']), 1)
+                for name in spec['measures']:
+                    if name != 'avg_confidence':
+                        item[name] = int(item[name] or 0)
+                rows.append(item)
+        finally:
+            session.close()
+
+        if self.cache_ttl > 0:
+            with self._lock:
+                if len(self._cache) >= CACHE_MAX_ENTRIES:
+                    # Per-applicant filters make many keys; drop the expired ones, then the oldest
+                    current = time.monotonic()
+                    self._cache = {k: v for k, v in self._cache.items() if v[0] > current}
+                    if len(self._cache) >= CACHE_MAX_ENTRIES:
+                        self._cache.pop(min(self._cache, key=lambda k: self._cache[k][0]))
+                self._cache[key] = (time.monotonic() + self.cache_ttl, rows)
+        return rows
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+
+# Shared per process, so the cache serves every request
+aggregations = AggregationService()
+
+
+if __name__ == "__main__":
+    for row in aggregations.aggregate('applications', ['document_type', 'visa_subclass']):
+        print(row)
@@ -0,0 +1,211 @@
+"""
+Application Feed
+Read side of /api/applications for pollers. Rows come back as projections of
+the requested fields only, in keyset pages ordered by (updated_at, id), or as a
+delta of everything changed since a cursor. `state()` is the one cheap query a
+poll needs when nothing changed: the row count and the newest updated_at, which
+the endpoint turns into an ETag.
+
+A delta cursor is held back `settle_seconds` behind the clock. A row written by a
+transaction that committed late, with a slightly older updated_at, is still
+picked up. Clients apply deltas by id, so the re-sent rows are harmless.
+"""
+
+import os
+import base64
+import datetime
+from sqlalchemy import func, or_, and_
+from services.database_service import SessionLocal, VisaApplication, DocumentAnalysis
+
+DEFAULT_PAGE_SIZE = int(os.getenv("APPLICATIONS_PAGE_SIZE", "500"))
+SETTLE_SECONDS = float(os.getenv("APPLICATIONS_FEED_SETTLE_S", "1.0"))
+
+
+def _timestamp(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value else None
+
+
+# Field name -> (column, formatter); the dashboard's row shape
+FIELDS = {
+    'id': (VisaApplication.id, None),
+    'document_id': (VisaApplication.document_id, None),
+    'file_name': (VisaApplication.file_name, None),
+    'visa_subclass': (VisaApplication.visa_subclass, None),
+    'document_type': (VisaApplication.document_type, None),
+    'status': (VisaApplication.status, None),
+    'score': (VisaApplication.completeness_score, None),
+    'summary': (VisaApplication.summary, None),
+    'missing_elements_count': (VisaApplication.missing_elements_count, None),
+    'compliance_status': (VisaApplication.compliance_status, None),
+    'processed_at': (VisaApplication.upload_date, lambda v: _timestamp(v) or "N/A"),
+    'applicant_id': (VisaApplication.applicant_id, None),
+    'expiry_date': (VisaApplication.expiry_date, lambda v: v.strftime("%Y-%m-%d") if v else None),
+    'confidence_score': (VisaApplication.confidence_score, None),
+    'verification_status': (VisaApplication.verification_status, None),
+    'verified_by': (VisaApplication.verified_by, None),
+    'verified_at': (VisaApplication.verified_at, _timestamp),
+    'updated_at': (VisaApplication.updated_at, lambda v: v.isoformat() if v else None),
+}
+
+
+def encode_cursor(updated_at, row_id):
+    """Opaque cursor for a (updated_at, id) position."""
+    raw = f"{updated_at.isoformat() if updated_at else ''}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Inverse of encode_cursor.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        stamp, row_id = raw.rsplit('|', 1)
+        return (datetime.datetime.fromisoformat(stamp) if stamp else None), int(row_id)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+def parse_fields(value):
+    """
+    Field names from a comma-separated ?fields= value (None or empty: every field).
+
+    Raises:
+        ValueError: On an unknown field
+    """
+    if not value:
+        return list(FIELDS)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(unknown)}")
+    # id and updated_at are what clients key and order by
+    return list(dict.fromkeys(['id', 'updated_at'] + fields))
+
+
+class ApplicationFeed:
+    """
+    Projected, paginated and delta reads of visa_applications.
+
+    Args:
+        session_factory: Session factory (defaults to SessionLocal)
+        settle_seconds: How far behind the clock a delta cursor is held
+    """
+
+    def __init__(self, session_factory=None, settle_seconds=SETTLE_SECONDS):
+        self.session_factory = session_factory or SessionLocal
+        self.settle_seconds = settle_seconds
+
+    def state(self):
+        """Returns (row count, newest updated_at), which change whenever a row is added, updated or removed."""
+        session = self.session_factory()
+        try:
+            total, newest = session.query(func.count(VisaApplication.id), func.max(VisaApplication.updated_at)).one()
+            return total, newest
+        finally:
+            session.close()
+
+    def _query(self, session, fields):
+        return session.query(*[FIELDS[name][0].label(name) for name in fields])
+
+    @staticmethod
+    def _serialize(rows, fields):
+        items = []
+        for row in rows:
+            item = {}
+            for name in fields:
+                value, formatter = getattr(row, name), FIELDS[name][1]
+                item[name] = formatter(value) if formatter else value
+            items.append(item)
+        return items
+
+    def page(self, fields=None, limit=None, after=None):
+        """
+        Rows newest first.
+
+        Args:
+            fields: Field names (defaults to all)
+            limit: Page size (None for every row)
+            after: Cursor from a previous page's 'next'
+
+        Returns:
+            Dict with 'items' and 'next' (cursor of the following page, or None)
+        """
+        fields = fields or list(FIELDS)
+        selected = list(dict.fromkeys(fields + ['id', 'updated_at']))
+        session = self.session_factory()
+        try:
+            query = self._query(session, selected)
+            if after:
+                stamp, row_id = decode_cursor(after)
+                query = query.filter(or_(
+                    VisaApplication.updated_at < stamp,
+                    and_(VisaApplication.updated_at == stamp, VisaApplication.id < row_id)
+                ))
+            query = query.order_by(VisaApplication.updated_at.desc(), VisaApplication.id.desc())
+            rows = query.limit(limit + 1).all() if limit else query.all()
+        finally:
+            session.close()
+        more = bool(limit) and len(rows) > limit
+        rows = rows[:limit] if limit else rows
+        return {
+            'items': self._serialize(rows, fields),
+            'next': encode_cursor(rows[-1].updated_at, rows[-1].id) if more else None
+        }
+
+    def changes(self, since=None, fields=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        Rows added or updated after a cursor, oldest change first.
+
+        Args:
+            since: Cursor from the previous call (None or empty: from the beginning)
+            fields: Field names (defaults to all)
+            limit: Most rows per call; 'more' says whether to call again straight away
+
+        Returns:
+            Dict with 'items', 'cursor' (pass as since next time) and 'more'
+        """
+        fields = fields or list(FIELDS)
+        selected = list(dict.fromkeys(fields + ['id', 'updated_at']))
+        session = self.session_factory()
+        try:
+            query = self._query(session, selected)
+            stamp, row_id = decode_cursor(since) if since else (None, 0)
+            if stamp is not None:
+                query = query.filter(or_(
+                    VisaApplication.updated_at > stamp,
+                    and_(VisaApplication.updated_at == stamp, VisaApplication.id > row_id)
+                ))
+            rows = query.order_by(VisaApplication.updated_at, VisaApplication.id).limit(limit + 1).all()
+        finally:
+            session.close()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        if rows:
+            stamp, row_id = rows[-1].updated_at, rows[-1].id
+        settled = datetime.datetime.now() - datetime.timedelta(seconds=self.settle_seconds)
+        if not more and stamp is not None and stamp > settled:
+            # Recent rows come again next time, in case an older write has not committed yet
+            stamp, row_id = max(settled, decode_cursor(since)[0] if since else settled), 0
+        return {
+            'items': self._serialize(rows, fields),
+            'cursor': encode_cursor(stamp, row_id) if stamp is not None else (since or ''),
+            'more': more
+        }
+
+    def analyses(self, application_ids):
+        """Analysis payloads for a set of rows, in one query: {id: {'analysis', 'field_confidence', 'ocr_metadata'}}."""
+        session = self.session_factory()
+        try:
+            result = {}
+            for record in session.query(DocumentAnalysis).filter(DocumentAnalysis.application_id.in_(application_ids)):
+                data = record.data
+                result[record.application_id] = {'analysis': data.get('ai_analysis'),
+                                                 'field_confidence': data.get('field_confidence'),
+                                                 'ocr_metadata': data.get('ocr_metadata')}
+            return result
+        finally:
+            session.close()
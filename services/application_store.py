@@ -0,0 +1,221 @@
+"""
+Application Store
+Write path for processed documents. A document's result is a plain dict of
+visa_applications columns that is written with one dialect-aware
+`INSERT ... ON CONFLICT (file_name) DO UPDATE` (SQLite and Postgres); the
+analysis payloads in the dict go to document_analyses in a second upsert keyed
+on the returned ids, and their dates, names and references to the
+extracted-data tables. The agent collects an archive's results in an
+`ApplicationBatch` and writes them with a single commit, instead of a lookup
+and a commit per member. `ApplicantCache` resolves applicant names without a
+query per member.
+"""
+
+import datetime
+from collections import OrderedDict
+from sqlalchemy import case
+from services.database_service import (
+    SessionLocal, VisaApplication, Applicant, DocumentAnalysis, ANALYSIS_FIELDS, analysis_columns, encode_analysis,
+    dialect_insert
+)
+from services.extracted_data_service import replace_extracted_data
+from services.event_bus import publish
+from services.stats_counters import COUNTED_COLUMNS, adjust, counter_deltas
+
+# Columns a re-processed document overwrites; applicant_id and version history are kept
+UPDATE_COLUMNS = (
+    'visa_subclass', 'document_type', 'status', 'completeness_score', 'processing_stage', 'upload_date',
+    'expiry_date', 'confidence_score', 'verification_status', 'summary', 'missing_elements_count', 'compliance_status'
+)
+
+
+def _upsert_each(session, rows, now):
+    """Fallback for databases without ON CONFLICT: one lookup per row."""
+    for row in rows:
+        existing = session.query(VisaApplication).filter(VisaApplication.file_name == row['file_name']).first()
+        if existing is None:
+            session.add(VisaApplication(**row))
+            continue
+        if ':' not in row['document_id'] or ':' in (existing.document_id or ''):
+            existing.document_id = row['document_id']
+        for column in UPDATE_COLUMNS + ANALYSIS_FIELDS:
+            if column in row:
+                setattr(existing, column, row[column])
+        existing.updated_at = now
+    session.flush()
+    replace_extracted_data(session, {
+        application.id: application.ai_analysis
+        for application in session.query(VisaApplication).filter(
+            VisaApplication.file_name.in_([row['file_name'] for row in rows if 'ai_analysis' in row]))
+    })
+
+
+def _split_analysis(row):
+    """Splits a row dict into visa_applications columns and its analysis payload."""
+    columns = {key: value for key, value in row.items() if key not in ANALYSIS_FIELDS}
+    payload = {field: row[field] for field in ANALYSIS_FIELDS if field in row}
+    if 'ai_analysis' in payload:
+        columns.update(analysis_columns(payload['ai_analysis']))
+    return columns, payload
+
+
+def _upsert_analyses(session, insert, payloads, now):
+    """Writes document_analyses rows ({application id: payload}) in one statement."""
+    values = []
+    for application_id, payload in payloads.items():
+        encoding, data, raw_size = encode_analysis(payload)
+        values.append({'application_id': application_id, 'encoding': encoding, 'payload': data,
+                       'raw_size': raw_size, 'updated_at': now})
+    statement = insert(DocumentAnalysis.__table__).values(values)
+    excluded = statement.excluded
+    session.execute(statement.on_conflict_do_update(
+        index_elements=['application_id'],
+        set_={column: excluded[column] for column in ('encoding', 'payload', 'raw_size', 'updated_at')}
+    ))
+
+
+def _counted_changes(session, rows, columns):
+    """(before, after) values of the counted columns for each row the upsert writes, for the stats counters."""
+    counted = COUNTED_COLUMNS['application']
+    existing = {
+        row.file_name: {column: getattr(row, column) for column in counted}
+        for row in session.query(VisaApplication.file_name, *[getattr(VisaApplication, c) for c in counted]).filter(
+            VisaApplication.file_name.in_([row['file_name'] for row in rows]))
+    }
+    defaults = {column: VisaApplication.__table__.c[column].default for column in counted}
+    changes = []
+    for row in rows:
+        before = existing.get(row['file_name'])
+        if before is None:
+            after = {column: row.get(column) if column in columns else (default.arg if default is not None else None)
+                     for column, default in defaults.items()}
+        else:
+            after = {column: row.get(column) if column in columns and column in UPDATE_COLUMNS else before[column]
+                     for column in counted}
+        changes.append((before, after))
+    return changes
+
+
+def upsert_applications(session, rows):
+    """
+    Inserts or updates visa_applications rows keyed on file_name, in one statement,
+    and their analysis payloads (ai_analysis, field_confidence, ocr_metadata) in a
+    second one; the extracted-data rows of each analysed document are replaced.
+    Does not commit.
+
+    An existing row keeps its document_id when the new one is a composite
+    archive-member ID (contains ':') and the stored one is a real Drive file,
+    so an "online link" is never replaced by an archive path.
+
+    Args:
+        session: Session to execute on
+        rows: Column dicts (must include document_id and file_name)
+
+    Returns:
+        Number of rows written
+    """
+    # Last result wins if a batch holds the same file twice (Postgres rejects touching a row twice)
+    rows = list({row['file_name']: row for row in rows}.values())
+    if not rows:
+        return 0
+    now = datetime.datetime.now()
+    rows = [dict(row, updated_at=now) for row in rows]
+
+    insert = dialect_insert(session.get_bind().dialect.name)
+    if insert is None:
+        _upsert_each(session, rows, now)
+        return len(rows)
+
+    split = [_split_analysis(row) for row in rows]
+    rows = [columns for columns, _ in split]
+    # Every row needs the same keys for a multi-row VALUES clause
+    columns = set().union(*rows)
+    statement = insert(VisaApplication.__table__).values([{c: row.get(c) for c in columns} for row in rows])
+    table, excluded = VisaApplication.__table__.c, statement.excluded
+    update = {column: excluded[column] for column in UPDATE_COLUMNS if column in columns}
+    update['document_id'] = case(
+        (~excluded.document_id.contains(':') | table.document_id.contains(':'), excluded.document_id),
+        else_=table.document_id
+    )
+    # ON CONFLICT bypasses the ORM's onupdate, so set it explicitly
+    update['updated_at'] = excluded.updated_at
+    statement = statement.on_conflict_do_update(index_elements=['file_name'], set_=update)
+    # ON CONFLICT also bypasses the ORM flush that keeps the stats counters
+    adjust(session, counter_deltas('application', _counted_changes(session, rows, columns)))
+    ids = dict(session.execute(statement.returning(table.file_name, table.id)).all())
+    publish(session, 'application', 'upserted', ids.values())
+
+    payloads = {ids[row['file_name']]: payload for row, (_, payload) in zip(rows, split) if payload}
+    if payloads:
+        _upsert_analyses(session, insert, payloads, now)
+        replace_extracted_data(session, {
+            application_id: payload['ai_analysis'] for application_id, payload in payloads.items() if 'ai_analysis' in payload
+        })
+    return len(rows)
+
+
+class ApplicationBatch:
+    """
+    Collects document results and writes them in one upsert and one commit.
+
+    Args:
+        session: Session the batch is written with
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.rows = []
+
+    def add(self, row):
+        self.rows.append(row)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def flush(self):
+        """Writes and commits the collected rows. Returns the number written."""
+        if not self.rows:
+            return 0
+        rows, self.rows = self.rows, []
+        try:
+            written = upsert_applications(self.session, rows)
+            self.session.commit()
+            return written
+        except Exception:
+            self.session.rollback()
+            raise
+
+
+class ApplicantCache:
+    """
+    Maps applicant names to ids, hitting the database only on the first sight of a name.
+    Holds plain ids (not ORM rows) and at most `max_size` names, least recently used first out.
+
+    Args:
+        session_factory: Session factory (defaults to SessionLocal)
+        max_size: Names kept in memory
+    """
+
+    def __init__(self, session_factory=None, max_size=1024):
+        self.session_factory = session_factory or SessionLocal
+        self.max_size = max_size
+        self._ids = OrderedDict()
+
+    def get_or_create(self, full_name):
+        """Returns the applicant id for a name, creating the applicant if it is new."""
+        if full_name in self._ids:
+            self._ids.move_to_end(full_name)
+            return self._ids[full_name]
+        session = self.session_factory()
+        try:
+            applicant = session.query(Applicant).filter(Applicant.full_name == full_name).first()
+            if not applicant:
+                applicant = Applicant(full_name=full_name, application_status="Processing")
+                session.add(applicant)
+                session.commit()
+            self._ids[full_name] = applicant.id
+            if len(self._ids) > self.max_size:
+                self._ids.popitem(last=False)
+            return applicant.id
+        finally:
+            session.close()
@@ -1,8 +1,18 @@
 import os
 import json
-from openai import OpenAI
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from services.openai_service import create_client
 from services.search_service import SearchService
+from services.llm_ledger_service import ledger
+from services.conversation_store import ConversationStore, is_summary
+from services.token_counter import count_tokens, count_message_tokens, truncate_to_tokens, MESSAGE_OVERHEAD
+
+# History is summarised off the request path, one session at a time
+_summary_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-summary")
+_compactions = {}  # session_id -> Future of its compaction, until that starts
+_compactions_lock = threading.Lock()
 
 load_dotenv()
 
@@ -40,10 +50,23 @@ When answering visa-related questions:
 
 Remember: You're here to help applicants succeed. Be their trusted guide through the visa process."""
 
-    def __init__(self):
-        self.client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+    HISTORY_MESSAGES = 10  # Previous messages sent with each chat turn
+    # Once a session's history passes this many tokens, all but the last few messages are summarised
+    HISTORY_TOKEN_BUDGET = int(os.getenv("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+    RECENT_MESSAGES_KEPT = 4
+    # Ceiling on the prompt of any one request; context, search results and history are cut to fit
+    PROMPT_TOKEN_CEILING = int(os.getenv("CHAT_PROMPT_TOKEN_CEILING", "6000"))
+    CONTEXT_TOKEN_LIMIT = 1000
+    SUMMARY_MODEL = "gpt-4o-mini"
+    SUMMARY_PROMPT = ("Summarise this conversation between a visa applicant and an assistant in under 150 words. "
+                      "Keep the applicant's visa subclass, circumstances, documents, open questions and any "
+                      "advice already given; drop pleasantries.")
+
+    def __init__(self, base_url=None, conversations=None):
+        self.client = create_client(base_url=base_url)
         self.search_service = SearchService()
-        self.conversation_history = []
+        # Chat history lives per session in the store; the service itself is stateless and shared
+        self.conversations = conversations or ConversationStore()
         self.agent_config = self._load_agent_config()
         self.system_prompt = self._build_system_prompt()
 
@@ -109,16 +132,19 @@ When answering visa-related questions:
 
 Remember: You're here to help applicants succeed. Be their trusted guide through the visa process."""
     
-    def chat(self, user_message, context=None):
+    CHAT_ERROR_MESSAGE = "I apologize, but I'm having trouble processing your request right now. Please try again in a moment."
+
+    def _prepare_chat(self, user_message, context=None, history=()):
         """
-        Process user message and return AI response with search-grounded information.
-        
+        Runs the search (if the message needs one) and builds the completion messages.
+
         Args:
             user_message: User's question or request
-            context: Optional context (e.g., current document being reviewed)
-            
+            context: Optional context dict
+            history: Previous {'role', 'content'} messages of the conversation
+
         Returns:
-            dict with 'response', 'sources', and 'searched' keys
+            Tuple (messages, sources, searched)
         """
         # Determine if we need to search
         needs_search = self._needs_search(user_message)
@@ -141,18 +167,8 @@ Remember: You're here to help applicants succeed. Be their trusted guide through
                     for r in search_results['results'][:3]
                 ]
         
-        # Build messages for OpenAI
-        messages = [{"role": "system", "content": self.system_prompt}]
-        
-        # Add conversation history (last 5 messages)
-        messages.extend(self.conversation_history[-10:])
-        
-        # Add context if provided
-        if context:
-            context_msg = f"\n\nCONTEXT: {json.dumps(context)}"
-            user_message += context_msg
-        
         # Add search results if available
+        search_context = None
         if search_results and search_results.get('results'):
             search_context = "\n\nSEARCH RESULTS FROM OFFICIAL SOURCES:\n"
             for i, result in enumerate(search_results['results'][:3], 1):
@@ -162,14 +178,143 @@ Remember: You're here to help applicants succeed. Be their trusted guide through
             
             if search_results.get('answer'):
                 search_context += f"\n\nSUMMARY: {search_results['answer']}\n"
-            
-            user_message += search_context
         
-        messages.append({"role": "user", "content": user_message})
+        return self._build_messages(user_message, context, search_context, history), sources, needs_search
+
+    def _build_messages(self, user_message, context=None, search_context=None, history=()):
+        """
+        Completion messages for a turn, within PROMPT_TOKEN_CEILING.
+
+        The question is sent whole unless it alone passes the ceiling (routes reject
+        such questions first; see `question_too_long`). Then, each cut to what is left: context
+        (capped at CONTEXT_TOKEN_LIMIT), history (capped at HISTORY_TOKEN_BUDGET; its
+        summary first, then the newest messages) and the search results.
+        """
+        system = {"role": "system", "content": self.system_prompt}
+        if self.question_too_long(user_message):
+            user_message = truncate_to_tokens(
+                user_message, self.PROMPT_TOKEN_CEILING - count_message_tokens([system, {"role": "user", "content": ""}]))
+        budget = self.PROMPT_TOKEN_CEILING - count_message_tokens([system, {"role": "user", "content": user_message}])
+        
+        # Add context if provided
+        if context:
+            label = "\n\nCONTEXT: "
+            context_json = truncate_to_tokens(json.dumps(context, separators=(',', ':'), default=str),
+                                              min(self.CONTEXT_TOKEN_LIMIT, budget - count_tokens(label)))
+            if context_json:
+                context_msg = f"{label}{context_json}"
+                user_message += context_msg
+                budget -= count_tokens(context_msg)
+        
+        history = self._fit_history(history, min(self.HISTORY_TOKEN_BUDGET, budget))
+        budget -= sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD for m in history)
+        
+        if search_context:
+            user_message += truncate_to_tokens(search_context, budget)
+        
+        return [system] + history + [{"role": "user", "content": user_message}]
+
+    def question_too_long(self, user_message):
+        """True if the question and the system prompt alone pass PROMPT_TOKEN_CEILING."""
+        return count_message_tokens([{"role": "system", "content": self.system_prompt},
+                                     {"role": "user", "content": user_message}]) > self.PROMPT_TOKEN_CEILING
+
+    def _fit_history(self, history, budget):
+        """The summary and newest messages of history that fit in budget tokens, oldest first."""
+        history = list(history)
+        summary = history.pop(0) if history and is_summary(history[0]) else None
+        kept = []
+        if summary:
+            cost = count_tokens(summary["content"]) + MESSAGE_OVERHEAD
+            if cost <= budget:
+                budget -= cost
+            else:
+                summary = None
+        for message in reversed(history[-self.HISTORY_MESSAGES:]):
+            cost = count_tokens(message["content"]) + MESSAGE_OVERHEAD
+            if cost > budget:
+                break
+            kept.append(message)
+            budget -= cost
+        return ([summary] if summary else []) + kept[::-1]
+
+    def _history(self, session_id):
+        return self.conversations.history(session_id) if session_id else []
+
+    def _remember(self, session_id, user_message, assistant_message):
+        """Adds the turn to the session and queues its compaction. Returns that Future (None without a session)."""
+        # The question as asked; search results and context are rebuilt for each turn
+        if not session_id:
+            return None
+        self.conversations.append(session_id,
+                                  {"role": "user", "content": user_message},
+                                  {"role": "assistant", "content": assistant_message})
+        with _compactions_lock:
+            if session_id not in _compactions:
+                _compactions[session_id] = _summary_executor.submit(self._compact_queued, session_id)
+            # A compaction not started yet reads the history when it does, so it sees this turn too
+            return _compactions[session_id]
+
+    def _compact_queued(self, session_id):
+        with _compactions_lock:
+            _compactions.pop(session_id, None)
+        try:
+            self._compact(session_id)
+        except Exception as e:
+            print(f"⚠ Could not compact chat session {session_id}: {e}")
+
+    def _compact(self, session_id):
+        """
+        Summarises all but the last RECENT_MESSAGES_KEPT messages of a session once
+        its history passes HISTORY_TOKEN_BUDGET. An earlier summary is folded into
+        the new one. If summarising fails the history is left as it is.
+        """
+        history = self.conversations.history(session_id)
+        if count_message_tokens(history) <= self.HISTORY_TOKEN_BUDGET:
+            return
+        older = history[:-self.RECENT_MESSAGES_KEPT]
+        if not older or older == history[:1] and is_summary(older[0]):
+            return  # Only recent messages (and a summary) left; the prompt ceiling handles the rest
+        transcript = "\n\n".join(
+            f"{'Earlier summary' if i == 0 and is_summary(m) else m['role'].capitalize()}: {m['content']}"
+            for i, m in enumerate(older))
+        try:
+            response = ledger.tracked_completion(
+                self.client,
+                purpose="chat_summary",
+                model=self.SUMMARY_MODEL,
+                messages=[
+                    {"role": "system", "content": self.SUMMARY_PROMPT},
+                    {"role": "user", "content": truncate_to_tokens(transcript, self.PROMPT_TOKEN_CEILING)}
+                ],
+                temperature=0.2,
+                max_tokens=300
+            )
+            summary = response.choices[0].message.content
+        except Exception as e:
+            print(f"⚠ Could not summarise chat session {session_id}: {e}")
+            return
+        self.conversations.compact(session_id, older, summary)
+
+    def chat(self, user_message, context=None, session_id=None):
+        """
+        Process user message and return AI response with search-grounded information.
+        
+        Args:
+            user_message: User's question or request
+            context: Optional context (e.g., current document being reviewed)
+            session_id: Conversation to continue; without one the turn has no history
+            
+        Returns:
+            dict with 'response', 'sources', and 'searched' keys
+        """
+        messages, sources, needs_search = self._prepare_chat(user_message, context, self._history(session_id))
         
         # Get AI response
         try:
-            response = self.client.chat.completions.create(
+            response = ledger.tracked_completion(
+                self.client,
+                purpose="chat",
                 model="gpt-4o",
                 messages=messages,
                 temperature=0.7,
@@ -179,8 +324,7 @@ Remember: You're here to help applicants succeed. Be their trusted guide through
             assistant_message = response.choices[0].message.content
             
             # Update conversation history
-            self.conversation_history.append({"role": "user", "content": user_message})
-            self.conversation_history.append({"role": "assistant", "content": assistant_message})
+            self._remember(session_id, user_message, assistant_message)
             
             return {
                 'response': assistant_message,
@@ -191,11 +335,60 @@ Remember: You're here to help applicants succeed. Be their trusted guide through
         except Exception as e:
             print(f"[ERROR] OpenAI API failed: {e}")
             return {
-                'response': "I apologize, but I'm having trouble processing your request right now. Please try again in a moment.",
+                'response': self.CHAT_ERROR_MESSAGE,
                 'sources': [],
                 'searched': False,
                 'error': str(e)
             }
+
+    def chat_stream(self, user_message, context=None, session_id=None):
+        """
+        Streaming variant of `chat`: the reply arrives token by token.
+        
+        Args:
+            user_message: User's question or request
+            context: Optional context (e.g., current document being reviewed)
+            session_id: Conversation to continue; without one the turn has no history
+            
+        Yields:
+            Events as dicts with 'event' and 'data' keys, in order:
+            'sources' ({sources, searched}) once the search is done, then
+            'token' ({text}) per completion delta, then 'done' ({response}),
+            or 'error' ({response, error}) if the completion fails
+        """
+        try:
+            messages, sources, needs_search = self._prepare_chat(
+                user_message, context, self._history(session_id))
+        except Exception as e:
+            print(f"[ERROR] Chat search failed: {e}")
+            yield {'event': 'error', 'data': {'response': self.CHAT_ERROR_MESSAGE, 'error': str(e)}}
+            return
+
+        yield {'event': 'sources', 'data': {'sources': sources, 'searched': needs_search}}
+
+        parts = []
+        try:
+            for text in ledger.tracked_stream(
+                self.client,
+                purpose="chat",
+                model="gpt-4o",
+                messages=messages,
+                temperature=0.7,
+                max_tokens=800
+            ):
+                parts.append(text)
+                yield {'event': 'token', 'data': {'text': text}}
+        except Exception as e:
+            print(f"[ERROR] OpenAI API failed: {e}")
+            yield {'event': 'error', 'data': {'response': self.CHAT_ERROR_MESSAGE, 'error': str(e)}}
+            return
+
+        assistant_message = "".join(parts)
+        
+        # Update conversation history
+        self._remember(session_id, user_message, assistant_message)
+        
+        yield {'event': 'done', 'data': {'response': assistant_message}}
     
     def _needs_search(self, message):
         """Determine if message requires searching for information."""
@@ -246,7 +439,7 @@ Remember: You're here to help applicants succeed. Be their trusted guide through
                 "type": doc.document_type,
                 "status": doc.status,
                 "score": doc.completeness_score,
-                "summary": doc.ai_analysis.get('summary', 'No summary.') if doc.ai_analysis else 'No analysis.'
+                "summary": doc.summary or 'No summary.'
             })
             
         context = {
@@ -269,6 +462,6 @@ Remember: You're here to help applicants succeed. Be their trusted guide through
         
         return self.chat(prompt, context=context)
 
-    def clear_history(self):
-        """Clear conversation history."""
-        self.conversation_history = []
+    def clear_history(self, session_id):
+        """Clear a session's conversation history."""
+        self.conversations.clear(session_id)
@@ -4,16 +4,81 @@ Generates personalized emails to clients about their document status
 """
 
 import os
+import threading
 from services.openai_service import OpenAIService
 from services.email_service import EmailService
 from services.database_service import SessionLocal, VisaApplication, Applicant, Notification
+from services.llm_ledger_service import ledger
+from services.application_feed import encode_cursor, decode_cursor
+from sqlalchemy import case, exists, or_, and_
 from datetime import datetime, timedelta
 import json
 
+ALERT_COOLDOWN_DAYS = 7  # Same window as is_alert_recently_sent
+
+
+def find_alert_candidates(session, limit=50, after=None, confidence_threshold=70, cooldown_days=ALERT_COOLDOWN_DAYS):
+    """
+    Documents for the alerts inbox, classified in SQL: 'success' (Passed),
+    'confidence' (below the threshold) or 'missing' (Needs Review). Documents
+    with an ai_alert_* notification in the last cooldown_days are left out.
+
+    Args:
+        session: Session to query with
+        limit: Page size
+        after: Cursor from the previous page's 'next'
+        confidence_threshold: Confidence below which a document is a candidate
+        cooldown_days: How long a sent alert hides its document
+
+    Returns:
+        Dict with 'items' (id, file_name, processed_at, type) newest first, and 'next'
+    """
+    alert_type = case(
+        (VisaApplication.status == 'Passed', 'success'),
+        (VisaApplication.confidence_score < confidence_threshold, 'confidence'),
+        else_='missing'
+    )
+    # A range rather than LIKE, so the (document_id, notification_type, sent_at) index is used
+    recently_alerted = exists().where(
+        Notification.document_id == VisaApplication.document_id,
+        Notification.notification_type >= 'ai_alert_',
+        Notification.notification_type < 'ai_alert`',
+        Notification.sent_at >= datetime.now() - timedelta(days=cooldown_days)
+    )
+    query = session.query(
+        VisaApplication.id, VisaApplication.file_name, VisaApplication.upload_date, VisaApplication.updated_at,
+        alert_type.label('type')
+    ).filter(
+        or_(VisaApplication.status.in_(['Needs Review', 'Passed']), VisaApplication.confidence_score < confidence_threshold),
+        ~recently_alerted
+    )
+    if after:
+        stamp, row_id = decode_cursor(after)
+        query = query.filter(or_(
+            VisaApplication.updated_at < stamp,
+            and_(VisaApplication.updated_at == stamp, VisaApplication.id < row_id)
+        ))
+    rows = query.order_by(VisaApplication.updated_at.desc(), VisaApplication.id.desc()).limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        'items': [{
+            'id': row.id,
+            'file_name': row.file_name,
+            'processed_at': row.upload_date.strftime("%Y-%m-%d %H:%M:%S") if row.upload_date else "N/A",
+            'type': row.type
+        } for row in rows],
+        'next': encode_cursor(rows[-1].updated_at, rows[-1].id) if more else None
+    }
+
+
 class ClientAlertService:
     def __init__(self):
         self.openai = OpenAIService()
-        self.email = EmailService()
+        self._email = None
+        self._email_lock = threading.Lock()
+        # The Sheets client's HTTP transport is not thread-safe, and this service is shared by the web app's threads
+        self._sheets_lock = threading.Lock()
         
         # Initialize Google Sheets service (optional - only if configured)
         try:
@@ -24,6 +89,15 @@ class ClientAlertService:
             self.sheets = None
             print(f"ℹ Google Sheets tracking disabled: {e}")
         
+    @property
+    def email(self):
+        """Gmail client, built on the first email sent; previews never need it."""
+        if self._email is None:
+            with self._email_lock:
+                if self._email is None:
+                    self._email = EmailService()
+        return self._email
+
     def generate_alert_email(self, document, issue_type="missing_elements", applicant=None):
         """
         Generate personalized email content using AI based on document analysis
@@ -119,7 +193,12 @@ Return JSON format:
 """
         
         try:
-            response = self.openai.client.chat.completions.create(
+            response = ledger.tracked_completion(
+                self.openai.client,
+                purpose="alert_email",
+                document_id=document.document_id,
+                applicant_id=applicant.id if applicant else document.applicant_id,
+                document_type=document.document_type,
                 model="gpt-4o",  # Using gpt-4o for higher quality email generation
                 messages=[
                     {"role": "system", "content": "You are a professional senior immigration consultant. You write remarkably clear, structured, and helpful client communications. Your style is professional yet warm and supportive."},
@@ -197,14 +276,15 @@ Australia Visa Processing Team
                     # Extract reason from email body (first 200 chars)
                     reason = email_info.get('subject', 'Document issue')
                     
-                    self.sheets.log_email_delivery(
-                        applicant_name=applicant.full_name,
-                        document_id=document.document_id,
-                        contact=applicant.email,
-                        issue_type=issue_type,
-                        email_address=applicant.email,
-                        reason=reason
-                    )
+                    with self._sheets_lock:
+                        self.sheets.log_email_delivery(
+                            applicant_name=applicant.full_name,
+                            document_id=document.document_id,
+                            contact=applicant.email,
+                            issue_type=issue_type,
+                            email_address=applicant.email,
+                            reason=reason
+                        )
                 except Exception as e:
                     print(f"Warning: Could not log to Google Sheets: {e}")
             
@@ -227,12 +307,13 @@ Australia Visa Processing Team
         db.close()
         return recent_notification is not None
     
-    def send_alerts_for_low_confidence_documents(self, threshold=70):
+    def send_alerts_for_low_confidence_documents(self, threshold=70, progress=None):
         """
         Send alert emails for all documents with confidence below threshold
         
         Args:
             threshold: Confidence threshold (default 70%)
+            progress: Optional callback(done, total) called before each document
         
         Returns:
             Number of emails sent
@@ -248,7 +329,9 @@ Australia Visa Processing Team
         
         emails_sent = 0
         
-        for doc in low_confidence_docs:
+        for index, doc in enumerate(low_confidence_docs):
+            if progress:
+                progress(index, len(low_confidence_docs))
             try:
                 # Skip if alert recently sent
                 if self.is_alert_recently_sent(doc.document_id, "low_confidence"):
@@ -279,12 +362,13 @@ Australia Visa Processing Team
         db.close()
         return emails_sent
     
-    def send_alerts_for_expiring_documents(self, days_threshold=30):
+    def send_alerts_for_expiring_documents(self, days_threshold=30, progress=None):
         """
         Send alert emails for documents expiring soon
         
         Args:
             days_threshold: Days before expiry to send alert
+            progress: Optional callback(done, total) called before each document
         
         Returns:
             Number of emails sent
@@ -303,7 +387,9 @@ Australia Visa Processing Team
         
         emails_sent = 0
         
-        for doc in expiring_docs:
+        for index, doc in enumerate(expiring_docs):
+            if progress:
+                progress(index, len(expiring_docs))
             try:
                 # Skip if alert recently sent
                 if self.is_alert_recently_sent(doc.document_id, "expiring_soon"):
@@ -331,35 +417,34 @@ Australia Visa Processing Team
         db.close()
         return emails_sent
     
-    def send_alerts_for_missing_elements(self):
+    def send_alerts_for_missing_elements(self, progress=None):
         """
         Send alert emails for documents with missing required elements
         
+        Args:
+            progress: Optional callback(done, total) called before each document
+        
         Returns:
             Number of emails sent
         """
         db = SessionLocal()
         
-        # Get documents with missing elements
+        # Get documents with missing elements (the promoted count, so no analysis is decoded to find them)
         docs_with_issues = db.query(VisaApplication).filter(
-            VisaApplication.ai_analysis != None,
+            VisaApplication.missing_elements_count > 0,
             VisaApplication.status == 'Needs Review'
         ).all()
         
         emails_sent = 0
         
-        for doc in docs_with_issues:
+        for index, doc in enumerate(docs_with_issues):
+            if progress:
+                progress(index, len(docs_with_issues))
             try:
                 # Skip if alert recently sent
                 if self.is_alert_recently_sent(doc.document_id, "missing_elements"):
                     continue
 
-                analysis = doc.ai_analysis or {}
-                missing = analysis.get("missing_elements", [])
-                
-                if not missing:
-                    continue
-                
                 applicant = db.query(Applicant).filter(
                     Applicant.id == doc.applicant_id
                 ).first()
@@ -0,0 +1,284 @@
+"""
+Conversation Store
+Chat history per browser session, so the shared AssistantService keeps no
+conversation state of its own. Each session keeps its last `max_messages`
+messages; sessions idle for `ttl_seconds` expire, and past `max_sessions` the
+least recently used session is dropped, so memory stays bounded however many
+people chat.
+
+With persistence on (CHAT_HISTORY_PERSIST=1) messages are also written to the
+chat_messages table, so a conversation survives a restart and is visible to
+every worker process. The in-memory map is then a cache in front of the table:
+each entry remembers the version of the rows it was read from (count, newest
+id, newest timestamp), and every read checks that version with one indexed
+aggregate query, reloading the session when another worker has changed it.
+
+Messages are the raw turns (the question as asked, the reply). A long history
+is compacted by the assistant: `compact` swaps its older messages for one
+summary message, which stays at the front of the session and does not count
+towards `max_messages`. The summary is an assistant message labelled
+SUMMARY_LABEL, not a system one: it is written from what users typed, so it
+must not carry the system prompt's authority. Sessions compacted before that
+change start with a 'system' row, which is read back as a labelled summary.
+"""
+
+import os
+import time
+import datetime
+import threading
+from collections import OrderedDict
+from sqlalchemy import func
+from services.database_service import SessionLocal, ChatMessage
+from services.write_queue import get_writer
+
+MAX_SESSIONS = int(os.getenv("CHAT_MAX_SESSIONS", "1000"))
+SESSION_TTL_SECONDS = int(os.getenv("CHAT_SESSION_TTL_S", str(6 * 3600)))
+MAX_MESSAGES = int(os.getenv("CHAT_MAX_MESSAGES", "20"))
+PERSIST = os.getenv("CHAT_HISTORY_PERSIST", "0") == "1"
+PRUNE_INTERVAL = 300  # Seconds between sweeps of expired persisted messages
+SUMMARY_ROLE = "assistant"
+SUMMARY_LABEL = "Summary of the earlier conversation"
+LEGACY_SUMMARY_ROLE = "system"
+
+
+def summary_message(summary):
+    """The message that stands in for a session's compacted messages."""
+    return {"role": SUMMARY_ROLE, "content": f"{SUMMARY_LABEL}: {summary}"}
+
+
+def is_summary(message):
+    """True if message (the first of a session) is a compaction summary."""
+    return message["role"] == LEGACY_SUMMARY_ROLE or (
+        message["role"] == SUMMARY_ROLE and message["content"].startswith(f"{SUMMARY_LABEL}: "))
+
+
+def _upgrade_summary(messages):
+    """messages with a legacy 'system' summary in front rewritten as an assistant one."""
+    if messages and messages[0]["role"] == LEGACY_SUMMARY_ROLE:
+        content = messages[0]["content"]
+        if content.startswith(f"{SUMMARY_LABEL}: "):
+            return [{"role": SUMMARY_ROLE, "content": content}] + messages[1:]
+        return [summary_message(content)] + messages[1:]
+    return messages
+
+
+class ConversationStore:
+    """
+    Thread-safe, bounded chat histories keyed by session id.
+
+    Args:
+        max_sessions: Sessions kept in memory; the least recently used goes first
+        ttl_seconds: Idle time after which a session's history is forgotten
+        max_messages: Messages kept per session, not counting a summary (oldest dropped first)
+        persist: Also keep messages in the chat_messages table
+        session_factory: Session factory (defaults to SessionLocal)
+    """
+
+    def __init__(self, max_sessions=MAX_SESSIONS, ttl_seconds=SESSION_TTL_SECONDS, max_messages=MAX_MESSAGES,
+                 persist=PERSIST, session_factory=None):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_messages = max_messages
+        self.persist = persist
+        self.session_factory = session_factory or SessionLocal
+        self._sessions = OrderedDict()  # session_id -> (last used, messages, version), least recently used first
+        self._lock = threading.Lock()
+        self._last_prune = 0.0
+
+    def _expire(self, now):
+        # Oldest first, so stop at the first session still in use
+        while self._sessions:
+            session_id, entry = next(iter(self._sessions.items()))
+            if now - entry[0] < self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+
+    def _cached(self, session_id):
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            self._sessions[session_id] = (now,) + entry[1:]
+            self._sessions.move_to_end(session_id)
+            return list(entry[1]), entry[2]
+
+    @staticmethod
+    def _version(session, session_id):
+        """Changes whenever the session's persisted rows do: appended, trimmed, compacted or cleared."""
+        return tuple(session.query(
+            func.count(ChatMessage.id), func.max(ChatMessage.id), func.max(ChatMessage.created_at)
+        ).filter(ChatMessage.session_id == session_id).one())
+
+    def _load(self, session_id, cached_version=None):
+        """(messages, version) from the table; messages is None when cached_version is still current."""
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=self.ttl_seconds)
+        session = self.session_factory()
+        try:
+            version = self._version(session, session_id)
+            if version == cached_version:
+                return None, version
+            # Persisted rows are trimmed on write, so this is at most max_messages and a summary
+            rows = session.query(ChatMessage.role, ChatMessage.content).filter(
+                ChatMessage.session_id == session_id,
+                ChatMessage.created_at >= cutoff
+            ).order_by(ChatMessage.id).all()
+            return self._trim(_upgrade_summary([{"role": role, "content": content} for role, content in rows])), version
+        finally:
+            session.close()
+
+    def history(self, session_id):
+        """
+        The session's messages, oldest first.
+
+        Args:
+            session_id: Browser session id
+
+        Returns:
+            List of {'role', 'content'} dicts (a copy; empty for a new or expired session)
+        """
+        cached = self._cached(session_id)
+        if not self.persist:
+            return cached[0] if cached is not None else []
+        loaded, version = self._load(session_id, cached[1] if cached is not None else None)
+        if loaded is None:
+            return cached[0]
+        with self._lock:
+            if loaded:
+                self._store(session_id, loaded, version)
+            else:
+                # Cleared or expired elsewhere; an unknown session does not take a cache slot
+                self._sessions.pop(session_id, None)
+        return list(loaded)
+
+    def _trim(self, messages):
+        if messages and is_summary(messages[0]):
+            return messages[:1] + messages[1:][-self.max_messages:]
+        return messages[-self.max_messages:]
+
+    def _store(self, session_id, messages, version=None):
+        self._sessions[session_id] = (time.monotonic(), self._trim(messages), version)
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+
+    def append(self, session_id, *messages):
+        """
+        Adds messages to the end of the session's history.
+
+        Args:
+            session_id: Browser session id
+            messages: {'role', 'content'} dicts
+        """
+        messages = [{"role": m["role"], "content": m["content"]} for m in messages]
+        self.history(session_id)  # Loads a persisted history into the cache first
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            self._store(session_id, (entry[1] if entry else []) + messages)
+            version = entry[2] if entry else (0, None, None)  # Not cached means no rows yet
+        if self.persist:
+            self._persist(session_id, messages, version)
+
+    def _remember_version(self, session_id, version):
+        # None leaves the entry without a version, so the next read reloads it
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._sessions[session_id] = entry[:2] + (version,)
+
+    def _persist(self, session_id, messages, version):
+        now = datetime.datetime.now()
+        keep = self.max_messages
+        prune = time.monotonic() - self._last_prune >= PRUNE_INTERVAL
+        if prune:
+            self._last_prune = time.monotonic()
+        cutoff = now - datetime.timedelta(seconds=self.ttl_seconds)
+
+        def job(session):
+            # Rows another worker wrote since our read make the new version ours only in part
+            current = self._version(session, session_id) == version
+            session.execute(ChatMessage.__table__.insert(), [
+                {'session_id': session_id, 'role': m['role'], 'content': m['content'], 'created_at': now}
+                for m in messages
+            ])
+            # Drop what fell out of the window: every message older than the newest `keep`, bar a summary
+            turns = [ChatMessage.session_id == session_id]
+            first = session.query(ChatMessage.id, ChatMessage.role, ChatMessage.content).filter(
+                *turns).order_by(ChatMessage.id).first()
+            if first is not None and is_summary({"role": first.role, "content": first.content}):
+                turns.append(ChatMessage.id != first.id)
+            oldest_kept = session.query(ChatMessage.id).filter(*turns).order_by(
+                ChatMessage.id.desc()).offset(keep - 1).limit(1).scalar()
+            if oldest_kept is not None:
+                session.query(ChatMessage).filter(*turns, ChatMessage.id < oldest_kept).delete(
+                    synchronize_session=False)
+            if prune:
+                session.query(ChatMessage).filter(ChatMessage.created_at < cutoff).delete(synchronize_session=False)
+            return self._version(session, session_id) if current else None
+
+        try:
+            self._remember_version(session_id, get_writer(self.session_factory).submit(job))
+        except Exception as e:
+            self._remember_version(session_id, None)
+            print(f"⚠ Could not persist chat history for session {session_id}: {e}")
+
+    def compact(self, session_id, replaced, summary):
+        """
+        Replaces the oldest messages of a session with a summary of them.
+
+        Args:
+            session_id: Browser session id
+            replaced: The messages summarised, as returned by `history` (a prefix of it)
+            summary: Summary text (labelled with SUMMARY_LABEL here)
+
+        Returns:
+            True if compacted; False if the history no longer starts with `replaced`
+            (e.g. another request compacted it first)
+        """
+        replaced = [{"role": m["role"], "content": m["content"]} for m in replaced]
+        message = summary_message(summary)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if not replaced or entry is None or entry[1][:len(replaced)] != replaced:
+                return False
+            self._store(session_id, [message] + entry[1][len(replaced):])
+        if self.persist:
+            self._persist_compaction(session_id, replaced, message, entry[2])
+        return True
+
+    def _persist_compaction(self, session_id, replaced, message, version):
+        now = datetime.datetime.now()
+
+        def job(session):
+            current = self._version(session, session_id) == version
+            rows = session.query(ChatMessage).filter(ChatMessage.session_id == session_id).order_by(
+                ChatMessage.id).limit(len(replaced)).all()
+            if _upgrade_summary([{"role": row.role, "content": row.content} for row in rows]) != replaced:
+                return  # Another worker changed this session; its own copy stands
+            # The newest replaced row becomes the summary, keeping its place before the rest
+            for row in rows[:-1]:
+                session.delete(row)
+            rows[-1].role, rows[-1].content, rows[-1].created_at = message["role"], message["content"], now
+            session.flush()
+            return self._version(session, session_id) if current else None
+
+        try:
+            self._remember_version(session_id, get_writer(self.session_factory).submit(job))
+        except Exception as e:
+            self._remember_version(session_id, None)
+            print(f"⚠ Could not persist chat summary for session {session_id}: {e}")
+
+    def clear(self, session_id):
+        """Forgets the session's history."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+        if self.persist:
+            get_writer(self.session_factory).submit(
+                lambda session: session.query(ChatMessage).filter(
+                    ChatMessage.session_id == session_id).delete(synchronize_session=False))
+
+    def __len__(self):
+        with self._lock:
+            self._expire(time.monotonic())
+            return len(self._sessions)
@@ -6,6 +6,7 @@ from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
 import pickle
+import threading
 
 class EmailService:
     def __init__(self, credentials_path='client_secret_931330138105-bsg4ghrk6baig3ta0d8uvcmdcnb5v46k.apps.googleusercontent.com.json', token_path='token.pickle'):
@@ -33,6 +34,8 @@ class EmailService:
                 pickle.dump(self.creds, token)
 
         self.service = build('gmail', 'v1', credentials=self.creds)
+        # The API client's HTTP transport is not thread-safe, and one instance is shared by the web app's threads
+        self._lock = threading.Lock()
 
     def send_email(self, to, subject, body):
         """Sends an email using the Gmail API."""
@@ -43,8 +46,9 @@ class EmailService:
         raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode()
         
         try:
-            message = self.service.users().messages().send(
-                userId='me', body={'raw': raw_message}).execute()
+            with self._lock:
+                message = self.service.users().messages().send(
+                    userId='me', body={'raw': raw_message}).execute()
             print(f"Message Id: {message['id']} sent successfully to {to}")
             return message
         except Exception as e:
@@ -0,0 +1,314 @@
+"""
+Event Bus
+Change feed behind the dashboard's server-sent events. A change is recorded as
+a change_events row in the same transaction as the change itself, so the
+agent, scheduler and Modal workers reach the web app through the database
+whichever process they run in. ORM flushes of VisaApplication and Notification
+rows are captured automatically; Core-level writes (the application store
+upsert, retention) call `publish`.
+
+In the web process one poller thread reads new rows and fans them out to every
+subscriber's queue, however many tabs are open. A subscriber that reconnects
+with a Last-Event-ID is replayed from the table first; if it is too far behind
+it gets a `reset` event and reloads instead.
+
+Ids are handed out when a row is inserted but become visible when its
+transaction commits, and on Postgres a long transaction can commit after a
+later id already has. So the poller remembers the ids it skipped over and
+re-reads them on each poll until they show up (or GAP_TIMEOUT_SECONDS passes,
+for ids of rolled-back transactions). The SSE id sent to clients is the bus's
+cursor, the highest id with nothing missing below it, so a reconnect resumes
+from a point where nothing can have been skipped.
+"""
+
+import os
+import json
+import time
+import queue
+import datetime
+import threading
+from collections import deque
+from sqlalchemy import event, func
+from sqlalchemy.orm import Session
+from services.database_service import SessionLocal, ChangeEvent, VisaApplication, Notification
+
+POLL_INTERVAL = float(os.getenv("EVENT_POLL_INTERVAL_S", "0.5"))
+RETENTION_HOURS = int(os.getenv("EVENT_RETENTION_HOURS", "24"))
+MAX_REPLAY = int(os.getenv("EVENT_MAX_REPLAY", "1000"))
+SUBSCRIBER_QUEUE_SIZE = 1000
+GAP_TIMEOUT_SECONDS = float(os.getenv("EVENT_GAP_TIMEOUT_S", "300"))
+MAX_GAPS = 500  # Missing ids waited for at once; the oldest are given up first
+
+# ORM models whose changes are published, by topic
+TRACKED_MODELS = {VisaApplication: 'application', Notification: 'notification'}
+
+
+def _event_row(topic, action, entity_id=None, payload=None, now=None):
+    return {'topic': topic, 'action': action, 'entity_id': str(entity_id) if entity_id is not None else None,
+            'payload': payload, 'created_at': now or datetime.datetime.now()}
+
+
+def publish(session, topic, action, entity_ids=None, payload=None):
+    """
+    Records change events in the session's transaction. Does not commit.
+
+    Args:
+        session: Session the change is written with
+        topic: 'application' or 'notification'
+        action: e.g. 'upserted', 'archived'
+        entity_ids: Ids of the changed rows (one event each); None for a single event
+        payload: Optional small JSON payload for every event
+    """
+    now = datetime.datetime.now()
+    ids = list(entity_ids) if entity_ids is not None else [None]
+    if ids:
+        session.execute(ChangeEvent.__table__.insert(), [_event_row(topic, action, i, payload, now) for i in ids])
+
+
+def _notification_payload(notification):
+    return {'applicant_id': notification.applicant_id, 'document_id': notification.document_id,
+            'notification_type': notification.notification_type, 'severity': notification.severity}
+
+
+@event.listens_for(Session, "after_flush")
+def _publish_orm_changes(session, flush_context):
+    # new/dirty/deleted still show the pre-flush state here, and new rows already have their ids
+    now = datetime.datetime.now()
+    rows = []
+    for objects, action in ((session.new, 'created'), (session.dirty, 'updated'), (session.deleted, 'deleted')):
+        for obj in objects:
+            topic = TRACKED_MODELS.get(type(obj))
+            if topic is None or (action == 'updated' and not session.is_modified(obj, include_collections=False)):
+                continue
+            payload = _notification_payload(obj) if topic == 'notification' else None
+            rows.append(_event_row(topic, action, obj.id, payload, now))
+    if rows:
+        session.execute(ChangeEvent.__table__.insert(), rows)
+
+
+def prune_events(session_factory=None, max_age_hours=RETENTION_HOURS):
+    """Deletes change events older than max_age_hours. Returns the number deleted."""
+    session = (session_factory or SessionLocal)()
+    try:
+        cutoff = datetime.datetime.now() - datetime.timedelta(hours=max_age_hours)
+        deleted = session.query(ChangeEvent).filter(ChangeEvent.created_at < cutoff).delete(synchronize_session=False)
+        session.commit()
+        return deleted
+    finally:
+        session.close()
+
+
+def format_sse(message):
+    """A message dict ('event', 'data', optional 'id') in text/event-stream framing."""
+    lines = [f"id: {message['id']}"] if message.get('id') is not None else []
+    lines += [f"event: {message['event']}", f"data: {json.dumps(message['data'], default=str)}"]
+    return "\n".join(lines) + "\n\n"
+
+
+def _message(row, cursor=None):
+    """SSE message for a change event; 'id' is the resume cursor (defaults to the event's own id)."""
+    return {'id': row.id if cursor is None else cursor, 'event_id': row.id, 'event': row.topic, 'data': {
+        'id': row.id, 'topic': row.topic, 'action': row.action, 'entity_id': row.entity_id, 'payload': row.payload}}
+
+
+class Subscription:
+    """One client's view of the bus: replayed events first, then live ones, each event at most once."""
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.replay = deque()
+        self.replayed = set()  # Event ids sent by replay; the live feed may carry them too
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def get(self, timeout=None):
+        """Next message, or None if nothing arrived within timeout."""
+        if self.overflowed:
+            # The client fell behind the live queue; have it reload rather than miss changes
+            self.overflowed = False
+            self.replay.clear()
+            self._drain()
+            return {'event': 'reset', 'data': {'reason': 'overflow'}}
+        if self.replay:
+            return self.replay.popleft()
+        deadline = None if timeout is None else datetime.datetime.now() + datetime.timedelta(seconds=timeout)
+        while True:
+            remaining = None if deadline is None else (deadline - datetime.datetime.now()).total_seconds()
+            if remaining is not None and remaining <= 0:
+                return None
+            try:
+                message = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                return None
+            if message.get('event_id') not in self.replayed:
+                return message
+
+    def _drain(self):
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                return
+
+    def put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.overflowed = True
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+
+class EventBus:
+    """
+    Fans change_events out to in-process subscribers from a single poller thread.
+
+    Args:
+        session_factory: Session factory (defaults to SessionLocal)
+        poll_interval: Seconds between polls while anyone is subscribed
+        stats_provider: Optional callable returning dashboard stats; sent as a
+            'stats' message (computed once for all subscribers) after application changes
+    """
+
+    def __init__(self, session_factory=None, poll_interval=POLL_INTERVAL, stats_provider=None):
+        self.session_factory = session_factory or SessionLocal
+        self.poll_interval = poll_interval
+        self.stats_provider = stats_provider
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self.last_seen = None  # Highest event id read
+        self._gaps = {}  # Skipped ids below last_seen, not visible yet -> when first missed (monotonic)
+
+    def _latest_id(self, session):
+        return session.query(func.max(ChangeEvent.id)).scalar() or 0
+
+    @property
+    def cursor(self):
+        """Highest event id with every id below it read or given up on; None before the first poll."""
+        if self.last_seen is None:
+            return None
+        return min(self._gaps) - 1 if self._gaps else self.last_seen
+
+    def subscribe(self, last_event_id=None):
+        """
+        Registers a subscriber.
+
+        Args:
+            last_event_id: Resume after this event (replayed from the table)
+
+        Returns:
+            Subscription; call close() when the client goes away
+        """
+        self._ensure_started()
+        session = self.session_factory()
+        try:
+            latest = self._latest_id(session)
+            subscription = Subscription(self)
+            with self._lock:
+                if not self._subscribers or self.last_seen is None:
+                    # Nobody was listening; live events start after what replay covers
+                    self.last_seen = latest
+                    self._gaps = {}
+                self._subscribers.add(subscription)
+                cursor = self.cursor
+            if last_event_id is not None and last_event_id < latest:
+                rows = session.query(ChangeEvent).filter(
+                    ChangeEvent.id > last_event_id
+                ).order_by(ChangeEvent.id).limit(MAX_REPLAY + 1).all()
+                oldest = session.query(func.min(ChangeEvent.id)).scalar() or 0
+                if len(rows) > MAX_REPLAY or oldest > last_event_id + 1:
+                    # Pruned or too many to replay; the client reloads and continues from here
+                    subscription.replay.append({'event': 'reset', 'data': {'reason': 'replay_window'}})
+                else:
+                    # Never resume past the bus cursor: ids above it may still be in flight
+                    subscription.replay.extend(
+                        _message(row, max(last_event_id, min(row.id, cursor))) for row in rows)
+                    subscription.replayed.update(row.id for row in rows)
+            return subscription
+        finally:
+            session.close()
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="event-bus", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def poll_once(self):
+        """
+        Reads events after the last one seen, plus skipped ids that have since
+        committed, and fans them out. Returns the number of new ids read (not
+        counting late ones), so the caller knows whether a backlog is left.
+        """
+        session = self.session_factory()
+        try:
+            if self.last_seen is None:
+                self.last_seen = self._latest_id(session)
+                return 0
+            rows = session.query(ChangeEvent).filter(
+                ChangeEvent.id > self.last_seen
+            ).order_by(ChangeEvent.id).limit(500).all()
+            late = session.query(ChangeEvent).filter(
+                ChangeEvent.id.in_(list(self._gaps))
+            ).order_by(ChangeEvent.id).all() if self._gaps else []
+        finally:
+            session.close()
+
+        now = time.monotonic()
+        for row in late:
+            self._gaps.pop(row.id, None)
+        expected = self.last_seen + 1
+        for row in rows:
+            for missing in range(expected, row.id):
+                self._gaps[missing] = now
+            expected = row.id + 1
+        if rows:
+            self.last_seen = rows[-1].id
+        # Ids of rolled-back transactions never show up; stop waiting for them
+        for missing, since in list(self._gaps.items()):
+            if now - since > GAP_TIMEOUT_SECONDS:
+                del self._gaps[missing]
+        for missing in sorted(self._gaps)[:max(0, len(self._gaps) - MAX_GAPS)]:
+            del self._gaps[missing]
+
+        rows = late + rows
+        if not rows:
+            return 0
+        cursor = self.cursor
+        messages = [_message(row, cursor) for row in rows]
+        if self.stats_provider and any(row.topic == 'application' for row in rows):
+            try:
+                messages.append({'event': 'stats', 'data': self.stats_provider()})
+            except Exception as e:
+                print(f"⚠ Could not compute stats for subscribers: {e}")
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            for message in messages:
+                subscription.put(message)
+        return len(rows) - len(late)
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._lock:
+                idle = not self._subscribers
+            try:
+                if not idle and self.poll_once() >= 500:
+                    continue  # Backlog; read the next page straight away
+            except Exception as e:
+                print(f"⚠ Event bus poll failed: {e}")
+            self._stop.wait(self.poll_interval)
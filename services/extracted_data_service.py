@@ -0,0 +1,249 @@
+"""
+Extracted Data Service
+Normalised copies of the dates, names and reference numbers in each document's
+analysis (`extracted_data`), in narrow indexed tables. Questions that span
+documents, such as "which translation certificates expire this month" or "which
+applicants share passport number X", become index lookups instead of decoding
+every analysis payload.
+
+The tables are rewritten whenever an analysis is written (application_store,
+manual corrections); `backfill` fills them for rows analysed before they existed.
+"""
+
+import re
+import datetime
+from dateutil.parser import parse, ParserError
+from sqlalchemy import func
+from services.database_service import (
+    SessionLocal, VisaApplication, DocumentAnalysis, ExtractedDate, ExtractedName, ExtractedReference
+)
+
+EXTRACTED_MODELS = (ExtractedDate, ExtractedName, ExtractedReference)
+
+
+def normalize_name(name):
+    return ' '.join(str(name).split()).lower()
+
+
+def normalize_reference(reference):
+    return re.sub(r'[^0-9A-Za-z]', '', str(reference)).upper()
+
+
+def normalize_date_type(key):
+    return str(key).strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def _parse_date(value):
+    if not isinstance(value, str) or not value.strip():
+        return None
+    try:
+        return parse(value)
+    except (ParserError, ValueError, OverflowError):
+        return None  # Placeholders such as "YYYY-MM-DD" or "Not applicable"
+
+
+def extract_fields(analysis):
+    """
+    Pulls the indexable fields out of an analysis.
+
+    Returns:
+        Dict with 'dates' [(date_type, datetime, raw)], 'names' [str] and 'references' [str]
+    """
+    data = analysis.get('extracted_data') if isinstance(analysis, dict) else None
+    if not isinstance(data, dict):
+        return {'dates': [], 'names': [], 'references': []}
+
+    dates = []
+    raw_dates = data.get('dates') if isinstance(data.get('dates'), dict) else {}
+    for key, value in raw_dates.items():
+        # other_dates nests {type: value}; each inner type is a date type of its own
+        items = value.items() if isinstance(value, dict) else [(key, value)]
+        for date_type, raw in items:
+            parsed = _parse_date(raw)
+            if parsed:
+                dates.append((normalize_date_type(date_type), parsed, raw[:100]))
+
+    def strings(values):
+        values = values if isinstance(values, list) else [values] if values else []
+        return [str(v) for v in values if isinstance(v, (str, int)) and str(v).strip()]
+
+    return {'dates': dates, 'names': strings(data.get('names')), 'references': strings(data.get('reference_numbers'))}
+
+
+def replace_extracted_data(session, analyses):
+    """
+    Rewrites the extracted rows of the given applications. Does not commit.
+
+    Args:
+        session: Session to execute on
+        analyses: Dict of application id -> ai_analysis (None clears the rows)
+
+    Returns:
+        Number of rows written
+    """
+    if not analyses:
+        return 0
+    ids = list(analyses)
+    for model in EXTRACTED_MODELS:
+        session.query(model).filter(model.application_id.in_(ids)).delete(synchronize_session=False)
+
+    dates, names, references = [], [], []
+    for application_id, analysis in analyses.items():
+        fields = extract_fields(analysis)
+        dates += [{'application_id': application_id, 'date_type': date_type, 'value': value, 'raw_value': raw}
+                  for date_type, value, raw in fields['dates']]
+        names += [{'application_id': application_id, 'name': name[:255], 'normalized_name': normalize_name(name)[:255]}
+                  for name in dict.fromkeys(fields['names'])]
+        references += [{'application_id': application_id, 'reference': ref[:255],
+                        'normalized_reference': normalize_reference(ref)[:255]}
+                       for ref in dict.fromkeys(fields['references']) if normalize_reference(ref)]
+    for model, rows in ((ExtractedDate, dates), (ExtractedName, names), (ExtractedReference, references)):
+        if rows:
+            session.execute(model.__table__.insert(), rows)
+    return len(dates) + len(names) + len(references)
+
+
+def delete_extracted_data(session, application_ids):
+    """Removes the extracted rows of applications leaving the hot table. Does not commit."""
+    for model in EXTRACTED_MODELS:
+        session.query(model).filter(model.application_id.in_(application_ids)).delete(synchronize_session=False)
+
+
+def backfill(session_factory=None, batch_size=500):
+    """
+    Rebuilds the extracted rows from every stored analysis, one batch per transaction.
+    Safe to run again; each batch replaces what is there.
+
+    Returns:
+        Number of analyses processed
+    """
+    session_factory = session_factory or SessionLocal
+    processed, last_id = 0, 0
+    while True:
+        session = session_factory()
+        try:
+            # Reads only document_analyses, so it also runs against older visa_applications schemas
+            batch = session.query(DocumentAnalysis).filter(
+                DocumentAnalysis.application_id > last_id
+            ).order_by(DocumentAnalysis.application_id).limit(batch_size).all()
+            if not batch:
+                break
+            replace_extracted_data(session, {a.application_id: a.data.get('ai_analysis') for a in batch})
+            session.commit()
+            last_id = batch[-1].application_id
+            processed += len(batch)
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+    return processed
+
+
+def _document(application, **extra):
+    return dict({
+        'id': application.id,
+        'document_id': application.document_id,
+        'file_name': application.file_name,
+        'document_type': application.document_type,
+        'applicant_id': application.applicant_id,
+    }, **extra)
+
+
+class ExtractedDataService:
+    """
+    Cross-document queries over the extracted-data tables.
+
+    Args:
+        session_factory: Session factory (defaults to SessionLocal)
+    """
+
+    def __init__(self, session_factory=None):
+        self.session_factory = session_factory or SessionLocal
+
+    def documents_with_date(self, date_type, start=None, end=None, document_type=None):
+        """
+        Documents with a date of the given type in [start, end).
+
+        Args:
+            date_type: e.g. 'expiry_date' or 'translation_date'
+            start, end: Optional datetime bounds
+            document_type: Optional case-insensitive substring of the document type, e.g. 'translation'
+
+        Returns:
+            List of document dicts with 'date_type' and 'date', soonest first
+        """
+        session = self.session_factory()
+        try:
+            query = session.query(ExtractedDate, VisaApplication).join(
+                VisaApplication, VisaApplication.id == ExtractedDate.application_id
+            ).filter(ExtractedDate.date_type == normalize_date_type(date_type))
+            if start:
+                query = query.filter(ExtractedDate.value >= start)
+            if end:
+                query = query.filter(ExtractedDate.value < end)
+            if document_type:
+                query = query.filter(func.lower(VisaApplication.document_type).contains(document_type.lower()))
+            return [_document(application, date_type=date.date_type, date=date.value.strftime("%Y-%m-%d"))
+                    for date, application in query.order_by(ExtractedDate.value)]
+        finally:
+            session.close()
+
+    def documents_with_reference(self, reference):
+        """Documents whose analysis mentions a reference number (ignoring case, spaces and punctuation)."""
+        session = self.session_factory()
+        try:
+            query = session.query(VisaApplication).join(
+                ExtractedReference, ExtractedReference.application_id == VisaApplication.id
+            ).filter(ExtractedReference.normalized_reference == normalize_reference(reference))
+            return [_document(application) for application in query.order_by(VisaApplication.id)]
+        finally:
+            session.close()
+
+    def documents_with_name(self, name):
+        """Documents whose analysis names a person (ignoring case and spacing)."""
+        session = self.session_factory()
+        try:
+            query = session.query(VisaApplication).join(
+                ExtractedName, ExtractedName.application_id == VisaApplication.id
+            ).filter(ExtractedName.normalized_name == normalize_name(name))
+            return [_document(application) for application in query.order_by(VisaApplication.id)]
+        finally:
+            session.close()
+
+    def shared_references(self, min_applicants=2, limit=100):
+        """
+        Reference numbers that appear on documents of more than one applicant.
+
+        Returns:
+            List of dicts with 'reference', 'applicants' (count) and 'documents' (count)
+        """
+        session = self.session_factory()
+        try:
+            applicants = func.count(func.distinct(VisaApplication.applicant_id))
+            rows = session.query(
+                ExtractedReference.normalized_reference, applicants, func.count(ExtractedReference.id)
+            ).join(
+                VisaApplication, VisaApplication.id == ExtractedReference.application_id
+            ).group_by(ExtractedReference.normalized_reference).having(
+                applicants >= min_applicants
+            ).order_by(applicants.desc()).limit(limit).all()
+            return [{'reference': reference, 'applicants': count, 'documents': documents}
+                    for reference, count, documents in rows]
+        finally:
+            session.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Extracted-data tables')
+    parser.add_argument('--backfill', action='store_true', help='Rebuild the tables from stored analyses')
+    parser.add_argument('--expiring-days', type=int, default=None, help='List documents expiring within N days')
+    args = parser.parse_args()
+    if args.backfill:
+        print(f"✓ Backfilled extracted data for {backfill()} document(s)")
+    if args.expiring_days is not None:
+        now = datetime.datetime.now()
+        for doc in ExtractedDataService().documents_with_date('expiry_date', now, now + datetime.timedelta(days=args.expiring_days)):
+            print(f"  {doc['date']}  {doc['document_type']}  {doc['file_name']}")
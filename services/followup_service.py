@@ -6,6 +6,7 @@ Sends reminder emails for pending follow-ups after 7 days
 from services.google_sheets_service import GoogleSheetsService
 from services.openai_service import OpenAIService
 from services.email_service import EmailService
+from services.llm_ledger_service import ledger
 import json
 
 class FollowupService:
@@ -14,7 +15,7 @@ class FollowupService:
         self.openai = OpenAIService()
         self.email = EmailService()
     
-    def generate_followup_email(self, applicant_name, issue_type, original_reason, days_ago):
+    def generate_followup_email(self, applicant_name, issue_type, original_reason, days_ago, document_id=None):
         """
         Generate a follow-up email using AI
         
@@ -23,6 +24,7 @@ class FollowupService:
             issue_type: Original issue type
             original_reason: Original reason for contact
             days_ago: Number of days since original email
+            document_id: Optional document the original email was about (for usage tracking)
         
         Returns:
             dict with subject and body
@@ -72,7 +74,10 @@ Return JSON format:
 """
         
         try:
-            response = self.openai.client.chat.completions.create(
+            response = ledger.tracked_completion(
+                self.openai.client,
+                purpose="followup_email",
+                document_id=document_id,
                 model="gpt-4o",
                 messages=[
                     {"role": "system", "content": "You are a professional senior immigration consultant. You write clear, supportive follow-up communications."},
@@ -141,7 +146,8 @@ Australia Visa Agent</p>
                     applicant_name=applicant_name,
                     issue_type=issue_type,
                     original_reason=reason,
-                    days_ago=days_ago
+                    days_ago=days_ago,
+                    document_id=followup.get('document_id')
                 )
                 
                 # Send email
@@ -19,7 +19,7 @@ class GoogleDriveService:
         """Lists files in a specific Google Drive folder."""
         results = self.service.files().list(
             q=f"'{folder_id}' in parents and trashed = false",
-            fields="nextPageToken, files(id, name, mimeType, createdTime)"
+            fields="nextPageToken, files(id, name, mimeType, createdTime, size)"
         ).execute()
         return results.get('files', [])
 
@@ -0,0 +1,257 @@
+"""
+Job Runner
+Background execution for dashboard actions that take longer than a request
+should (generating and sending alert emails, notification scans, readiness
+reports). The route submits a job and answers straight away with its id; the
+work runs on a small thread pool in the web process, and its status, progress
+and result live in the jobs table, so any worker process can answer a poll.
+
+The work is I/O bound (OpenAI, Gmail, the database), so threads are enough and
+keep the handlers' clients shared. While a runner has jobs queued or running
+it touches their rows every HEARTBEAT_INTERVAL seconds, however quiet the
+handler is. A job whose heartbeat stops, because its process died or
+restarted, is marked failed after STALE_AFTER_SECONDS: when a runner starts,
+when the job is read (so a poll always ends), and by each runner's periodic
+sweep.
+"""
+
+import os
+import time
+import uuid
+import datetime
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from services.database_service import SessionLocal, Job
+from services.write_queue import get_writer
+
+MAX_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+STALE_AFTER_SECONDS = int(os.getenv("JOB_STALE_AFTER_S", "300"))
+HEARTBEAT_INTERVAL = int(os.getenv("JOB_HEARTBEAT_S", "60"))  # Well under STALE_AFTER_SECONDS
+PROGRESS_INTERVAL = 0.5  # Seconds between progress writes
+
+
+def job_to_dict(job):
+    """API shape of a job row."""
+    def stamp(value):
+        return value.strftime("%Y-%m-%d %H:%M:%S") if value else None
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': round(job.progress or 0, 3),
+        'message': job.message,
+        'result': job.result,
+        'error': job.error,
+        'created_at': stamp(job.created_at),
+        'started_at': stamp(job.started_at),
+        'finished_at': stamp(job.finished_at),
+    }
+
+
+def stage_progress(progress, index, count, label):
+    """Progress callback(done, total) for stage `index` of `count`, mapped onto the whole job."""
+    return lambda done, total: progress((index + done / max(total, 1)) / count, f"{label}: {done}/{total}")
+
+
+class JobRunner:
+    """
+    Runs registered job kinds on a thread pool and records them in the jobs table.
+
+    Args:
+        session_factory: Session factory (defaults to SessionLocal)
+        max_workers: Jobs run at the same time; the rest wait as 'queued'
+        heartbeat_interval: Seconds between heartbeats of this runner's unfinished jobs
+        stale_after: Seconds without a heartbeat after which an unfinished job counts as interrupted
+    """
+
+    def __init__(self, session_factory=None, max_workers=MAX_WORKERS, heartbeat_interval=HEARTBEAT_INTERVAL,
+                 stale_after=STALE_AFTER_SECONDS):
+        self.session_factory = session_factory or SessionLocal
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._handlers = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._active = set()  # Ids of this runner's queued and running jobs
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = None
+        self.fail_interrupted()
+
+    def register(self, kind, handler):
+        """
+        Registers a job kind.
+
+        Args:
+            kind: Name clients submit
+            handler: Callable(params, progress) returning a JSON-serialisable result;
+                progress(fraction, message=None) reports how far it is (0..1)
+        """
+        self._handlers[kind] = handler
+
+    @property
+    def kinds(self):
+        return list(self._handlers)
+
+    def _update(self, job_id, **values):
+        values['updated_at'] = datetime.datetime.now()
+        get_writer(self.session_factory).submit(
+            lambda session: session.query(Job).filter(Job.id == job_id).update(values, synchronize_session=False))
+
+    def submit(self, kind, params=None):
+        """
+        Queues a job.
+
+        Args:
+            kind: A registered job kind
+            params: JSON-serialisable parameters for the handler
+
+        Returns:
+            The job as a dict (status 'queued')
+
+        Raises:
+            ValueError: On an unknown kind
+        """
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        now = datetime.datetime.now()
+        row = {'id': uuid.uuid4().hex, 'kind': kind, 'status': 'queued', 'params': params or {}, 'progress': 0,
+               'created_at': now, 'updated_at': now}
+        get_writer(self.session_factory).submit(lambda session: session.execute(Job.__table__.insert().values(**row)))
+        with self._lock:
+            self._active.add(row['id'])
+        self._ensure_heartbeat()
+        self._executor.submit(self._run, row['id'], kind, params or {})
+        return job_to_dict(Job(**row))
+
+    def _ensure_heartbeat(self):
+        with self._lock:
+            if self._heartbeat is not None and self._heartbeat.is_alive():
+                return
+            self._heartbeat = threading.Thread(target=self._beat, name="job-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def _beat(self):
+        last_sweep = time.monotonic()
+        while not self._stop.wait(self.heartbeat_interval):
+            with self._lock:
+                active = list(self._active)
+            if active:
+                now = datetime.datetime.now()
+                try:
+                    get_writer(self.session_factory).submit(
+                        lambda session: session.query(Job).filter(
+                            Job.id.in_(active), Job.status.in_(['queued', 'running'])
+                        ).update({'updated_at': now}, synchronize_session=False))
+                except Exception as e:
+                    print(f"⚠ Job heartbeat failed: {e}")
+            # Jobs of workers that restarted since this runner started
+            if time.monotonic() - last_sweep >= self.stale_after / 2:
+                last_sweep = time.monotonic()
+                self.fail_interrupted()
+
+    def _is_stale(self, job):
+        cutoff = datetime.datetime.now() - datetime.timedelta(seconds=self.stale_after)
+        return job.status in ('queued', 'running') and job.updated_at is not None and job.updated_at < cutoff
+
+    def _run(self, job_id, kind, params):
+        last_write = [0.0]
+
+        def progress(fraction, message=None):
+            # Throttled; the final state is always written below
+            if time.monotonic() - last_write[0] < PROGRESS_INTERVAL:
+                return
+            last_write[0] = time.monotonic()
+            self._update(job_id, progress=max(0.0, min(1.0, fraction)), message=(message or '')[:255] or None)
+
+        try:
+            self._update(job_id, status='running', started_at=datetime.datetime.now())
+            print(f"▶ Job {job_id} ({kind}) started")
+            result = self._handlers[kind](params, progress)
+            self._update(job_id, status='succeeded', progress=1.0, message=None, result=result,
+                         finished_at=datetime.datetime.now())
+            print(f"✓ Job {job_id} ({kind}) succeeded")
+        except Exception as e:
+            traceback.print_exc()
+            try:
+                self._update(job_id, status='failed', error=str(e) or type(e).__name__,
+                             finished_at=datetime.datetime.now())
+            except Exception as write_error:
+                print(f"✗ Could not record failure of job {job_id}: {write_error}")
+            print(f"✗ Job {job_id} ({kind}) failed: {e}")
+        finally:
+            with self._lock:
+                self._active.discard(job_id)
+
+    def get(self, job_id):
+        """The job as a dict, or None if there is no such job. A job whose worker went away is failed first."""
+        session = self.session_factory()
+        try:
+            job = session.get(Job, job_id)
+            if job is None:
+                return None
+            if not self._is_stale(job):
+                return job_to_dict(job)
+        finally:
+            session.close()
+        self.fail_interrupted(job_ids=[job_id])
+        return self.get(job_id)
+
+    def recent(self, kind=None, limit=20):
+        """Newest jobs first, optionally of one kind."""
+        for attempt in range(2):
+            session = self.session_factory()
+            try:
+                query = session.query(Job)
+                if kind:
+                    query = query.filter(Job.kind == kind)
+                jobs = query.order_by(Job.created_at.desc()).limit(limit).all()
+                stale = [job.id for job in jobs if self._is_stale(job)]
+                if not stale or attempt:
+                    return [job_to_dict(job) for job in jobs]
+            finally:
+                session.close()
+            self.fail_interrupted(job_ids=stale)
+
+    def fail_interrupted(self, stale_after=None, job_ids=None):
+        """
+        Marks unfinished jobs without a heartbeat for stale_after seconds as failed.
+
+        Args:
+            stale_after: Seconds without a heartbeat (defaults to the runner's stale_after)
+            job_ids: Only consider these jobs (default: all)
+
+        Returns:
+            The number of jobs marked
+        """
+        now = datetime.datetime.now()
+        cutoff = now - datetime.timedelta(seconds=self.stale_after if stale_after is None else stale_after)
+        with self._lock:
+            own = list(self._active)
+
+        def job(session):
+            query = session.query(Job).filter(
+                Job.status.in_(['queued', 'running']),
+                Job.updated_at < cutoff
+            )
+            if job_ids is not None:
+                query = query.filter(Job.id.in_(job_ids))
+            if own:
+                query = query.filter(Job.id.notin_(own))  # Alive, whatever the heartbeat says
+            return query.update({'status': 'failed', 'error': 'Interrupted (worker restarted)', 'finished_at': now,
+                                 'updated_at': now}, synchronize_session=False)
+
+        try:
+            marked = get_writer(self.session_factory).submit(job)
+        except Exception as e:
+            print(f"⚠ Could not check for interrupted jobs: {e}")
+            return 0
+        if marked:
+            print(f"⚠ Marked {marked} interrupted job(s) as failed")
+        return marked
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+        self._stop.set()
+        if wait and self._heartbeat is not None:
+            self._heartbeat.join(timeout=5)
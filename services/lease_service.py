@@ -0,0 +1,257 @@
+"""
+Document Lease Service
+Lets several agent processes (local pollers, Modal containers) share one inbox.
+A worker must win an atomic compare-and-set claim on a file's lease row before
+touching the file, keeps the lease alive with heartbeats while processing, and
+marks it done or released afterwards. Leases of crashed workers expire after
+`ttl_seconds`, so another worker can reclaim the file on its next cycle. A done
+or failed file that is put back into incoming (same Drive ID) is claimed afresh.
+"""
+
+import os
+import uuid
+import socket
+import datetime
+import threading
+from contextlib import contextmanager
+from sqlalchemy import or_, case
+from sqlalchemy.exc import IntegrityError
+from services.database_service import SessionLocal, DocumentLease
+
+DEFAULT_TTL_SECONDS = int(os.getenv("AGENT_LEASE_TTL_SECONDS", "30"))
+DEFAULT_MAX_ATTEMPTS = int(os.getenv("AGENT_LEASE_MAX_ATTEMPTS", "3"))
+
+
+class LeaseLost(Exception):
+    """The lease expired and another worker may now own the file; its results must not be written."""
+
+
+def default_worker_id():
+    """Unique ID for this process, e.g. host:1234:9f2c1a."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LeaseService:
+    """
+    Atomic per-file leases stored in the `document_leases` table.
+
+    Args:
+        session_factory: Session factory (defaults to SessionLocal)
+        worker_id: Identifier written as the lease owner
+        ttl_seconds: How long a lease lives without a heartbeat
+        max_attempts: Claims allowed before a repeatedly failing file is marked failed
+    """
+
+    def __init__(self, session_factory=None, worker_id=None, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.session_factory = session_factory or SessionLocal
+        self.worker_id = worker_id or default_worker_id()
+        self.ttl_seconds = ttl_seconds
+        self.max_attempts = max_attempts
+
+    def _expiry(self, now):
+        return now + datetime.timedelta(seconds=self.ttl_seconds)
+
+    def claim(self, file_id, file_name=None, seen_at=None):
+        """
+        Claims a file for this worker.
+
+        A new file is claimed by inserting its lease row (the primary key makes
+        the insert fail for everyone but one worker). An existing lease is taken
+        over with a single conditional UPDATE that only matches when it is
+        released or expired, so two workers can never both win.
+
+        Args:
+            file_id: Drive file ID
+            file_name: File name, for display
+            seen_at: When the file was listed in incoming. A done or failed lease
+                that ended before then belongs to an earlier pass of the file, which
+                has since been put back, so it is claimed again with its attempts
+                reset. A lease that ended later is a listing that was already stale.
+
+        Returns:
+            True if this worker now holds the lease
+        """
+        now = datetime.datetime.now()
+        session = self.session_factory()
+        try:
+            session.add(DocumentLease(
+                file_id=file_id,
+                file_name=file_name,
+                owner=self.worker_id,
+                status='claimed',
+                attempts=1,
+                claimed_at=now,
+                heartbeat_at=now,
+                lease_expires_at=self._expiry(now)
+            ))
+            session.commit()
+            return True
+        except IntegrityError:
+            session.rollback()
+        finally:
+            session.close()
+
+        finished = DocumentLease.status.in_(['done', 'failed'])
+        takeable = (DocumentLease.attempts < self.max_attempts) & or_(
+            DocumentLease.status == 'released',
+            (DocumentLease.status == 'claimed') & (DocumentLease.lease_expires_at < now)
+        )
+        if seen_at is not None:
+            takeable = or_(takeable, finished & (DocumentLease.lease_expires_at < seen_at))
+        session = self.session_factory()
+        try:
+            claimed = session.query(DocumentLease).filter(
+                DocumentLease.file_id == file_id,
+                takeable
+            ).update({
+                DocumentLease.owner: self.worker_id,
+                DocumentLease.status: 'claimed',
+                # A put-back file starts over; the SET sees the status before this update
+                DocumentLease.attempts: case((finished, 1), else_=DocumentLease.attempts + 1),
+                DocumentLease.claimed_at: now,
+                DocumentLease.heartbeat_at: now,
+                DocumentLease.lease_expires_at: self._expiry(now),
+                DocumentLease.completed_at: None,
+                DocumentLease.result: None,
+                DocumentLease.error: None
+            }, synchronize_session=False)
+            session.commit()
+            return claimed == 1
+        except Exception as e:
+            session.rollback()
+            print(f"⚠ Could not claim lease for {file_id}: {e}")
+            return False
+        finally:
+            session.close()
+
+    def _update_own(self, file_id, values):
+        """Updates a lease only while this worker still owns it. Returns True if it did."""
+        session = self.session_factory()
+        try:
+            updated = session.query(DocumentLease).filter(
+                DocumentLease.file_id == file_id,
+                DocumentLease.owner == self.worker_id,
+                DocumentLease.status == 'claimed'
+            ).update(values, synchronize_session=False)
+            session.commit()
+            return updated == 1
+        except Exception as e:
+            session.rollback()
+            print(f"⚠ Could not update lease for {file_id}: {e}")
+            return False
+        finally:
+            session.close()
+
+    def heartbeat(self, file_id):
+        """Extends this worker's lease. Returns False if the lease was lost."""
+        now = datetime.datetime.now()
+        return self._update_own(file_id, {
+            DocumentLease.heartbeat_at: now,
+            DocumentLease.lease_expires_at: self._expiry(now)
+        })
+
+    def complete(self, file_id, result=None):
+        """
+        Marks the file as processed (with an optional result summary). A done lease
+        is only claimed again if the file reappears in incoming (see `claim`).
+        """
+        now = datetime.datetime.now()
+        return self._update_own(file_id, {
+            DocumentLease.status: 'done',
+            DocumentLease.completed_at: now,
+            DocumentLease.lease_expires_at: now,
+            DocumentLease.result: result
+        })
+
+    def release(self, file_id, error=None, result=None):
+        """
+        Gives up the lease after a failure so another worker can retry. Once
+        `max_attempts` is reached the lease is marked failed instead.
+
+        Returns:
+            The new status ('released' or 'failed'), or None if the lease was lost
+        """
+        session = self.session_factory()
+        try:
+            lease = session.query(DocumentLease).filter(
+                DocumentLease.file_id == file_id,
+                DocumentLease.owner == self.worker_id
+            ).first()
+            attempts = lease.attempts if lease else 0
+        finally:
+            session.close()
+
+        status = 'failed' if attempts >= self.max_attempts else 'released'
+        updated = self._update_own(file_id, {
+            DocumentLease.status: status,
+            DocumentLease.lease_expires_at: datetime.datetime.now(),
+            DocumentLease.error: str(error)[:1000] if error else None,
+            DocumentLease.result: result
+        })
+        return status if updated else None
+
+    def fail_exhausted(self, file_id):
+        """
+        Marks an expired lease that has used up its attempts as failed (e.g. a file
+        that keeps crashing its worker). Only one caller can win this update.
+
+        Returns:
+            True if this call marked the lease failed
+        """
+        session = self.session_factory()
+        try:
+            updated = session.query(DocumentLease).filter(
+                DocumentLease.file_id == file_id,
+                DocumentLease.status == 'claimed',
+                DocumentLease.attempts >= self.max_attempts,
+                DocumentLease.lease_expires_at < datetime.datetime.now()
+            ).update({
+                DocumentLease.status: 'failed',
+                DocumentLease.error: 'Lease expired on the final attempt'
+            }, synchronize_session=False)
+            session.commit()
+            return updated == 1
+        except Exception as e:
+            session.rollback()
+            print(f"⚠ Could not update lease for {file_id}: {e}")
+            return False
+        finally:
+            session.close()
+
+    def get(self, file_id):
+        """Returns the lease row for a file, or None."""
+        session = self.session_factory()
+        try:
+            return session.query(DocumentLease).filter(DocumentLease.file_id == file_id).first()
+        finally:
+            session.close()
+
+    @contextmanager
+    def keep_alive(self, file_ids, interval=None):
+        """
+        Heartbeats one lease (or a list of leases) from a background thread while the block runs.
+
+        Yields:
+            threading.Event that is set if a lease was lost to another worker
+        """
+        file_ids = [file_ids] if isinstance(file_ids, str) else list(file_ids)
+        interval = interval or max(1.0, self.ttl_seconds / 3.0)
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def beat():
+            while not stop.wait(interval):
+                for file_id in list(file_ids):
+                    if not self.heartbeat(file_id):
+                        print(f"⚠ Lease on {file_id} was lost by {self.worker_id}")
+                        file_ids.remove(file_id)
+                        lost.set()
+
+        thread = threading.Thread(target=beat, daemon=True, name=f"lease-{file_ids[0] if file_ids else 'none'}")
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stop.set()
+            thread.join()
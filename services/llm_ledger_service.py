@@ -0,0 +1,371 @@
+"""
+LLM Call Telemetry Ledger
+Every OpenAI chat completion made by the services goes through `tracked_completion`
+(or `tracked_stream` for streamed replies), which records model, token usage, latency, retries, prompt-cache hits and an
+estimated cost against the document/applicant it served.
+"""
+
+import math
+import time
+import datetime
+import email.utils
+import openai
+from sqlalchemy import func
+from services.database_service import SessionLocal, LLMCall, VisaApplication
+from services.write_queue import get_writer
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICING = {
+    'gpt-4o': (2.50, 1.25, 10.00),
+    'gpt-4o-mini': (0.15, 0.075, 0.60),
+}
+
+MAX_RETRY_AFTER_SECONDS = 60  # Longest Retry-After honoured; a longer wait is capped to this
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError,
+)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens=0):
+    """Estimates the USD cost of a call. Unknown models are costed as None."""
+    pricing = MODEL_PRICING.get(model)
+    if not pricing:
+        # Dated snapshots (e.g. gpt-4o-2024-08-06) share the base model's price
+        pricing = next((p for name, p in sorted(MODEL_PRICING.items(), key=lambda i: -len(i[0]))
+                        if model and model.startswith(name)), None)
+    if not pricing:
+        return None
+    input_price, cached_price, output_price = pricing
+    uncached = max((prompt_tokens or 0) - (cached_tokens or 0), 0)
+    cost = (uncached * input_price + (cached_tokens or 0) * cached_price + (completion_tokens or 0) * output_price)
+    return round(cost / 1_000_000, 6)
+
+
+def retry_after_seconds(error):
+    """
+    Seconds the API asked to wait before retrying (retry-after-ms or Retry-After,
+    in seconds or as an HTTP date), capped at MAX_RETRY_AFTER_SECONDS; None if it did not say.
+    """
+    response = getattr(error, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if not headers:
+        return None
+    seconds = None
+    try:
+        if headers.get('retry-after-ms'):
+            seconds = float(headers['retry-after-ms']) / 1000
+        elif headers.get('retry-after'):
+            value = headers['retry-after']
+            try:
+                seconds = float(value)
+            except ValueError:
+                when = email.utils.parsedate_to_datetime(value)
+                seconds = (when - datetime.datetime.now(when.tzinfo)).total_seconds()
+    except (TypeError, ValueError):
+        return None
+    if seconds is None or math.isnan(seconds):
+        return None
+    return min(max(seconds, 0.0), MAX_RETRY_AFTER_SECONDS)
+
+
+def _usage_counts(usage):
+    """Extracts (prompt, completion, cached) token counts from an API usage object."""
+    if usage is None:
+        return 0, 0, 0
+    details = getattr(usage, 'prompt_tokens_details', None)
+    cached = getattr(details, 'cached_tokens', 0) if details else 0
+    return (getattr(usage, 'prompt_tokens', 0) or 0,
+            getattr(usage, 'completion_tokens', 0) or 0,
+            cached or 0)
+
+
+def _document_context():
+    """Document attributes of the pipeline span currently being processed, if any."""
+    from core.tracing import tracer
+    attributes = tracer.current().attributes
+    return attributes.get('file_id'), attributes.get('applicant_id')
+
+
+class LLMLedgerService:
+    """Writes one ledger row per LLM call and answers aggregate usage questions."""
+
+    def __init__(self, session_factory=None, max_retries=2, backoff_seconds=1.0):
+        self.session_factory = session_factory or SessionLocal
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
+    def _retry_delay(self, error, retries):
+        # The SDK's own retries (which honour Retry-After) are off, so honour it here
+        delay = retry_after_seconds(error)
+        return delay if delay is not None else self.backoff_seconds * (2 ** (retries - 1))
+
+    def tracked_completion(self, client, purpose, document_id=None, applicant_id=None, document_type=None, **kwargs):
+        """
+        Calls `client.chat.completions.create(**kwargs)` with retries and records the call.
+
+        Args:
+            client: OpenAI client
+            purpose: What the call is for (classify, analyze, ocr, chat, ...)
+            document_id: Document served; defaults to the active pipeline span's file
+            applicant_id: Applicant served; defaults to the active pipeline span's applicant
+            document_type: Document type, when known before the call
+
+        Returns:
+            The API response. Errors are recorded and re-raised after the last retry.
+        """
+        if document_id is None and applicant_id is None:
+            document_id, applicant_id = _document_context()
+
+        # Retries are done here rather than inside the SDK so they can be counted
+        create = client.with_options(max_retries=0).chat.completions.create
+        model = kwargs.get('model')
+        retries = 0
+        start = time.perf_counter()
+        while True:
+            try:
+                response = create(**kwargs)
+                break
+            except RETRYABLE_ERRORS as e:
+                if retries >= self.max_retries:
+                    self._record_failure(purpose, model, start, retries, e, document_id, applicant_id, document_type)
+                    raise
+                retries += 1
+                time.sleep(self._retry_delay(e, retries))
+            except Exception as e:
+                self._record_failure(purpose, model, start, retries, e, document_id, applicant_id, document_type)
+                raise
+
+        prompt_tokens, completion_tokens, cached_tokens = _usage_counts(getattr(response, 'usage', None))
+        self.record(
+            purpose=purpose,
+            model=getattr(response, 'model', None) or model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+            latency_ms=(time.perf_counter() - start) * 1000,
+            retries=retries,
+            document_id=document_id,
+            applicant_id=applicant_id,
+            document_type=document_type
+        )
+        return response
+
+    def tracked_stream(self, client, purpose, document_id=None, applicant_id=None, document_type=None, **kwargs):
+        """
+        Streaming `tracked_completion`: yields the text of each content delta as it
+        arrives, and records the call when the stream ends, with the token usage the
+        API sends in the last chunk (stream_options include_usage).
+
+        Only opening the stream is retried. An error mid-stream, or the caller
+        closing the generator early (e.g. the client disconnected), is recorded as
+        a failed call.
+
+        Yields:
+            Text fragments of the completion
+        """
+        if document_id is None and applicant_id is None:
+            document_id, applicant_id = _document_context()
+
+        create = client.with_options(max_retries=0).chat.completions.create
+        kwargs = dict(kwargs, stream=True, stream_options={'include_usage': True})
+        model = kwargs.get('model')
+        retries = 0
+        start = time.perf_counter()
+        while True:
+            try:
+                stream = create(**kwargs)
+                break
+            except RETRYABLE_ERRORS as e:
+                if retries >= self.max_retries:
+                    self._record_failure(purpose, model, start, retries, e, document_id, applicant_id, document_type)
+                    raise
+                retries += 1
+                time.sleep(self._retry_delay(e, retries))
+            except Exception as e:
+                self._record_failure(purpose, model, start, retries, e, document_id, applicant_id, document_type)
+                raise
+
+        usage, response_model = None, model
+        try:
+            for chunk in stream:
+                usage = getattr(chunk, 'usage', None) or usage
+                response_model = getattr(chunk, 'model', None) or response_model
+                for choice in chunk.choices or []:
+                    text = getattr(choice.delta, 'content', None) if choice.delta else None
+                    if text:
+                        yield text
+        except GeneratorExit:
+            close = getattr(stream, 'close', None)
+            if close:
+                close()
+            self._record_failure(purpose, model, start, retries, "Stream closed by the caller",
+                                 document_id, applicant_id, document_type)
+            raise
+        except Exception as e:
+            self._record_failure(purpose, model, start, retries, e, document_id, applicant_id, document_type)
+            raise
+
+        prompt_tokens, completion_tokens, cached_tokens = _usage_counts(usage)
+        self.record(
+            purpose=purpose,
+            model=response_model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+            latency_ms=(time.perf_counter() - start) * 1000,
+            retries=retries,
+            document_id=document_id,
+            applicant_id=applicant_id,
+            document_type=document_type
+        )
+
+    def _record_failure(self, purpose, model, start, retries, error, document_id, applicant_id, document_type):
+        self.record(
+            purpose=purpose,
+            model=model,
+            latency_ms=(time.perf_counter() - start) * 1000,
+            retries=retries,
+            success=False,
+            error=str(error)[:1000],
+            document_id=document_id,
+            applicant_id=applicant_id,
+            document_type=document_type
+        )
+
+    def record(self, purpose, model, prompt_tokens=0, completion_tokens=0, cached_tokens=0, latency_ms=None,
+               retries=0, success=True, error=None, document_id=None, applicant_id=None, document_type=None):
+        """Writes a ledger row. Ledger failures never interrupt the caller."""
+        entry = LLMCall(
+            purpose=purpose,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+            latency_ms=latency_ms,
+            retries=retries,
+            cache_hit=cached_tokens > 0,
+            cost_usd=estimate_cost(model, prompt_tokens, completion_tokens, cached_tokens),
+            success=success,
+            error=error,
+            document_id=document_id,
+            applicant_id=str(applicant_id) if applicant_id is not None else None,
+            document_type=document_type
+        )
+        try:
+            get_writer(self.session_factory).submit(lambda session: session.add(entry))
+        except Exception as e:
+            print(f"Warning: Could not record LLM call: {e}")
+
+    def tokens_by_document_type(self, since=None):
+        """
+        Token usage grouped by document type. Calls made before a document was
+        classified are attributed through the document's stored type.
+
+        Returns:
+            Dict mapping document type -> {calls, documents, prompt_tokens, completion_tokens, tokens_per_document}
+        """
+        session = self.session_factory()
+        try:
+            document_type = func.coalesce(VisaApplication.document_type, LLMCall.document_type, 'Unknown')
+            query = session.query(
+                document_type,
+                func.count(LLMCall.id),
+                func.count(func.distinct(LLMCall.document_id)),
+                func.sum(LLMCall.prompt_tokens),
+                func.sum(LLMCall.completion_tokens)
+            ).outerjoin(VisaApplication, VisaApplication.document_id == LLMCall.document_id)
+            if since:
+                query = query.filter(LLMCall.created_at >= since)
+
+            result = {}
+            for doc_type, calls, documents, prompt_tokens, completion_tokens in query.group_by(document_type):
+                total = (prompt_tokens or 0) + (completion_tokens or 0)
+                result[doc_type] = {
+                    'calls': calls,
+                    'documents': documents,
+                    'prompt_tokens': prompt_tokens or 0,
+                    'completion_tokens': completion_tokens or 0,
+                    'tokens_per_document': round(total / documents, 1) if documents else total
+                }
+            return result
+        finally:
+            session.close()
+
+    def cost_by_applicant(self, since=None):
+        """
+        Estimated spend grouped by applicant.
+
+        Returns:
+            Dict mapping applicant id -> {calls, cost_usd}
+        """
+        session = self.session_factory()
+        try:
+            applicant = func.coalesce(LLMCall.applicant_id, VisaApplication.applicant_id, 'unassigned')
+            query = session.query(
+                applicant,
+                func.count(LLMCall.id),
+                func.sum(LLMCall.cost_usd)
+            ).outerjoin(VisaApplication, VisaApplication.document_id == LLMCall.document_id)
+            if since:
+                query = query.filter(LLMCall.created_at >= since)
+
+            return {
+                applicant_id: {'calls': calls, 'cost_usd': round(cost or 0, 6)}
+                for applicant_id, calls, cost in query.group_by(applicant)
+            }
+        finally:
+            session.close()
+
+    def latency_p95_by_model(self, since=None):
+        """
+        95th percentile latency per model.
+
+        Returns:
+            Dict mapping model -> {calls, p95_ms, retries, cache_hits}
+        """
+        session = self.session_factory()
+        try:
+            query = session.query(LLMCall.model, LLMCall.latency_ms, LLMCall.retries, LLMCall.cache_hit)
+            if since:
+                query = query.filter(LLMCall.created_at >= since)
+
+            rows = {}
+            for model, latency_ms, retries, cache_hit in query.order_by(LLMCall.model, LLMCall.latency_ms):
+                entry = rows.setdefault(model, {'latencies': [], 'retries': 0, 'cache_hits': 0})
+                entry['latencies'].append(latency_ms or 0)
+                entry['retries'] += retries or 0
+                entry['cache_hits'] += 1 if cache_hit else 0
+
+            result = {}
+            for model, entry in rows.items():
+                latencies = entry['latencies']
+                rank = max(1, math.ceil(0.95 * len(latencies)))
+                result[model] = {
+                    'calls': len(latencies),
+                    'p95_ms': round(latencies[rank - 1], 2),
+                    'retries': entry['retries'],
+                    'cache_hits': entry['cache_hits']
+                }
+            return result
+        finally:
+            session.close()
+
+
+# Process-wide ledger shared by all OpenAI call sites
+ledger = LLMLedgerService()
+
+
+if __name__ == "__main__":
+    import json
+
+    since = datetime.datetime.now() - datetime.timedelta(days=30)
+    print("Tokens by document type (30 days):")
+    print(json.dumps(ledger.tokens_by_document_type(since), indent=2))
+    print("\nCost by applicant (30 days):")
+    print(json.dumps(ledger.cost_by_applicant(since), indent=2))
+    print("\np95 latency by model (30 days):")
+    print(json.dumps(ledger.latency_p95_by_model(since), indent=2))
@@ -0,0 +1,207 @@
+"""
+Metrics Service
+Counters, gauges and histograms for the agent, scheduler and web dashboard.
+Each process buffers increments in memory and periodically flushes them to the
+shared `metric_series` table, so `/metrics` in the web process can expose the
+whole system in Prometheus text format (and JSON).
+"""
+
+import time
+import datetime
+import threading
+from sqlalchemy.exc import IntegrityError
+from services.database_service import SessionLocal, MetricSeries, PipelineSpan
+from services.write_queue import get_writer
+
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)  # Seconds
+
+# Document span outcomes that count towards the error rate
+ERROR_OUTCOMES = ('error', 'classify_failed', 'analyze_failed')
+
+
+def format_labels(labels):
+    """Canonical Prometheus label string: sorted keys, escaped values."""
+    parts = []
+    for key in sorted(labels):
+        value = str(labels[key]).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{key}="{value}"')
+    return ','.join(parts)
+
+
+def parse_labels(label_string):
+    """Inverse of `format_labels` for the simple values this service writes."""
+    labels = {}
+    for part in filter(None, label_string.split('",')):
+        key, _, value = part.partition('="')
+        labels[key] = value.rstrip('"').replace('\\"', '"').replace('\\\\', '\\')
+    return labels
+
+
+class MetricsService:
+    """In-process metric buffer with write-through to the database on `flush()`."""
+
+    def __init__(self, session_factory=None, buckets=DEFAULT_BUCKETS):
+        self.session_factory = session_factory or SessionLocal
+        self.buckets = tuple(sorted(buckets))
+        self._counters = {}  # (family, kind, name, labels) -> delta
+        self._gauges = {}  # (family, name, labels) -> value
+        self._lock = threading.Lock()
+        self._flush_thread = None
+
+    def inc(self, name, value=1, **labels):
+        """Increments a counter."""
+        self._add(name, 'counter', name, format_labels(labels), value)
+
+    def set_gauge(self, name, value, **labels):
+        """Sets a gauge to an absolute value."""
+        with self._lock:
+            self._gauges[(name, name, format_labels(labels))] = value
+
+    def observe(self, name, value, **labels):
+        """Records a histogram observation (cumulative buckets, sum and count)."""
+        for bound in self.buckets:
+            if value <= bound:
+                self._add(name, 'histogram', f"{name}_bucket", format_labels({**labels, 'le': bound}), 1)
+        self._add(name, 'histogram', f"{name}_bucket", format_labels({**labels, 'le': '+Inf'}), 1)
+        self._add(name, 'histogram', f"{name}_sum", format_labels(labels), value)
+        self._add(name, 'histogram', f"{name}_count", format_labels(labels), 1)
+
+    def _add(self, family, kind, name, labels, value):
+        key = (family, kind, name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def flush(self):
+        """
+        Writes buffered deltas to the database. Counters are applied with
+        `value = value + delta` so several processes can flush concurrently.
+
+        Returns:
+            Number of series written
+        """
+        with self._lock:
+            counters, self._counters = self._counters, {}
+            gauges, self._gauges = self._gauges, {}
+        if not counters and not gauges:
+            return 0
+
+        def apply(session):
+            now = datetime.datetime.now()
+            for (family, kind, name, labels), delta in counters.items():
+                updated = session.query(MetricSeries).filter(
+                    MetricSeries.name == name,
+                    MetricSeries.labels == labels
+                ).update({MetricSeries.value: MetricSeries.value + delta, MetricSeries.updated_at: now},
+                         synchronize_session=False)
+                if not updated:
+                    session.add(MetricSeries(family=family, kind=kind, name=name, labels=labels, value=delta, updated_at=now))
+                    session.flush()
+
+            for (family, name, labels), value in gauges.items():
+                updated = session.query(MetricSeries).filter(
+                    MetricSeries.name == name,
+                    MetricSeries.labels == labels
+                ).update({MetricSeries.value: value, MetricSeries.updated_at: now}, synchronize_session=False)
+                if not updated:
+                    session.add(MetricSeries(family=family, kind='gauge', name=name, labels=labels, value=value, updated_at=now))
+                    session.flush()
+
+        for attempt in range(2):
+            try:
+                get_writer(self.session_factory).submit(apply)
+                return len(counters) + len(gauges)
+            except IntegrityError:
+                # Another process created the same series first; retry as updates
+                continue
+            except Exception as e:
+                print(f"Warning: Could not flush metrics: {e}")
+                break
+
+        # Keep the deltas for the next flush rather than losing them
+        with self._lock:
+            for key, delta in counters.items():
+                self._counters[key] = self._counters.get(key, 0) + delta
+            for key, value in gauges.items():
+                self._gauges.setdefault(key, value)
+        return 0
+
+    def start_background_flush(self, interval=10):
+        """Starts a daemon thread that flushes every `interval` seconds (idempotent)."""
+        with self._lock:
+            if self._flush_thread and self._flush_thread.is_alive():
+                return
+            self._flush_thread = threading.Thread(target=self._flush_loop, args=(interval,), daemon=True,
+                                                  name="metrics-flush")
+            self._flush_thread.start()
+
+    def _flush_loop(self, interval):
+        while True:
+            time.sleep(interval)
+            self.flush()
+
+    def collect(self):
+        """Returns all stored series ordered by family and sample name."""
+        session = self.session_factory()
+        try:
+            return session.query(MetricSeries).order_by(MetricSeries.family, MetricSeries.name, MetricSeries.labels).all()
+        finally:
+            session.close()
+
+    def render_prometheus(self, series=None):
+        """Renders series in the Prometheus text exposition format."""
+        series = self.collect() if series is None else series
+        lines = []
+        current_family = None
+        for row in series:
+            if row.family != current_family:
+                current_family = row.family
+                lines.append(f"# TYPE {row.family} {row.kind}")
+            labels = f"{{{row.labels}}}" if row.labels else ""
+            lines.append(f"{row.name}{labels} {row.value:g}")
+        return "\n".join(lines) + "\n"
+
+    def throughput(self, window_minutes=5):
+        """
+        Pipeline throughput derived from recorded spans.
+
+        Returns:
+            Dict with documents_per_minute, error_rate and documents in the window
+        """
+        session = self.session_factory()
+        try:
+            since = datetime.datetime.now() - datetime.timedelta(minutes=window_minutes)
+            outcomes = session.query(PipelineSpan.outcome).filter(
+                PipelineSpan.stage == 'document',
+                PipelineSpan.started_at >= since
+            ).all()
+            documents = len(outcomes)
+            errors = sum(1 for (outcome,) in outcomes if outcome in ERROR_OUTCOMES)
+            return {
+                'window_minutes': window_minutes,
+                'documents': documents,
+                'documents_per_minute': round(documents / float(window_minutes), 2),
+                'error_rate': round(errors / float(documents), 4) if documents else 0.0
+            }
+        finally:
+            session.close()
+
+    def to_json(self, window_minutes=5):
+        """JSON-friendly view of all series plus derived throughput figures."""
+        series = []
+        for row in self.collect():
+            series.append({
+                'name': row.name,
+                'family': row.family,
+                'kind': row.kind,
+                'labels': parse_labels(row.labels or ''),
+                'value': row.value,
+                'updated_at': row.updated_at.strftime("%Y-%m-%d %H:%M:%S") if row.updated_at else None
+            })
+        return {
+            'series': series,
+            'throughput': self.throughput(window_minutes)
+        }
+
+
+# Process-wide metrics registry
+metrics = MetricsService()
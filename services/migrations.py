@@ -0,0 +1,347 @@
+"""
+Schema Migrations
+Versioned, idempotent schema changes for databases created by older releases
+(`Base.metadata.create_all` creates missing tables but never alters existing
+ones). Applied versions are recorded in `schema_migrations`, so each migration
+runs once per database; `init_db()` and `migrate_database.py` both call
+`run_migrations`.
+
+Index migrations run online: on Postgres with CREATE INDEX CONCURRENTLY, on
+SQLite in WAL mode where readers keep going while the index is built.
+"""
+
+import time
+import json
+from sqlalchemy import inspect, text, func, select, or_, MetaData, Table
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateIndex
+from services.database_service import (
+    engine as default_engine, Base, SchemaMigration, ArchivedVisaApplication, DocumentAnalysis,
+    ANALYSIS_FIELDS, analysis_columns, encode_analysis, ExtractedDate, ExtractedName, ExtractedReference,
+    StatCounter
+)
+from services.extracted_data_service import backfill
+from services.stats_counters import reconcile
+
+
+def add_missing_columns(engine, table, columns):
+    """
+    Adds columns that an existing table lacks. Columns the model no longer maps
+    (moved elsewhere by a later migration) are skipped.
+
+    Args:
+        engine: Engine to migrate
+        table: Table name
+        columns: List of (name, DDL type, default SQL or None)
+
+    Returns:
+        Names of the columns added
+    """
+    inspector = inspect(engine)
+    if not inspector.has_table(table):
+        return []  # create_all builds it with every column
+    existing = {column['name'] for column in inspector.get_columns(table)}
+    mapped = Base.metadata.tables[table].c if table in Base.metadata.tables else None
+    added = []
+    with engine.begin() as conn:
+        for name, ddl_type, default in columns:
+            if name in existing or (mapped is not None and name not in mapped):
+                continue
+            default_sql = f" DEFAULT {default}" if default is not None else ""
+            conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}{default_sql}"))
+            added.append(name)
+    return added
+
+
+def create_indexes(engine, index_names):
+    """
+    Creates model indexes (by name) that do not exist yet, without blocking readers.
+
+    Returns:
+        Names of the indexes created
+    """
+    indexes = {index.name: index for table in Base.metadata.sorted_tables for index in table.indexes}
+    inspector = inspect(engine)
+    created = []
+    for name in index_names:
+        index = indexes.get(name)
+        if index is None:
+            continue  # Replaced by a later migration
+        if not inspector.has_table(index.table.name):
+            continue
+        if name in {existing['name'] for existing in inspector.get_indexes(index.table.name)}:
+            continue
+        statement = str(CreateIndex(index, if_not_exists=True).compile(dialect=engine.dialect))
+        if engine.dialect.name == 'postgresql':
+            # CONCURRENTLY avoids locking writes but cannot run inside a transaction
+            statement = statement.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1)
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                conn.execute(text(statement))
+        else:
+            with engine.begin() as conn:
+                conn.execute(text(statement))
+        created.append(name)
+    return created
+
+
+def migrate_trust_columns(engine):
+    """Confidence, verification and versioning columns (previously migrate_database.py)."""
+    added = add_missing_columns(engine, 'visa_applications', [
+        ("confidence_score", "INTEGER", None),
+        ("field_confidence", "JSON", None),
+        ("ocr_metadata", "JSON", None),
+        ("verification_status", "VARCHAR(50)", "'pending'"),
+        ("verified_by", "VARCHAR(255)", None),
+        ("verified_at", "TIMESTAMP", None),
+        ("verification_notes", "TEXT", None),
+        ("version", "INTEGER", "1"),
+        ("previous_version_id", "INTEGER", None)
+    ])
+    added += add_missing_columns(engine, 'document_leases', [("result", "JSON", None)])
+    if inspect(engine).has_table('visa_applications'):
+        with engine.begin() as conn:
+            conn.execute(text(
+                "UPDATE visa_applications SET verification_status = 'pending', version = COALESCE(version, 1), "
+                "confidence_score = COALESCE(confidence_score, 75) WHERE verification_status IS NULL"
+            ))
+    return added
+
+
+def migrate_hot_indexes(engine):
+    """Indexes for the agent's per-document lookups, dashboard sorts and notification scans."""
+    return create_indexes(engine, [
+        'ix_visa_applications_file_name',
+        'ix_visa_applications_updated_at',
+        'ix_visa_applications_status_updated_at',
+        'ix_visa_applications_applicant_id_upload_date',
+        'ix_visa_applications_expiry_date',
+        'ix_visa_applications_confidence_score',
+        'ix_visa_applications_verification_status_confidence',
+        'ix_notifications_document_type_sent_at',
+        'ix_notifications_applicant_sent_at',
+        'ix_notifications_sent_at',
+        'ix_applicants_full_name',
+    ])
+
+
+def migrate_unique_file_name(engine):
+    """
+    Makes visa_applications.file_name unique, the key the agent upserts on.
+    Older rows of a duplicated file name move to the archive first.
+    """
+    # Reflect the table as it is on disk; the model may have columns a later migration adds
+    applications = Table('visa_applications', MetaData(), autoload_with=engine)
+    archive = ArchivedVisaApplication.__table__
+    c = applications.c
+    duplicated = select(c.file_name).group_by(c.file_name).having(func.count(c.id) > 1)
+    newest = select(func.max(c.id)).group_by(c.file_name).having(func.count(c.id) > 1)
+    with engine.begin() as conn:
+        rows = conn.execute(select(applications).where(c.file_name.in_(duplicated), c.id.not_in(newest))).mappings().all()
+        ids = [row['id'] for row in rows]
+        if ids:
+            conn.execute(archive.insert(), [{
+                'source_id': row['id'],
+                'document_id': row['document_id'],
+                'applicant_id': row['applicant_id'],
+                'file_name': row['file_name'],
+                'document_type': row.get('document_type'),
+                'status': row.get('status'),
+                'upload_date': row.get('upload_date'),
+                'expiry_date': row.get('expiry_date'),
+                'updated_at': row.get('updated_at'),
+                'record': {k: v.isoformat() if hasattr(v, 'isoformat') else v for k, v in row.items()},
+                'archive_reason': 'duplicate'
+            } for row in rows])
+            if 'previous_version_id' in c:
+                conn.execute(applications.update().where(c.previous_version_id.in_(ids)).values(previous_version_id=None))
+            conn.execute(applications.delete().where(c.id.in_(ids)))
+        conn.execute(text("DROP INDEX IF EXISTS ix_visa_applications_file_name"))
+    created = create_indexes(engine, ['uq_visa_applications_file_name'])
+    return ([f"{len(ids)} duplicate(s) archived"] if ids else []) + created
+
+
+def migrate_analysis_side_table(engine, batch_size=500):
+    """
+    Moves ai_analysis, field_confidence and ocr_metadata off visa_applications into
+    document_analyses (compressed), fills the promoted summary columns, then drops
+    the old JSON columns so list queries stop reading them.
+    """
+    changes = add_missing_columns(engine, 'visa_applications', [
+        ("summary", "TEXT", None),
+        ("missing_elements_count", "INTEGER", None),
+        ("compliance_status", "VARCHAR(20)", None)
+    ])
+    if not inspect(engine).has_table('visa_applications'):
+        return changes
+    DocumentAnalysis.__table__.create(bind=engine, checkfirst=True)
+    applications = Table('visa_applications', MetaData(), autoload_with=engine)
+    legacy = [field for field in ANALYSIS_FIELDS if field in applications.c]
+    if not legacy:
+        return changes
+    analyses = DocumentAnalysis.__table__
+    c = applications.c
+
+    def decoded(value):
+        # Reflected JSON columns on older SQLite files can come back as text
+        return json.loads(value) if isinstance(value, str) else value
+
+    moved, last_id = 0, 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(c.id, *[c[field] for field in legacy])
+                .where(c.id > last_id, or_(*[c[field].is_not(None) for field in legacy]))
+                .order_by(c.id).limit(batch_size)
+            ).mappings().all()
+            if not rows:
+                break
+            last_id = rows[-1]['id']
+            ids = [row['id'] for row in rows]
+            done = set(conn.execute(select(analyses.c.application_id).where(analyses.c.application_id.in_(ids))).scalars())
+            for row in rows:
+                payload = {field: decoded(row[field]) for field in legacy}
+                conn.execute(applications.update().where(c.id == row['id']).values(
+                    **analysis_columns(payload.get('ai_analysis'))))
+                if row['id'] in done:
+                    continue
+                encoding, data, raw_size = encode_analysis(payload)
+                conn.execute(analyses.insert().values(
+                    application_id=row['id'], encoding=encoding, payload=data, raw_size=raw_size))
+            moved += len(rows)
+
+    with engine.begin() as conn:
+        for field in legacy:
+            conn.execute(text(f"ALTER TABLE visa_applications DROP COLUMN {field}"))
+    return changes + [f"{moved} analysis payload(s) moved"] + [f"dropped {field}" for field in legacy]
+
+
+def migrate_extracted_data(engine):
+    """Extracted dates, names and references tables, backfilled from the stored analyses."""
+    for model in (ExtractedDate, ExtractedName, ExtractedReference):
+        model.__table__.create(bind=engine, checkfirst=True)
+    return [f"{backfill(sessionmaker(bind=engine))} document(s) backfilled"]
+
+
+def migrate_stat_counters(engine):
+    """Materialised stats counters, counted from the existing rows."""
+    StatCounter.__table__.create(bind=engine, checkfirst=True)
+    return [f"{len(reconcile(sessionmaker(bind=engine)))} counter(s) initialised"]
+
+
+# (version, description, function) in the order they must be applied; never renumber
+MIGRATIONS = [
+    (1, "Confidence, verification and version columns", migrate_trust_columns),
+    (2, "Indexes for hot filter and sort columns", migrate_hot_indexes),
+    (3, "Unique file_name for document upserts", migrate_unique_file_name),
+    (4, "Analysis payloads in document_analyses, summary columns promoted", migrate_analysis_side_table),
+    (5, "Extracted dates, names and references tables", migrate_extracted_data),
+    (6, "Materialised stats counters", migrate_stat_counters),
+]
+
+
+def applied_versions(engine=None):
+    """Returns the set of migration versions recorded in the database."""
+    engine = engine or default_engine
+    SchemaMigration.__table__.create(bind=engine, checkfirst=True)
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+
+def run_migrations(engine=None, target=None):
+    """
+    Applies pending migrations in version order.
+
+    Args:
+        engine: Engine to migrate (defaults to the configured database)
+        target: Highest version to apply (defaults to all)
+
+    Returns:
+        List of versions applied by this call
+    """
+    engine = engine or default_engine
+    done = applied_versions(engine)
+    applied = []
+    for version, description, migrate in MIGRATIONS:
+        if version in done or (target is not None and version > target):
+            continue
+        print(f"▶ Migration {version}: {description}")
+        start = time.perf_counter()
+        changes = migrate(engine)
+        duration_ms = round((time.perf_counter() - start) * 1000, 1)
+        try:
+            with engine.begin() as conn:
+                conn.execute(SchemaMigration.__table__.insert().values(
+                    version=version, description=description, duration_ms=duration_ms))
+        except IntegrityError:
+            # Another process applied it at the same time; the steps are idempotent
+            pass
+        print(f"✓ Migration {version} applied in {duration_ms}ms" + (f": {', '.join(changes)}" if changes else ""))
+        applied.append(version)
+    return applied
+
+
+# Hot queries and the index each one must use (checked with EXPLAIN QUERY PLAN on SQLite)
+HOT_QUERIES = {
+    'document_by_file_name': (
+        "SELECT id FROM visa_applications WHERE file_name = 'passport.pdf' LIMIT 1",
+        'uq_visa_applications_file_name'),
+    'recent_documents': (
+        "SELECT id FROM visa_applications ORDER BY updated_at DESC LIMIT 10",
+        'ix_visa_applications_updated_at'),
+    'documents_by_status': (
+        "SELECT count(*) FROM visa_applications WHERE status = 'Needs Review'",
+        'ix_visa_applications_status_updated_at'),
+    'applicant_documents': (
+        "SELECT id FROM visa_applications WHERE applicant_id = '1' ORDER BY upload_date DESC",
+        'ix_visa_applications_applicant_id_upload_date'),
+    'expiring_documents': (
+        "SELECT id FROM visa_applications WHERE expiry_date IS NOT NULL AND expiry_date > '2026-01-01'",
+        'ix_visa_applications_expiry_date'),
+    'low_confidence_pending': (
+        "SELECT id FROM visa_applications WHERE verification_status = 'pending' AND confidence_score < 70",
+        'ix_visa_applications_verification_status_confidence'),
+    'notification_exists': (
+        "SELECT id FROM notifications WHERE document_id = 'doc-1' AND notification_type = 'expiry_30d' LIMIT 1",
+        'ix_notifications_document_type_sent_at'),
+    'applicant_notifications': (
+        "SELECT id FROM notifications WHERE applicant_id = '1' ORDER BY sent_at DESC",
+        'ix_notifications_applicant_sent_at'),
+    'applicant_by_name': (
+        "SELECT id FROM applicants WHERE full_name = 'Alex Smith' LIMIT 1",
+        'ix_applicants_full_name'),
+    'dates_by_type': (
+        "SELECT application_id FROM extracted_dates WHERE date_type = 'expiry_date' "
+        "AND value >= '2026-01-01' AND value < '2026-02-01'",
+        'ix_extracted_dates_type_value'),
+    'documents_by_reference': (
+        "SELECT application_id FROM extracted_references WHERE normalized_reference = 'PA1234567'",
+        'ix_extracted_references_normalized'),
+    'recent_ai_alert': (
+        "SELECT id FROM notifications WHERE document_id = 'doc-1' AND notification_type >= 'ai_alert_' "
+        "AND notification_type < 'ai_alert`' AND sent_at >= '2026-01-01'",
+        'ix_notifications_document_type_sent_at'),
+}
+
+
+def check_query_plans(engine=None):
+    """
+    Runs EXPLAIN QUERY PLAN for each hot query (SQLite).
+
+    Returns:
+        Dict mapping query name -> (uses expected index, plan text)
+    """
+    engine = engine or default_engine
+    results = {}
+    with engine.connect() as conn:
+        for name, (sql, index_name) in HOT_QUERIES.items():
+            plan = " | ".join(row[-1] for row in conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+            results[name] = (index_name in plan, plan)
+    return results
+
+
+if __name__ == "__main__":
+    run_migrations()
+    if default_engine.dialect.name == 'sqlite':
+        for name, (ok, plan) in check_query_plans().items():
+            print(f"{'✓' if ok else '✗'} {name}: {plan}")
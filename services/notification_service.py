@@ -1,24 +1,42 @@
 import datetime
+import threading
 from services.database_service import SessionLocal, VisaApplication, Notification, NotificationPreferences, Applicant
 from services.email_service import EmailService
+from services.write_queue import get_writer
+from services.aggregation_service import aggregations
+from services.stats_counters import GLOBAL, SEVERITIES, read_counters
 
 
 class NotificationService:
     """Manages tiered notifications for expiring documents and verification needs."""
     
     def __init__(self):
-        self.email_service = EmailService()
+        self._email_service = None
+        self._email_lock = threading.Lock()
         self.default_alert_days = [90, 60, 30]  # Days before expiry to send alerts
     
-    def check_expiring_documents(self):
+    @property
+    def email_service(self):
+        """Gmail client, built on the first email sent (it loads and may refresh token.pickle)."""
+        if self._email_service is None:
+            with self._email_lock:
+                if self._email_service is None:
+                    self._email_service = EmailService()
+        return self._email_service
+    
+    def check_expiring_documents(self, progress=None):
         """
         Scans all documents and creates notifications for those approaching expiry.
         
+        Args:
+            progress: Optional callback(done, total) called before each document
+        
         Returns:
             Number of notifications created
         """
         session = SessionLocal()
         notifications_created = 0
+        new_notifications = []
         
         try:
             now = datetime.datetime.now()
@@ -29,7 +47,9 @@ class NotificationService:
                 VisaApplication.expiry_date > now
             ).all()
             
-            for doc in documents:
+            for index, doc in enumerate(documents):
+                if progress:
+                    progress(index, len(documents))
                 days_until_expiry = (doc.expiry_date - now).days
                 
                 # Get applicant's notification preferences
@@ -59,7 +79,7 @@ class NotificationService:
                                 severity=severity,
                                 message=message
                             )
-                            session.add(notification)
+                            new_notifications.append(notification)
                             
                             # Send email if enabled
                             if prefs and prefs.email_enabled and 'email' in (prefs.notification_channels or []):
@@ -67,7 +87,9 @@ class NotificationService:
                             
                             notifications_created += 1
             
-            session.commit()
+            if new_notifications:
+                # Scanning only reads; the inserts go through the shared writer
+                get_writer().submit(lambda write_session: write_session.add_all(new_notifications))
             return notifications_created
             
         except Exception as e:
@@ -77,15 +99,19 @@ class NotificationService:
         finally:
             session.close()
     
-    def check_verification_needed(self):
+    def check_verification_needed(self, progress=None):
         """
         Creates notifications for documents requiring manual verification.
         
+        Args:
+            progress: Optional callback(done, total) called before each document
+        
         Returns:
             Number of notifications created
         """
         session = SessionLocal()
         notifications_created = 0
+        new_notifications = []
         
         try:
             # Get documents with low confidence or pending verification
@@ -94,7 +120,9 @@ class NotificationService:
                 (VisaApplication.verification_status == 'pending')
             ).all()
             
-            for doc in documents:
+            for index, doc in enumerate(documents):
+                if progress:
+                    progress(index, len(documents))
                 # Check if notification already exists
                 existing = session.query(Notification).filter(
                     Notification.document_id == doc.document_id,
@@ -112,10 +140,12 @@ class NotificationService:
                         severity='high',
                         message=message
                     )
-                    session.add(notification)
+                    new_notifications.append(notification)
                     notifications_created += 1
             
-            session.commit()
+            if new_notifications:
+                # Scanning only reads; the inserts go through the shared writer
+                get_writer().submit(lambda write_session: write_session.add_all(new_notifications))
             return notifications_created
             
         except Exception as e:
@@ -246,43 +276,48 @@ class NotificationService:
         except Exception as e:
             print(f"Error sending email notification: {e}")
     
-    def get_notification_stats(self, applicant_id=None):
+    def get_notification_stats(self, applicant_id=None, group_by=None, filters=None):
         """
-        Gets statistics about notifications.
+        Gets statistics about notifications, from the stats counters.
+        With group_by, a breakdown computed in one GROUP BY query instead.
+        
+        Args:
+            applicant_id: Optional filter by applicant
+            group_by: Dimensions to break down by (see AggregationService.dimensions('notifications'))
+            filters: Further dimension filters for a breakdown, e.g. {'verification_status': 'pending'}
         
         Returns:
-            Dict with notification counts by type and severity
+            Dict with notification counts by type and severity; with group_by, {'group_by': [...], 'groups': [...]}
+        
+        Raises:
+            ValueError: On an unknown dimension
         """
+        if group_by:
+            filters = dict(filters or {}, applicant_id=applicant_id)
+            return {'group_by': list(group_by), 'groups': aggregations.aggregate('notifications', group_by, filters)}
+        
         session = SessionLocal()
         try:
-            query = session.query(Notification)
-            if applicant_id:
-                query = query.filter(Notification.applicant_id == applicant_id)
-            
-            all_notifications = query.all()
+            counters = read_counters(session, applicant_id or GLOBAL)
             
             stats = {
-                'total': len(all_notifications),
-                'unread': sum(1 for n in all_notifications if not n.read_at),
+                'total': int(counters.get('notifications', 0)),
+                'unread': int(counters.get('notifications.unread', 0)),
                 'by_severity': {
-                    'critical': sum(1 for n in all_notifications if n.severity == 'critical'),
-                    'high': sum(1 for n in all_notifications if n.severity == 'high'),
-                    'medium': sum(1 for n in all_notifications if n.severity == 'medium'),
-                    'low': sum(1 for n in all_notifications if n.severity == 'low')
+                    severity: int(counters.get(f'notifications.severity.{severity}', 0)) for severity in SEVERITIES
                 },
                 'by_type': {}
             }
             
             # Count by type
-            for notification in all_notifications:
-                ntype = notification.notification_type
-                stats['by_type'][ntype] = stats['by_type'].get(ntype, 0) + 1
+            for name, value in counters.items():
+                if name.startswith('notifications.type.') and value:
+                    stats['by_type'][name[len('notifications.type.'):]] = int(value)
             
             return stats
         finally:
             session.close()
 
-
 if __name__ == "__main__":
     # Test the service
     service = NotificationService()
@@ -2,15 +2,36 @@ import os
 import json
 from openai import OpenAI
 from dotenv import load_dotenv
+from services.llm_ledger_service import ledger
 
 load_dotenv()
 
+def create_client(api_key=None, base_url=None):
+    """
+    Creates an OpenAI client, optionally pointed at an OpenAI-compatible server.
+
+    Args:
+        api_key: API key; defaults to OPENAI_API_KEY
+        base_url: Endpoint such as http://127.0.0.1:8089/v1 (e.g. the local stand-in in
+                  benchmarks/fake_openai_server.py); defaults to OPENAI_BASE_URL
+
+    Returns:
+        OpenAI client
+    """
+    api_key = api_key or os.getenv("OPENAI_API_KEY")
+    base_url = base_url or os.getenv("OPENAI_BASE_URL")
+    if base_url:
+        print(f"ℹ Using OpenAI-compatible endpoint at {base_url}")
+        # Local stand-ins accept any key
+        api_key = api_key or "local"
+    return OpenAI(api_key=api_key, base_url=base_url)
+
 class OpenAIService:
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, base_url=None):
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
-        if not self.api_key:
+        if not self.api_key and not (base_url or os.getenv("OPENAI_BASE_URL")):
             print("Warning: OPENAI_API_KEY not found in environment.")
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = create_client(self.api_key, base_url)
         self.model = "gpt-4o-mini"
 
     def analyze_document(self, text, visa_subclass, document_type):
@@ -86,7 +107,10 @@ class OpenAIService:
         """
         
         try:
-            response = self.client.chat.completions.create(
+            response = ledger.tracked_completion(
+                self.client,
+                purpose="analyze",
+                document_type=document_type,
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are a professional Australian visa document verifier. Extract as much specific data as possible and provide detailed confidence assessments."},
@@ -133,7 +157,9 @@ class OpenAIService:
                 })
         
         try:
-            response = self.client.chat.completions.create(
+            response = ledger.tracked_completion(
+                self.client,
+                purpose="ocr",
                 model="gpt-4o", # Use full gpt-4o for vision
                 messages=[
                     {"role": "system", "content": "You are a specialized OCR engine for immigration documents. Provide both transcription and quality assessment."},
@@ -168,7 +194,9 @@ class OpenAIService:
         """
         
         try:
-            response = self.client.chat.completions.create(
+            response = ledger.tracked_completion(
+                self.client,
+                purpose="classify",
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are a document classification expert for Australian immigration."},
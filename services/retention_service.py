@@ -0,0 +1,209 @@
+"""
+Retention Service
+Hot/cold tiering for visa_applications and audit_log. Rows nobody works on any
+more move in small batches to the `*_archive` tables, so the hot tables (and
+the dashboard, agent and notification queries on them) stay small while
+history is kept in full. Runs on its own schedule (scheduled_notifications.py,
+modal_app.retention_worker), never inside the agent's polling cycle.
+
+A visa application is cold once it has not been touched for `hot_days`, is no
+longer awaiting verification and has no upcoming expiry to alert on. Rows with
+impossible dates (in the future or before 2000) are archived straight away.
+"""
+
+import os
+import datetime
+from sqlalchemy import or_, and_, exists
+from sqlalchemy.orm import aliased, selectinload
+from services.database_service import (
+    SessionLocal, VisaApplication, AuditLog, ArchivedVisaApplication, ArchivedAuditLog, DocumentAnalysis, ANALYSIS_FIELDS
+)
+from services.extracted_data_service import delete_extracted_data
+from services.event_bus import publish
+from services.stats_counters import COUNTED_COLUMNS, adjust, counter_deltas
+from services.write_queue import get_writer
+from services.metrics_service import metrics
+
+DEFAULT_HOT_DAYS = int(os.getenv("RETENTION_HOT_DAYS", "180"))
+DEFAULT_AUDIT_HOT_DAYS = int(os.getenv("RETENTION_AUDIT_HOT_DAYS", "90"))
+DEFAULT_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+MIN_VALID_DATE = datetime.datetime(2000, 1, 1)
+
+
+def row_to_record(row, include_analysis=False):
+    """Every column of an ORM row as a JSON-safe dict, plus a visa application's analysis payloads if asked."""
+    record = {}
+    for column in row.__table__.columns:
+        value = getattr(row, column.key)
+        record[column.key] = value.isoformat() if isinstance(value, (datetime.datetime, datetime.date)) else value
+    if include_analysis:
+        for field in ANALYSIS_FIELDS:
+            record[field] = getattr(row, field)
+    return record
+
+
+class RetentionService:
+    """
+    Moves cold rows to the archive tables and looks rows up across both tiers.
+
+    Args:
+        session_factory: Session factory (defaults to SessionLocal)
+        hot_days: Days since the last update before an application can go cold
+        audit_hot_days: Days an audit log entry stays in the hot table
+        batch_size: Rows moved per transaction
+    """
+
+    def __init__(self, session_factory=None, hot_days=DEFAULT_HOT_DAYS, audit_hot_days=DEFAULT_AUDIT_HOT_DAYS,
+                 batch_size=DEFAULT_BATCH_SIZE):
+        self.session_factory = session_factory or SessionLocal
+        self.hot_days = hot_days
+        self.audit_hot_days = audit_hot_days
+        self.batch_size = batch_size
+
+    def _cold_applications(self, session, now):
+        cutoff = now - datetime.timedelta(days=self.hot_days)
+        newer = aliased(VisaApplication)
+        invalid_date = or_(VisaApplication.upload_date > now, VisaApplication.upload_date < MIN_VALID_DATE)
+        cold = and_(
+            VisaApplication.updated_at < cutoff,
+            or_(VisaApplication.verification_status.is_(None), VisaApplication.verification_status != 'pending'),
+            or_(VisaApplication.expiry_date.is_(None), VisaApplication.expiry_date < now)
+        )
+        return session.query(VisaApplication).filter(
+            or_(cold, invalid_date),
+            # Keep a version while a hot row still points at it; it follows on a later run
+            ~exists().where(newer.previous_version_id == VisaApplication.id)
+        ).order_by(VisaApplication.id).limit(self.batch_size)
+
+    def _archive_application_batch(self, session):
+        now = datetime.datetime.now()
+        rows = self._cold_applications(session, now).options(selectinload(VisaApplication.analysis_record)).all()
+        for row in rows:
+            valid = row.upload_date is None or MIN_VALID_DATE <= row.upload_date <= now
+            session.add(ArchivedVisaApplication(
+                source_id=row.id,
+                document_id=row.document_id,
+                applicant_id=row.applicant_id,
+                document_type=row.document_type,
+                file_name=row.file_name,
+                status=row.status,
+                upload_date=row.upload_date,
+                expiry_date=row.expiry_date,
+                updated_at=row.updated_at,
+                record=row_to_record(row, include_analysis=True),
+                archive_reason='cold' if valid else 'invalid_date',
+                archived_at=now
+            ))
+        if rows:
+            ids = [r.id for r in rows]
+            session.query(DocumentAnalysis).filter(DocumentAnalysis.application_id.in_(ids)).delete(synchronize_session=False)
+            delete_extracted_data(session, ids)
+            session.query(VisaApplication).filter(VisaApplication.id.in_(ids)).delete(synchronize_session=False)
+            adjust(session, counter_deltas('application', [
+                ({column: getattr(row, column) for column in COUNTED_COLUMNS['application']}, None) for row in rows]))
+            publish(session, 'application', 'archived', ids)
+        return len(rows)
+
+    def _archive_audit_batch(self, session):
+        now = datetime.datetime.now()
+        cutoff = now - datetime.timedelta(days=self.audit_hot_days)
+        rows = session.query(AuditLog).filter(
+            or_(AuditLog.timestamp < cutoff, AuditLog.timestamp > now)
+        ).order_by(AuditLog.id).limit(self.batch_size).all()
+        for row in rows:
+            session.add(ArchivedAuditLog(
+                source_id=row.id,
+                document_id=row.document_id,
+                action=row.action,
+                timestamp=row.timestamp,
+                record=row_to_record(row),
+                archive_reason='invalid_date' if row.timestamp and (row.timestamp > now or row.timestamp < MIN_VALID_DATE) else 'cold',
+                archived_at=now
+            ))
+        if rows:
+            session.query(AuditLog).filter(AuditLog.id.in_([r.id for r in rows])).delete(synchronize_session=False)
+        return len(rows)
+
+    def _drain(self, table, batch_job, max_batches):
+        moved, batches = 0, 0
+        while max_batches is None or batches < max_batches:
+            # Each batch is its own short write transaction, so agents and the dashboard interleave
+            count = get_writer(self.session_factory).submit(batch_job)
+            moved += count
+            batches += 1
+            if count < self.batch_size:
+                break
+        if moved:
+            metrics.inc("visa_retention_archived_total", moved, table=table)
+        return moved
+
+    def run(self, max_batches=None):
+        """
+        Archives cold rows batch by batch.
+
+        Args:
+            max_batches: Cap on batches per table for this run (None drains everything cold)
+
+        Returns:
+            Dict with rows archived per table
+        """
+        result = {
+            'visa_applications': self._drain('visa_applications', self._archive_application_batch, max_batches),
+            'audit_log': self._drain('audit_log', self._archive_audit_batch, max_batches)
+        }
+        print(f"✓ Retention: archived {result['visa_applications']} application(s), {result['audit_log']} audit log entr(ies)")
+        return result
+
+    def find_application(self, document_id=None, file_name=None):
+        """
+        Looks a document up in the hot table, then the archive.
+
+        Returns:
+            Dict of the row's columns plus 'tier' ('hot' or 'archive'), or None
+        """
+        session = self.session_factory()
+        try:
+            for model, tier in ((VisaApplication, 'hot'), (ArchivedVisaApplication, 'archive')):
+                query = session.query(model)
+                if document_id:
+                    query = query.filter(model.document_id == document_id)
+                if file_name:
+                    query = query.filter(model.file_name == file_name)
+                row = query.order_by(model.id.desc()).first()
+                if row:
+                    record = row_to_record(row, include_analysis=True) if tier == 'hot' else dict(row.record)
+                    record['tier'] = tier
+                    return record
+            return None
+        finally:
+            session.close()
+
+    def applicant_history(self, applicant_id, include_archive=True):
+        """
+        All of an applicant's documents across both tiers, newest first.
+
+        Returns:
+            List of row dicts with a 'tier' key
+        """
+        session = self.session_factory()
+        try:
+            history = []
+            for row in session.query(VisaApplication).filter(VisaApplication.applicant_id == str(applicant_id)):
+                history.append(dict(row_to_record(row), tier='hot'))
+            if include_archive:
+                for row in session.query(ArchivedVisaApplication).filter(ArchivedVisaApplication.applicant_id == str(applicant_id)):
+                    history.append(dict(row.record, tier='archive'))
+            history.sort(key=lambda r: r.get('upload_date') or '', reverse=True)
+            return history
+        finally:
+            session.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Archive cold visa applications and audit logs')
+    parser.add_argument('--max-batches', type=int, default=None, help='Batches per table for this run')
+    args = parser.parse_args()
+    RetentionService().run(max_batches=args.max_batches)
+    metrics.flush()
@@ -0,0 +1,89 @@
+"""
+Service Registry
+Process-wide home for the services the web app uses, so a heavy client (the
+Gmail client behind NotificationService, the OpenAI, Gmail and Sheets clients
+behind ClientAlertService) is built once per worker process on first use,
+instead of once per request.
+
+A service is registered with a factory and an optional close hook. `get`
+builds it under a per-service lock, so concurrent first requests build it once
+and a slow build does not hold up requests for other services. A factory that
+raises is not cached; the next `get` tries again. `shutdown` (also run at exit)
+calls the close hooks and forgets the instances; `reset` does the same for one
+service, e.g. after its credentials changed.
+"""
+
+import atexit
+import threading
+
+
+class ServiceRegistry:
+    """Lazily built, process-wide service instances."""
+
+    def __init__(self):
+        self._factories = {}  # name -> (factory, close hook or None)
+        self._instances = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, factory, close=None):
+        """
+        Registers a service.
+
+        Args:
+            name: Name the service is fetched by
+            factory: Callable building the service (called on first `get`)
+            close: Optional callable taking the instance, run on `reset`/`shutdown`
+        """
+        with self._lock:
+            self._factories[name] = (factory, close)
+            self._locks.setdefault(name, threading.Lock())
+
+    def get(self, name):
+        """
+        Returns the service, building it on first use.
+
+        Raises:
+            KeyError: If no service is registered under name
+            Exception: Whatever the factory raises (the next call retries)
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            factory, _ = self._factories[name]
+            lock = self._locks[name]
+        with lock:
+            instance = self._instances.get(name)
+            if instance is None:
+                instance = factory()
+                self._instances[name] = instance
+            return instance
+
+    def started(self):
+        """Names of the services built so far."""
+        return list(self._instances)
+
+    def reset(self, name):
+        """Closes and forgets one service; the next `get` builds it again."""
+        with self._locks.get(name, self._lock):
+            instance = self._instances.pop(name, None)
+        self._close(name, instance)
+
+    def shutdown(self):
+        """Closes and forgets every built service."""
+        for name in list(self._instances):
+            self.reset(name)
+
+    def _close(self, name, instance):
+        close = self._factories.get(name, (None, None))[1]
+        if instance is None or close is None:
+            return
+        try:
+            close(instance)
+        except Exception as e:
+            print(f"⚠ Could not close service {name}: {e}")
+
+
+registry = ServiceRegistry()
+atexit.register(registry.shutdown)
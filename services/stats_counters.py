@@ -0,0 +1,269 @@
+"""
+Stats Counters
+Materialised counts behind the dashboard, verification and notification stats,
+so every stats endpoint is a primary-key read of a few stat_counters rows
+instead of a scan of visa_applications or notifications.
+
+Counters are adjusted in the same transaction as the write that changes them,
+once for everything (scope '') and once for the row's applicant. ORM flushes
+of VisaApplication and Notification rows are captured automatically; Core-level
+writes (the application store upsert, retention) call `adjust` with the rows
+before and after. `reconcile` recounts from the source tables and corrects any
+drift, e.g. from a concurrent upsert of the same file or a hand-edited row; it
+runs with retention.
+"""
+
+import datetime
+from collections import defaultdict
+from sqlalchemy import event, func, case, and_, inspect
+from sqlalchemy.orm import Session
+from services.database_service import SessionLocal, StatCounter, VisaApplication, Notification, dialect_insert
+
+GLOBAL = ''
+LOW_CONFIDENCE_THRESHOLD = 70  # Same as VerificationService.confidence_threshold
+SEVERITIES = ('critical', 'high', 'medium', 'low')
+
+# Columns each counted row contributes through, by kind
+COUNTED_COLUMNS = {
+    'application': ('applicant_id', 'status', 'verification_status', 'confidence_score'),
+    'notification': ('applicant_id', 'notification_type', 'severity', 'read_at'),
+}
+TRACKED_MODELS = {VisaApplication: 'application', Notification: 'notification'}
+
+
+def _is_low_confidence(score):
+    return bool(score) and score < LOW_CONFIDENCE_THRESHOLD
+
+
+def _application_names(status, verification_status, low_confidence):
+    names = ['applications']
+    if status:
+        names.append(f'applications.status.{status}')
+    if verification_status:
+        names.append(f'applications.verification.{verification_status}')
+    if low_confidence:
+        names.append('applications.low_confidence')
+    return names
+
+
+def _notification_names(notification_type, severity, unread):
+    names = ['notifications']
+    if unread:
+        names.append('notifications.unread')
+    if severity:
+        names.append(f'notifications.severity.{severity}')
+    if notification_type:
+        names.append(f'notifications.type.{notification_type}')
+    return names
+
+
+def _scopes(applicant_id):
+    return [GLOBAL, str(applicant_id)] if applicant_id else [GLOBAL]
+
+
+def _contribution(kind, row, sign, deltas):
+    """Adds (sign=1) or removes (sign=-1) one row's counts; row is a dict of COUNTED_COLUMNS."""
+    if kind == 'application':
+        names = _application_names(row.get('status'), row.get('verification_status'),
+                                   _is_low_confidence(row.get('confidence_score')))
+        weighted = {'applications.confidence_sum': row.get('confidence_score') or 0}
+    else:
+        names = _notification_names(row.get('notification_type'), row.get('severity'), not row.get('read_at'))
+        weighted = {}
+    for scope in _scopes(row.get('applicant_id')):
+        for name in names:
+            deltas[(scope, name)] += sign
+        for name, value in weighted.items():
+            deltas[(scope, name)] += sign * value
+
+
+def counter_deltas(kind, changes):
+    """
+    Counter changes for a set of row changes.
+
+    Args:
+        kind: 'application' or 'notification'
+        changes: (before, after) pairs of column dicts; None for a row that did not exist / no longer exists
+
+    Returns:
+        Dict of (scope, name) -> delta, without zero entries
+    """
+    deltas = defaultdict(float)
+    for before, after in changes:
+        if before is not None:
+            _contribution(kind, before, -1, deltas)
+        if after is not None:
+            _contribution(kind, after, 1, deltas)
+    return {key: delta for key, delta in deltas.items() if delta}
+
+
+def adjust(session, deltas):
+    """
+    Applies counter deltas in the session's transaction as `value = value + delta`,
+    so concurrent writers never overwrite each other. Does not commit.
+
+    Args:
+        session: Session the change is written with
+        deltas: Dict of (scope, name) -> delta
+    """
+    if not deltas:
+        return
+    now = datetime.datetime.now()
+    table = StatCounter.__table__
+    insert = dialect_insert(session.get_bind().dialect.name)
+    if insert is not None:
+        statement = insert(table).values([{'scope': scope, 'name': name, 'value': delta, 'updated_at': now}
+                                          for (scope, name), delta in sorted(deltas.items())])
+        session.execute(statement.on_conflict_do_update(
+            index_elements=['scope', 'name'],
+            set_={'value': table.c.value + statement.excluded.value, 'updated_at': statement.excluded.updated_at}
+        ))
+        return
+    for (scope, name), delta in sorted(deltas.items()):
+        updated = session.execute(table.update().where(table.c.scope == scope, table.c.name == name).values(
+            value=table.c.value + delta, updated_at=now)).rowcount
+        if not updated:
+            session.execute(table.insert().values(scope=scope, name=name, value=delta, updated_at=now))
+
+
+def _keep_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+# A set listener with active_history loads the replaced value even when the
+# attribute was expired (e.g. by a commit), so the flush knows what to uncount
+for _model, _kind in TRACKED_MODELS.items():
+    for _column in COUNTED_COLUMNS[_kind]:
+        event.listen(getattr(_model, _column), 'set', _keep_old_value, active_history=True, retval=True)
+
+
+@event.listens_for(Session, "before_flush")
+def _load_counted_columns(session, flush_context, instances):
+    # Expired columns of changed or deleted rows are loaded now, while they still can be
+    with session.no_autoflush:
+        for obj in list(session.dirty) + list(session.deleted):
+            kind = TRACKED_MODELS.get(type(obj))
+            if kind:
+                unloaded = inspect(obj).unloaded
+                for column in COUNTED_COLUMNS[kind]:
+                    if column in unloaded:
+                        getattr(obj, column)
+
+
+def _values(obj, columns, old=False):
+    """Column values of a flushed object; old=True gives the values before this flush."""
+    state = inspect(obj)
+    values = {}
+    for column in columns:
+        history = state.attrs[column].history
+        if old and history.has_changes():
+            values[column] = history.deleted[0] if history.deleted else None
+        else:
+            # The state dict, so an expired attribute is not loaded mid-flush
+            values[column] = state.dict.get(column)
+    return values
+
+
+@event.listens_for(Session, "after_flush")
+def _count_orm_changes(session, flush_context):
+    # Attribute history still holds the pre-flush values here
+    changes = defaultdict(list)
+    for obj in session.new:
+        kind = TRACKED_MODELS.get(type(obj))
+        if kind:
+            changes[kind].append((None, _values(obj, COUNTED_COLUMNS[kind])))
+    for obj in session.dirty:
+        kind = TRACKED_MODELS.get(type(obj))
+        if kind and session.is_modified(obj, include_collections=False):
+            columns = COUNTED_COLUMNS[kind]
+            changes[kind].append((_values(obj, columns, old=True), _values(obj, columns)))
+    for obj in session.deleted:
+        kind = TRACKED_MODELS.get(type(obj))
+        if kind:
+            changes[kind].append((_values(obj, COUNTED_COLUMNS[kind], old=True), None))
+    deltas = defaultdict(float)
+    for kind, pairs in changes.items():
+        for key, delta in counter_deltas(kind, pairs).items():
+            deltas[key] += delta
+    adjust(session, {key: delta for key, delta in deltas.items() if delta})
+
+
+def read_counters(session, scope=GLOBAL):
+    """All counters of a scope as {name: value}."""
+    return dict(session.query(StatCounter.name, StatCounter.value).filter(StatCounter.scope == scope).all())
+
+
+def dashboard_stats(session_factory=None):
+    """Totals for the dashboard header: total, passed, needs_review."""
+    session = (session_factory or SessionLocal)()
+    try:
+        counters = read_counters(session)
+    finally:
+        session.close()
+    return {
+        "total": int(counters.get('applications', 0)),
+        "passed": int(counters.get('applications.status.Passed', 0)),
+        "needs_review": int(counters.get('applications.status.Needs Review', 0))
+    }
+
+
+def _expected_counters(session):
+    """Every counter recounted from visa_applications and notifications, as {(scope, name): value}."""
+    expected = defaultdict(float)
+    low = case((and_(VisaApplication.confidence_score != 0,
+                     VisaApplication.confidence_score < LOW_CONFIDENCE_THRESHOLD), 1), else_=0)
+    groups = session.query(
+        VisaApplication.applicant_id, VisaApplication.status, VisaApplication.verification_status, low,
+        func.count(VisaApplication.id), func.coalesce(func.sum(VisaApplication.confidence_score), 0)
+    ).group_by(VisaApplication.applicant_id, VisaApplication.status, VisaApplication.verification_status, low)
+    for applicant_id, status, verification_status, low_confidence, count, confidence_sum in groups:
+        for scope in _scopes(applicant_id):
+            for name in _application_names(status, verification_status, low_confidence):
+                expected[(scope, name)] += count
+            expected[(scope, 'applications.confidence_sum')] += confidence_sum
+
+    unread = case((Notification.read_at.is_(None), 1), else_=0)
+    groups = session.query(
+        Notification.applicant_id, Notification.notification_type, Notification.severity, unread,
+        func.count(Notification.id)
+    ).group_by(Notification.applicant_id, Notification.notification_type, Notification.severity, unread)
+    for applicant_id, notification_type, severity, is_unread, count in groups:
+        for scope in _scopes(applicant_id):
+            for name in _notification_names(notification_type, severity, is_unread):
+                expected[(scope, name)] += count
+    return expected
+
+
+def reconcile(session_factory=None):
+    """
+    Recounts every counter from the source tables and corrects the ones that drifted.
+
+    Args:
+        session_factory: Session factory (defaults to SessionLocal)
+
+    Returns:
+        Dict of (scope, name) -> correction applied (empty when nothing drifted)
+    """
+    def job(session):
+        expected = _expected_counters(session)
+        stored = {(row.scope, row.name): row.value for row in session.query(StatCounter)}
+        corrections = {key: expected.get(key, 0) - stored.get(key, 0) for key in set(expected) | set(stored)}
+        corrections = {key: delta for key, delta in corrections.items() if abs(delta) > 1e-6}
+        adjust(session, corrections)
+        # Counters of applicants with nothing left
+        session.query(StatCounter).filter(StatCounter.value == 0).delete(synchronize_session=False)
+        return corrections
+
+    # Imported here: database_service imports this module, and write_queue imports database_service
+    from services.write_queue import get_writer
+    corrections = get_writer(session_factory or SessionLocal).submit(job)
+    if corrections:
+        print(f"⚠ Corrected {len(corrections)} drifted stat counter(s)")
+    else:
+        print("✓ Stat counters match the source tables")
+    return corrections
+
+
+if __name__ == "__main__":
+    reconcile()
+    print(dashboard_stats())
@@ -0,0 +1,69 @@
+"""
+Token Counter
+Prompt-size counts for keeping chat prompts within budget. Uses tiktoken's
+encoding for the model when tiktoken is installed (it is optional), and about
+four characters per token otherwise, which is close enough for English text to
+hold a budget.
+"""
+
+import threading
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+DEFAULT_MODEL = "gpt-4o"
+MESSAGE_OVERHEAD = 4  # Tokens per chat message for the role and framing
+REPLY_PRIMING = 3  # Tokens every reply is primed with
+CHARS_PER_TOKEN = 4
+
+_encodings = {}
+_lock = threading.Lock()
+
+
+def _encoding(model):
+    """tiktoken encoding for model, or None without tiktoken (or if it cannot load one)."""
+    if tiktoken is None:
+        return None
+    with _lock:
+        if model not in _encodings:
+            try:
+                try:
+                    _encodings[model] = tiktoken.encoding_for_model(model)
+                except KeyError:
+                    _encodings[model] = tiktoken.get_encoding("o200k_base")
+            except Exception as e:
+                # The encoding files are downloaded on first use; offline, estimate instead
+                print(f"⚠ tiktoken encoding for {model} unavailable, estimating tokens: {e}")
+                _encodings[model] = None
+        return _encodings[model]
+
+
+def count_tokens(text, model=DEFAULT_MODEL):
+    """Tokens in text."""
+    if not text:
+        return 0
+    encoding = _encoding(model)
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def count_message_tokens(messages, model=DEFAULT_MODEL):
+    """Prompt tokens of a list of chat messages ({'role', 'content'} dicts)."""
+    if not messages:
+        return 0
+    return sum(count_tokens(m.get('content') or '', model) + MESSAGE_OVERHEAD for m in messages) + REPLY_PRIMING
+
+
+def truncate_to_tokens(text, limit, model=DEFAULT_MODEL):
+    """text cut to at most limit tokens (marked with '…' when cut)."""
+    if not text or count_tokens(text, model) <= limit:
+        return text
+    if limit <= 0:
+        return ''
+    encoding = _encoding(model)
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:limit - 1]) + '…'
+    return text[:(limit - 1) * CHARS_PER_TOKEN] + '…'
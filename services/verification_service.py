@@ -1,18 +1,25 @@
+import copy
 import datetime
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
 from services.database_service import SessionLocal, VisaApplication, AuditLog
+from services.extracted_data_service import replace_extracted_data
+from services.aggregation_service import aggregations
+from services.stats_counters import GLOBAL, LOW_CONFIDENCE_THRESHOLD, read_counters
 
 class VerificationService:
     """Manages the verification workflow for low-confidence document extractions."""
     
     def __init__(self):
-        self.confidence_threshold = 70  # Documents below this require manual review
+        self.confidence_threshold = LOW_CONFIDENCE_THRESHOLD  # Documents below this require manual review
     
-    def get_pending_verifications(self, applicant_id=None):
+    def get_pending_verifications(self, applicant_id=None, include_analysis=False):
         """
         Retrieves documents needing manual review (confidence < threshold or status=pending).
         
         Args:
             applicant_id: Optional filter by applicant
+            include_analysis: Load the analysis payloads too (they are not readable once the session closes)
             
         Returns:
             List of VisaApplication objects requiring verification
@@ -26,6 +33,8 @@ class VerificationService:
             
             if applicant_id:
                 query = query.filter(VisaApplication.applicant_id == applicant_id)
+            if include_analysis:
+                query = query.options(selectinload(VisaApplication.analysis_record))
             
             pending = query.order_by(VisaApplication.upload_date.desc()).all()
             return pending
@@ -156,12 +165,12 @@ class VerificationService:
             if not app or not app.ai_analysis:
                 return None
             
-            # Store old value for audit
-            old_analysis = app.ai_analysis.copy()
+            # Edit a copy and assign it back, so the stored payload is re-encoded
+            analysis = copy.deepcopy(app.ai_analysis)
             
             # Update the field (simplified - in production use proper JSON path library)
             parts = field_path.split('.')
-            current = app.ai_analysis
+            current = analysis
             for part in parts[:-1]:
                 if part not in current:
                     current[part] = {}
@@ -169,6 +178,8 @@ class VerificationService:
             
             old_value = current.get(parts[-1])
             current[parts[-1]] = new_value
+            app.ai_analysis = analysis
+            replace_extracted_data(session, {app.id: analysis})
             
             # Mark as modified
             app.verification_status = 'manually_corrected'
@@ -198,35 +209,55 @@ class VerificationService:
         finally:
             session.close()
     
-    def get_verification_stats(self, applicant_id=None):
+    def get_verification_stats(self, applicant_id=None, group_by=None, filters=None):
         """
-        Gets statistics about verification status.
+        Gets statistics about verification status, from the stats counters.
+        With group_by, a breakdown computed in one GROUP BY query instead.
+        
+        Args:
+            applicant_id: Optional filter by applicant
+            group_by: Dimensions to break down by (see AggregationService.dimensions('applications'))
+            filters: Further dimension filters for a breakdown, e.g. {'verification_status': 'pending'}
         
         Returns:
-            Dict with counts of pending, verified, rejected documents
+            Dict with counts of pending, verified, rejected documents; with group_by, {'group_by': [...], 'groups': [...]}
+        
+        Raises:
+            ValueError: On an unknown dimension
         """
+        if group_by:
+            filters = dict(filters or {}, applicant_id=applicant_id)
+            return {'group_by': list(group_by), 'groups': aggregations.aggregate('applications', group_by, filters)}
+        
         session = SessionLocal()
         try:
-            query = session.query(VisaApplication)
-            if applicant_id:
-                query = query.filter(VisaApplication.applicant_id == applicant_id)
-            
-            all_docs = query.all()
+            counters = read_counters(session, applicant_id or GLOBAL)
+            total = int(counters.get('applications', 0))
+            if self.confidence_threshold == LOW_CONFIDENCE_THRESHOLD:
+                low_confidence = int(counters.get('applications.low_confidence', 0))
+            else:
+                # The counter is kept for the default threshold only
+                query = session.query(func.count(VisaApplication.id)).filter(
+                    VisaApplication.confidence_score != 0,
+                    VisaApplication.confidence_score < self.confidence_threshold
+                )
+                if applicant_id:
+                    query = query.filter(VisaApplication.applicant_id == applicant_id)
+                low_confidence = query.scalar()
             
             stats = {
-                'total': len(all_docs),
-                'pending': sum(1 for d in all_docs if d.verification_status == 'pending'),
-                'verified': sum(1 for d in all_docs if d.verification_status == 'verified'),
-                'rejected': sum(1 for d in all_docs if d.verification_status == 'rejected'),
-                'low_confidence': sum(1 for d in all_docs if d.confidence_score and d.confidence_score < self.confidence_threshold),
-                'avg_confidence': sum(d.confidence_score or 0 for d in all_docs) / len(all_docs) if all_docs else 0
+                'total': total,
+                'pending': int(counters.get('applications.verification.pending', 0)),
+                'verified': int(counters.get('applications.verification.verified', 0)),
+                'rejected': int(counters.get('applications.verification.rejected', 0)),
+                'low_confidence': low_confidence,
+                'avg_confidence': counters.get('applications.confidence_sum', 0) / total if total else 0
             }
             
             return stats
         finally:
             session.close()
 
-
 if __name__ == "__main__":
     # Test the service
     service = VerificationService()
@@ -0,0 +1,180 @@
+"""
+Write Queue
+A single writer thread per session factory that applies small write jobs from
+the agent and services (pipeline spans, LLM ledger rows, metric flushes,
+notifications) in group commits. On SQLite only one connection can write at a
+time, so funnelling these writes through one thread replaces lock contention
+and busy-waits between threads with one short transaction per batch. Together
+with WAL mode (see build_engine) readers in the web app never wait for it.
+
+A job is a callable taking a session. It adds or updates rows but does not
+commit; the writer commits the whole batch. If a batch fails it is rolled back
+and its jobs are replayed one by one, so a bad job only fails itself. Nothing a
+batch raises, even from rollback or close on a dropped connection, stops the
+writer thread; it fails that batch's futures and carries on.
+"""
+
+import os
+import queue
+import atexit
+import threading
+from concurrent.futures import Future
+from services.database_service import SessionLocal
+
+DEFAULT_MAX_BATCH = int(os.getenv("DB_WRITE_MAX_BATCH", "200"))
+DEFAULT_MAX_DELAY = float(os.getenv("DB_WRITE_MAX_DELAY_MS", "5")) / 1000.0
+
+
+class WriteQueue:
+    """
+    Group-committing writer thread.
+
+    Args:
+        session_factory: Session factory (defaults to SessionLocal)
+        max_batch: Most jobs committed in one transaction
+        max_delay: Seconds the writer waits for more jobs after the first one arrives
+        enabled: When False jobs run inline in the caller's thread (DB_WRITE_QUEUE=0)
+    """
+
+    def __init__(self, session_factory=None, max_batch=DEFAULT_MAX_BATCH, max_delay=DEFAULT_MAX_DELAY, enabled=None):
+        self.session_factory = session_factory or SessionLocal
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.enabled = os.getenv("DB_WRITE_QUEUE", "1") != "0" if enabled is None else enabled
+        self.stats = {'jobs': 0, 'batches': 0, 'failed': 0}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def submit(self, job, wait=True, timeout=None):
+        """
+        Queues a write job.
+
+        Args:
+            job: Callable taking a session; its return value is the job's result
+            wait: Block until the job's batch is committed
+            timeout: Seconds to wait when `wait` is True
+
+        Returns:
+            The job's result when waiting (its exception is re-raised), otherwise a Future
+        """
+        if not self.enabled or threading.current_thread() is self._thread:
+            # Inline: disabled, or a job submitting more work from the writer itself
+            future = Future()
+            self._run_batch([(job, future)])
+            return future.result() if wait else future
+
+        self._ensure_thread()
+        future = Future()
+        self._queue.put((job, future))
+        return future.result(timeout) if wait else future
+
+    def flush(self, timeout=None):
+        """Waits until every job queued so far is committed."""
+        if not self.enabled or self._thread is None:
+            return
+        self.submit(lambda session: None, timeout=timeout)
+
+    def _ensure_thread(self):
+        with self._lock:
+            # A forked child inherits the object but not the thread
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._loop, daemon=True, name="db-writer")
+            self._thread.start()
+
+    def _loop(self):
+        while True:
+            batch = [self._queue.get()]
+            # Let concurrent writers pile in, then commit them together
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=self.max_delay))
+                except queue.Empty:
+                    break
+            try:
+                self._run_batch(batch)
+            except Exception as e:
+                # Callers wait on these futures without a timeout; they must always resolve
+                print(f"✗ Write batch failed unexpectedly: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _commit(self, jobs):
+        """Runs jobs in one transaction and commits. Returns their results; raises the first error."""
+        session = self.session_factory()
+        try:
+            results = [job(session) for job in jobs]
+            session.commit()
+            return results
+        except Exception:
+            try:
+                session.rollback()
+            except Exception as e:
+                print(f"⚠ Write queue rollback failed: {e}")
+            raise
+        finally:
+            try:
+                session.close()
+            except Exception as e:
+                print(f"⚠ Write queue could not close its session: {e}")
+
+    def _run_batch(self, batch):
+        """Applies a batch in one transaction, falling back to one transaction per job."""
+        batch = [(job, future) for job, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = self._commit([job for job, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                self.stats['failed'] += 1
+                batch[0][1].set_exception(e)
+                return
+            results = None
+
+        if results is None:
+            for job, future in batch:
+                self._run_single(job, future)
+            return
+        self.stats['jobs'] += len(batch)
+        self.stats['batches'] += 1
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+    def _run_single(self, job, future):
+        try:
+            result = self._commit([job])[0]
+        except Exception as e:
+            self.stats['failed'] += 1
+            future.set_exception(e)
+            return
+        self.stats['jobs'] += 1
+        self.stats['batches'] += 1
+        future.set_result(result)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(session_factory=None):
+    """Returns the process-wide writer for a session factory, creating it on first use."""
+    session_factory = session_factory or SessionLocal
+    with _writers_lock:
+        writer = _writers.get(session_factory)
+        if writer is None:
+            writer = _writers[session_factory] = WriteQueue(session_factory)
+        return writer
+
+
+@atexit.register
+def _drain_writers():
+    for writer in list(_writers.values()):
+        try:
+            writer.flush(timeout=10)
+        except Exception:
+            pass
@@ -1,6 +1,6 @@
 import time
 import os
-from services.database_service import SessionLocal, VisaApplication
+from services.database_service import SessionLocal, VisaApplication, init_db
 from core.agent import VisaAgent
 from unittest.mock import MagicMock
 
@@ -110,4 +110,5 @@ def simulate_workflow():
     print("\n✨ Simulation Complete! Open your dashboard at http://localhost:5001 to see the results.")
 
 if __name__ == "__main__":
+    init_db()
     simulate_workflow()
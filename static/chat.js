@@ -102,6 +102,19 @@ try {
         chatToggle.style.display = 'flex';
     });
 
+    // Conversation history is kept per browser on the server, under this id
+    const CHAT_SESSION_KEY = 'visaChatSessionId';
+    function chatSessionId() {
+        let sessionId = localStorage.getItem(CHAT_SESSION_KEY);
+        if (!sessionId) {
+            sessionId = window.crypto && crypto.randomUUID
+                ? crypto.randomUUID()
+                : Date.now().toString(36) + Math.random().toString(36).slice(2);
+            localStorage.setItem(CHAT_SESSION_KEY, sessionId);
+        }
+        return sessionId;
+    }
+
     // Chat send functionality
     async function sendMessage() {
         const input = document.getElementById('chat-input');
@@ -136,64 +149,113 @@ try {
         messagesContainer.appendChild(typingMsg);
         messagesContainer.scrollTop = messagesContainer.scrollHeight;
 
+        const removeTyping = () => {
+            if (document.getElementById('typing-indicator')) {
+                document.getElementById('typing-indicator').remove();
+            }
+        };
+
+        const showError = (text) => {
+            const errorMsg = document.createElement('div');
+            errorMsg.style.cssText = 'display: flex; flex-direction: column; align-items: flex-start;';
+            errorMsg.innerHTML = `<div style="max-width: 85%; padding: 12px 16px; border-radius: 16px; font-size: 14px; line-height: 1.5; background: rgba(255, 77, 77, 0.15); border: 1px solid rgba(255, 77, 77, 0.3); color: #ff4d4d;">${text}</div>`;
+            messagesContainer.appendChild(errorMsg);
+        };
+
         try {
-            console.log('AI Visa Assistant: Fetching response...');
-            const response = await fetch('/api/chat', {
+            console.log('AI Visa Assistant: Streaming response...');
+            const response = await fetch('/api/chat/stream', {
                 method: 'POST',
                 headers: { 'Content-Type': 'application/json' },
-                body: JSON.stringify({ message: message })
+                body: JSON.stringify({ message: message, session_id: chatSessionId() })
             });
 
             console.log('AI Visa Assistant: Response status:', response.status);
 
-            const data = await response.json();
-
-            // Remove typing indicator
-            if (document.getElementById('typing-indicator')) {
-                document.getElementById('typing-indicator').remove();
+            if (!response.ok) {
+                const data = await response.json();
+                removeTyping();
+                console.error('AI Visa Assistant: API Error:', data.error);
+                showError(data.error);
+                return;
             }
 
-            if (data.error) {
-                console.error('AI Visa Assistant: API Error:', data.error);
-                const errorMsg = document.createElement('div');
-                errorMsg.style.cssText = 'display: flex; flex-direction: column; align-items: flex-start;';
-                errorMsg.innerHTML = `<div style="max-width: 85%; padding: 12px 16px; border-radius: 16px; font-size: 14px; line-height: 1.5; background: rgba(255, 77, 77, 0.15); border: 1px solid rgba(255, 77, 77, 0.3); color: #ff4d4d;">${data.error}</div>`;
-                messagesContainer.appendChild(errorMsg);
-            } else {
-                console.log('AI Visa Assistant: Received response');
-                const assistantMsg = document.createElement('div');
-                assistantMsg.style.cssText = 'display: flex; flex-direction: column; align-items: flex-start;';
-
-                // Format sources with proper styling
-                let sourcesHtml = '';
-                if (data.sources && data.sources.length > 0) {
-                    sourcesHtml = '<div style="font-size: 11px; color: #94a3b8; margin-top: 10px; padding-top: 10px; border-top: 1px solid rgba(255,255,255,0.1);"><strong>Sources:</strong><br>' +
-                        data.sources.map(s => `<a href="${s.url}" target="_blank" style="color: #00f2fe; text-decoration: none; display: block; margin-top: 4px; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;">• ${s.title}</a>`).join('') +
-                        '</div>';
+            // The reply is rendered as it streams: sources arrive first, then tokens
+            let sourcesHtml = '';
+            let text = '';
+            let bubble = null;
+
+            const render = () => {
+                if (!bubble) {
+                    removeTyping();
+                    const assistantMsg = document.createElement('div');
+                    assistantMsg.style.cssText = 'display: flex; flex-direction: column; align-items: flex-start;';
+                    assistantMsg.innerHTML = `<div style="max-width: 85%; padding: 12px 16px; border-radius: 16px; font-size: 14px; line-height: 1.5; background: rgba(255, 255, 255, 0.05); border: 1px solid rgba(255, 255, 255, 0.08); color: #f8fafc;"></div>`;
+                    messagesContainer.appendChild(assistantMsg);
+                    bubble = assistantMsg.firstElementChild;
                 }
 
                 // Process response - newlines to <br> and bold text
-                let formattedResponse = data.response
+                const formattedResponse = text
                     .replace(/\n/g, '<br>')
                     .replace(/\*\*(.*?)\*\*/g, '<strong>$1</strong>');
+                bubble.innerHTML = `${formattedResponse}${sourcesHtml}`;
+                messagesContainer.scrollTop = messagesContainer.scrollHeight;
+            };
 
-                assistantMsg.innerHTML = `<div style="max-width: 85%; padding: 12px 16px; border-radius: 16px; font-size: 14px; line-height: 1.5; background: rgba(255, 255, 255, 0.05); border: 1px solid rgba(255, 255, 255, 0.08); color: #f8fafc;">${formattedResponse}${sourcesHtml}</div>`;
-                messagesContainer.appendChild(assistantMsg);
+            const handleEvent = (event, data) => {
+                if (event === 'sources') {
+                    // Format sources with proper styling
+                    if (data.sources && data.sources.length > 0) {
+                        sourcesHtml = '<div style="font-size: 11px; color: #94a3b8; margin-top: 10px; padding-top: 10px; border-top: 1px solid rgba(255,255,255,0.1);"><strong>Sources:</strong><br>' +
+                            data.sources.map(s => `<a href="${s.url}" target="_blank" style="color: #00f2fe; text-decoration: none; display: block; margin-top: 4px; white-space: nowrap; overflow: hidden; text-overflow: ellipsis;">• ${s.title}</a>`).join('') +
+                            '</div>';
+                    }
+                } else if (event === 'token') {
+                    text += data.text;
+                    render();
+                } else if (event === 'done') {
+                    console.log('AI Visa Assistant: Received response');
+                    text = data.response;
+                    render();
+                } else if (event === 'error') {
+                    console.error('AI Visa Assistant: API Error:', data.error);
+                    removeTyping();
+                    if (bubble && !text) bubble.parentElement.remove();
+                    showError(data.response || data.error);
+                }
+            };
+
+            // Server-sent event frames ("event: x\ndata: {...}\n\n") read off the fetch body
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) >= 0) {
+                    const frame = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+                    let event = 'message';
+                    let payload = '';
+                    frame.split('\n').forEach(line => {
+                        if (line.startsWith('event: ')) event = line.slice(7);
+                        else if (line.startsWith('data: ')) payload += line.slice(6);
+                    });
+                    if (payload) handleEvent(event, JSON.parse(payload));
+                }
             }
 
+            removeTyping();
             messagesContainer.scrollTop = messagesContainer.scrollHeight;
         } catch (error) {
             console.error('AI Visa Assistant: Network/Script Error:', error);
 
             // Remove typing indicator if it exists
-            if (document.getElementById('typing-indicator')) {
-                document.getElementById('typing-indicator').remove();
-            }
-
-            const errorMsg = document.createElement('div');
-            errorMsg.style.cssText = 'display: flex; flex-direction: column; align-items: flex-start;';
-            errorMsg.innerHTML = `<div style="max-width: 85%; padding: 12px 16px; border-radius: 16px; font-size: 14px; line-height: 1.5; background: rgba(255, 77, 77, 0.15); border: 1px solid rgba(255, 77, 77, 0.3); color: #ff4d4d;">Sorry, I encountered an error connecting to the server. Please check your internet connection and try again.</div>`;
-            messagesContainer.appendChild(errorMsg);
+            removeTyping();
+            showError('Sorry, I encountered an error connecting to the server. Please check your internet connection and try again.');
         } finally {
             // Re-enable input
             input.disabled = false;
@@ -0,0 +1,36 @@
+// Background jobs: start one, then poll /api/jobs/<id> until it finishes (see services/job_runner.py)
+
+const JOB_POLL_INTERVAL_MS = 1000;
+const JOB_GIVE_UP_MS = 30 * 60 * 1000;  // Stop waiting on a job that never finishes
+const JOB_MAX_FAILED_POLLS = 5;  // Consecutive polls that error out before giving up
+
+async function runJob(url, options = {}, onProgress = () => {}) {
+    const response = await fetch(url, options);
+    let job = await response.json();
+    if (!response.ok) throw new Error(job.error || `Request failed (${response.status})`);
+
+    const deadline = Date.now() + JOB_GIVE_UP_MS;
+    let failedPolls = 0;
+    while (job.status === 'queued' || job.status === 'running') {
+        onProgress(job);
+        if (Date.now() > deadline) throw new Error('Gave up waiting for the job to finish');
+        await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+        try {
+            const poll = await fetch(job.status_url || `/api/jobs/${job.id}`);
+            const body = await poll.json();
+            if (!poll.ok) throw new Error(body.error || `Poll failed (${poll.status})`);
+            job = Object.assign(body, { status_url: job.status_url });
+            failedPolls = 0;
+        } catch (error) {
+            if (++failedPolls >= JOB_MAX_FAILED_POLLS) throw error;
+        }
+    }
+    if (job.status === 'failed') throw new Error(job.error || 'Job failed');
+    return job.result;
+}
+
+function jobProgressText(job) {
+    if (job.status === 'queued') return 'Queued...';
+    const percent = Math.round((job.progress || 0) * 100);
+    return `${percent}%${job.message ? ' · ' + job.message : ''}`;
+}
@@ -6,7 +6,7 @@ from dotenv import load_dotenv
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
 from services.client_alert_service import ClientAlertService
-from services.database_service import SessionLocal, VisaApplication, Applicant
+from services.database_service import SessionLocal, VisaApplication, Applicant, init_db
 
 def test_email_generation():
     print("🧪 Testing AI Email Generation (Anti-Hallucination)...")
@@ -72,4 +72,5 @@ def test_email_generation():
     db.close()
 
 if __name__ == "__main__":
+    init_db()
     test_email_generation()
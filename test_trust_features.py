@@ -10,6 +10,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 from services.verification_service import VerificationService
 from services.notification_service import NotificationService
 from services.openai_service import OpenAIService
+from services.database_service import init_db
 
 def test_verification_service():
     """Test the verification service."""
@@ -146,4 +147,5 @@ def main():
     print("\n✅ All tests completed!")
 
 if __name__ == "__main__":
+    init_db()
     main()
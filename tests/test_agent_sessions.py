@@ -0,0 +1,73 @@
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+
+from services.database_service import Base, SessionLocal, VisaApplication
+from services.openai_service import OpenAIService
+from core.agent import VisaAgent
+from benchmarks.corpus import generate_corpus
+from benchmarks.fake_drive import FakeDriveService
+from benchmarks.fake_openai import FakeOpenAIClient, LatencyModel
+
+MAIL_CONFIG = {'email_templates': {'verified': {'subject': '{file_name}', 'body': '{score}'}}}
+
+class TestAgentSessions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        self.original_bind = SessionLocal.kw['bind']
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir, 'test.db')}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        SessionLocal.configure(bind=engine)
+        os.chdir(self.tmpdir)
+
+        self.drive = FakeDriveService()
+        openai_service = OpenAIService(api_key="test")
+        openai_service.client = FakeOpenAIClient(latency=LatencyModel('constant', 0))
+        self.agent = VisaAgent(drive=self.drive, openai_service=openai_service, mail_config=MAIL_CONFIG)
+        self.agent.incoming_folder_id, self.agent.processing_folder_id = 'incoming', 'processing'
+        self.agent.verified_folder_id, self.agent.needs_review_folder_id = 'verified', 'needs_review'
+
+    def tearDown(self):
+        os.chdir(self.original_cwd)
+        SessionLocal.configure(bind=self.original_bind)
+        shutil.rmtree(self.tmpdir)
+
+    def test_no_session_outlives_a_job(self):
+        for path in generate_corpus(os.path.join(self.tmpdir, 'corpus'), 3, mix={'text_pdf': 1.0}):
+            self.drive.add_file('incoming', path)
+
+        self.agent.run_once()
+        self.agent.sync_folders()
+
+        self.assertEqual(self.drive.count('verified'), 3)
+        self.assertIsNone(self.agent._db)
+
+    def test_each_scope_reads_fresh_rows(self):
+        session = SessionLocal()
+        try:
+            session.add(VisaApplication(document_id="doc-1", file_name="passport.pdf", status="Needs Review"))
+            session.commit()
+
+            with self.agent.session_scope() as db:
+                self.assertEqual(db.query(VisaApplication).one().status, "Needs Review")
+
+            # Another process updates the row between jobs
+            session.query(VisaApplication).update({VisaApplication.status: "Passed"})
+            session.commit()
+
+            with self.agent.session_scope() as db:
+                self.assertEqual(db.query(VisaApplication).one().status, "Passed")
+        finally:
+            session.close()
+
+if __name__ == '__main__':
+    unittest.main()
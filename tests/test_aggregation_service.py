@@ -0,0 +1,67 @@
+import unittest
+import datetime
+import tempfile
+import shutil
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from services.database_service import Base, VisaApplication, Notification
+from services.aggregation_service import AggregationService
+
+class TestAggregationService(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir, 'test.db')}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        self.service = AggregationService(session_factory=self.Session, cache_ttl=60)
+        now = datetime.datetime.now()
+        session = self.Session()
+        try:
+            for i, (document_type, subclass, confidence, days_old) in enumerate([
+                    ('Passport', '500', 90, 0), ('Passport', '500', 60, 3), ('Passport', '482', 80, 40),
+                    ('Bank Statement', '500', 50, 10)]):
+                session.add(VisaApplication(document_id=f"d{i}", file_name=f"f{i}.pdf", document_type=document_type,
+                                            visa_subclass=subclass, confidence_score=confidence,
+                                            upload_date=now - datetime.timedelta(days=days_old, hours=1)))
+            for applicant_id, severity in (('1', 'high'), ('1', 'high'), ('2', 'low')):
+                session.add(Notification(applicant_id=applicant_id, severity=severity, notification_type='expiry_30d'))
+            session.commit()
+        finally:
+            session.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_group_by_and_filters(self):
+        rows = self.service.aggregate('applications', ['document_type', 'visa_subclass'])
+        self.assertEqual([(r['document_type'], r['visa_subclass'], r['count'], r['avg_confidence'], r['low_confidence'])
+                          for r in rows], [('Bank Statement', '500', 1, 50.0, 1), ('Passport', '482', 1, 80.0, 0),
+                                           ('Passport', '500', 2, 75.0, 1)])
+
+        backlog = self.service.aggregate('applications', ['age'], {'verification_status': 'pending'})
+        self.assertEqual({r['age']: r['pending'] for r in backlog}, {'0-1d': 1, '1-7d': 1, '7-30d': 1, '30d+': 1})
+
+        by_severity = self.service.aggregate('notifications', ['applicant_id', 'severity'])
+        self.assertEqual([(r['applicant_id'], r['severity'], r['count'], r['unread']) for r in by_severity],
+                         [('1', 'high', 2, 2), ('2', 'low', 1, 1)])
+        with self.assertRaises(ValueError):
+            self.service.aggregate('applications', ['file_name'])
+
+    def test_results_are_cached(self):
+        statements = []
+        event.listen(self.engine, "before_cursor_execute", lambda conn, cursor, sql, *args: statements.append(sql))
+        first = self.service.aggregate('notifications', ['severity'])
+        self.assertEqual(self.service.aggregate('notifications', ['severity']), first)
+        self.assertEqual(len(statements), 1)
+        self.assertIn('GROUP BY', statements[0])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+import datetime
+import tempfile
+import shutil
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from services.database_service import Base, VisaApplication, Notification
+from services.client_alert_service import find_alert_candidates
+
+class TestAlertCandidates(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir, 'test.db')}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        self.session = sessionmaker(bind=engine)()
+        start = datetime.datetime.now() - datetime.timedelta(hours=1)
+        rows = [('passed', 'Passed', 95), ('review', 'Needs Review', 90), ('blurry', 'Processing', 40),
+                ('ok', 'Processing', 90), ('alerted', 'Needs Review', 50), ('alerted-long-ago', 'Needs Review', 90)]
+        for i, (name, status, confidence) in enumerate(rows):
+            self.session.add(VisaApplication(document_id=name, file_name=f"{name}.pdf", status=status,
+                                             confidence_score=confidence, updated_at=start + datetime.timedelta(minutes=i)))
+        self.session.add(Notification(document_id='alerted', notification_type='ai_alert_low_confidence',
+                                      sent_at=datetime.datetime.now()))
+        self.session.add(Notification(document_id='alerted-long-ago', notification_type='ai_alert_missing_elements',
+                                      sent_at=datetime.datetime.now() - datetime.timedelta(days=30)))
+        self.session.add(Notification(document_id='review', notification_type='verification_needed',
+                                      sent_at=datetime.datetime.now()))
+        self.session.commit()
+
+    def tearDown(self):
+        self.session.close()
+        shutil.rmtree(self.tmpdir)
+
+    def test_classified_filtered_and_paged(self):
+        first = find_alert_candidates(self.session, limit=2)
+        rest = find_alert_candidates(self.session, limit=2, after=first['next'])
+
+        self.assertEqual([(item['file_name'], item['type']) for item in first['items'] + rest['items']], [
+            ('alerted-long-ago.pdf', 'missing'), ('blurry.pdf', 'confidence'),
+            ('review.pdf', 'missing'), ('passed.pdf', 'success')])
+        self.assertIsNone(rest['next'])
+        self.assertEqual(set(first['items'][0]), {'id', 'file_name', 'processed_at', 'type'})
+
+if __name__ == '__main__':
+    unittest.main()
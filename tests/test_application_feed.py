@@ -0,0 +1,100 @@
+import unittest
+import datetime
+import time
+import tempfile
+import shutil
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from services.database_service import Base, VisaApplication
+from services.application_feed import ApplicationFeed, parse_fields
+
+class TestApplicationFeed(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir, 'test.db')}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        self.feed = ApplicationFeed(session_factory=self.Session, settle_seconds=0)
+        start = datetime.datetime.now() - datetime.timedelta(hours=1)
+        session = self.Session()
+        try:
+            for i in range(5):
+                session.add(VisaApplication(document_id=f"doc-{i}", file_name=f"file-{i}.pdf", status="Passed",
+                                            updated_at=start + datetime.timedelta(minutes=i)))
+            session.commit()
+        finally:
+            session.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_keyset_pages_of_a_projection(self):
+        fields = parse_fields('file_name')
+        first = self.feed.page(fields, limit=2)
+        second = self.feed.page(fields, limit=2, after=first['next'])
+        last = self.feed.page(fields, limit=2, after=second['next'])
+
+        names = [item['file_name'] for page in (first, second, last) for item in page['items']]
+        self.assertEqual(names, [f"file-{i}.pdf" for i in range(4, -1, -1)])
+        self.assertIsNone(last['next'])
+        self.assertEqual(set(first['items'][0]), {'id', 'updated_at', 'file_name'})
+        with self.assertRaises(ValueError):
+            parse_fields('file_name,ai_analysis')
+
+    def test_changes_since_cursor(self):
+        first = self.feed.changes(limit=3)
+        rest = self.feed.changes(since=first['cursor'], limit=3)
+        self.assertEqual((len(first['items']), first['more'], len(rest['items']), rest['more']), (3, True, 2, False))
+
+        state = self.feed.state()
+        self.assertEqual(self.feed.changes(since=rest['cursor'])['items'], [])
+        session = self.Session()
+        try:
+            session.query(VisaApplication).filter(VisaApplication.document_id == 'doc-1').one().status = 'Needs Review'
+            session.commit()
+        finally:
+            session.close()
+
+        delta = self.feed.changes(since=rest['cursor'], fields=parse_fields('status'))
+        self.assertEqual([(item['id'], item['status']) for item in delta['items']], [(2, 'Needs Review')])
+        self.assertNotEqual(self.feed.state(), state)
+
+    def test_recent_changes_are_sent_again_until_settled(self):
+        feed = ApplicationFeed(session_factory=self.Session, settle_seconds=7200)
+        first = feed.changes()
+        self.assertEqual(len(feed.changes(since=first['cursor'])['items']), 5)
+
+    def test_new_rows_are_stamped_with_the_update_clock(self):
+        # On a host east of UTC, SQLite's CURRENT_TIMESTAMP would put new rows hours behind updated ones
+        original = os.environ.get('TZ')
+        os.environ['TZ'] = 'Australia/Sydney'
+        time.tzset()
+        try:
+            session = self.Session()
+            try:
+                session.query(VisaApplication).filter(VisaApplication.document_id == 'doc-0').one().status = 'Failed'
+                session.commit()
+                cursor = self.feed.changes()['cursor']
+                session.add(VisaApplication(document_id='doc-new', file_name='new.pdf'))
+                session.commit()
+            finally:
+                session.close()
+            delta = self.feed.changes(since=cursor, fields=parse_fields('file_name'))
+            self.assertEqual([item['file_name'] for item in delta['items']], ['new.pdf'])
+        finally:
+            if original is None:
+                os.environ.pop('TZ', None)
+            else:
+                os.environ['TZ'] = original
+            time.tzset()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from services.database_service import Base, SessionLocal, VisaApplication, DocumentAnalysis
+from services.application_store import upsert_applications
+from services.openai_service import OpenAIService
+from core.agent import VisaAgent
+from benchmarks.corpus import generate_corpus
+from benchmarks.fake_drive import FakeDriveService
+from benchmarks.fake_openai import FakeOpenAIClient, LatencyModel
+
+MAIL_CONFIG = {'email_templates': {'verified': {'subject': '{file_name}', 'body': '{score}'}}}
+
+class TestApplicationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        self.original_bind = SessionLocal.kw['bind']
+        self.engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir, 'test.db')}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=self.engine)
+        SessionLocal.configure(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.original_cwd)
+        SessionLocal.configure(bind=self.original_bind)
+        shutil.rmtree(self.tmpdir)
+
+    def test_upsert_updates_in_place_and_keeps_drive_links(self):
+        session = self.Session()
+        try:
+            upsert_applications(session, [{'document_id': 'drive-1', 'file_name': 'Alex/passport.pdf',
+                                           'applicant_id': '1', 'status': 'Needs Review'}])
+            session.commit()
+            upsert_applications(session, [{'document_id': 'zip-9:passport.pdf', 'file_name': 'Alex/passport.pdf',
+                                           'applicant_id': '2', 'status': 'Passed'}])
+            session.commit()
+
+            row = session.query(VisaApplication).one()
+            self.assertEqual((row.document_id, row.applicant_id, row.status), ('drive-1', '1', 'Passed'))
+            self.assertIsNotNone(row.updated_at)
+        finally:
+            session.close()
+
+    def test_analysis_is_stored_apart_and_loaded_on_demand(self):
+        analysis = {'summary': 'Valid passport', 'missing_elements': ['Signature of holder'],
+                    'compliance_status': 'Partial', 'findings': ['Machine readable zone present'] * 50}
+        session = self.Session()
+        try:
+            upsert_applications(session, [{'document_id': 'drive-1', 'file_name': 'passport.pdf', 'ai_analysis': analysis,
+                                           'field_confidence': {'names': 90}, 'ocr_metadata': None}])
+            session.commit()
+
+            row = session.query(VisaApplication).one()
+            self.assertEqual((row.summary, row.missing_elements_count, row.compliance_status),
+                             ('Valid passport', 1, 'Partial'))
+            self.assertNotIn('analysis_record', row.__dict__)
+            self.assertEqual((row.ai_analysis, row.field_confidence), (analysis, {'names': 90}))
+            stored = session.query(DocumentAnalysis).one()
+            self.assertLess(len(stored.payload), stored.raw_size)
+        finally:
+            session.close()
+
+    def test_archive_members_are_written_in_one_statement(self):
+        drive = FakeDriveService()
+        archive = generate_corpus(os.path.join(self.tmpdir, 'corpus'), 1, mix={'zip': 1.0})[0]
+        file_id = drive.add_file('processing', archive)['id']
+        openai_service = OpenAIService(api_key="test")
+        openai_service.client = FakeOpenAIClient(latency=LatencyModel('constant', 0))
+        agent = VisaAgent(drive=drive, openai_service=openai_service, mail_config=MAIL_CONFIG)
+        agent.processing_folder_id, agent.verified_folder_id = 'processing', 'verified'
+
+        statements = []
+        event.listen(self.engine, "before_cursor_execute",
+                     lambda conn, cursor, sql, *args: statements.append(sql) if 'visa_applications' in sql else None)
+        agent.process_file({'id': file_id, 'name': os.path.basename(archive)}, source_folder_id='processing')
+
+        self.assertEqual(len([sql for sql in statements if sql.startswith('INSERT INTO visa_applications')]), 1)
+        # One batched read of the previous values for the stats counters, no lookup per member
+        self.assertEqual(len([sql for sql in statements if sql.startswith('SELECT')]), 1)
+        session = self.Session()
+        try:
+            self.assertEqual(session.query(VisaApplication).count(), 3)
+        finally:
+            session.close()
+
+if __name__ == '__main__':
+    unittest.main()
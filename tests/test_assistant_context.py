@@ -0,0 +1,94 @@
+import unittest
+import threading
+import time
+from unittest.mock import MagicMock, patch
+from types import SimpleNamespace
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.assistant_service import AssistantService
+from services.conversation_store import ConversationStore, SUMMARY_ROLE, summary_message
+from services.token_counter import count_message_tokens
+
+def make_assistant():
+    # Skips __init__, which needs OpenAI and Tavily keys
+    assistant = AssistantService.__new__(AssistantService)
+    assistant.client = MagicMock()
+    assistant.system_prompt = "You are a visa assistant."
+    assistant.conversations = ConversationStore(persist=False)
+    return assistant
+
+class TestAssistantContext(unittest.TestCase):
+
+    def test_prompt_stays_under_the_ceiling(self):
+        assistant = make_assistant()
+        assistant.PROMPT_TOKEN_CEILING = 400
+        assistant.CONTEXT_TOKEN_LIMIT = 100
+        history = [summary_message("subclass 500 student")]
+        history += [{"role": role, "content": f"{role} message {i} " + "word " * 40}
+                    for i in range(6) for role in ("user", "assistant")]
+
+        messages = assistant._build_messages("What next?", context={"documents": ["x" * 50] * 100},
+                                             search_context="\n\nSEARCH RESULTS: " + "result " * 500,
+                                             history=history)
+
+        self.assertLessEqual(count_message_tokens(messages), 400)
+        self.assertEqual(messages[1], history[0])
+        self.assertEqual([m["role"] for m in messages].count("system"), 1)  # Only the system prompt
+        self.assertEqual(messages[-2]["content"], history[-1]["content"])  # Newest history kept
+        self.assertTrue(messages[-1]["content"].startswith("What next?\n\nCONTEXT: "))
+
+    def test_long_history_is_summarised(self):
+        assistant = make_assistant()
+        assistant.HISTORY_TOKEN_BUDGET = 200
+        summary = SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Student visa, passport done"))])
+
+        with patch("services.assistant_service.ledger") as ledger:
+            ledger.tracked_completion.return_value = summary
+            for i in range(4):
+                assistant._remember("alice", f"question {i} " + "detail " * 30, f"answer {i}").result(timeout=5)
+
+        history = assistant.conversations.history("alice")
+        self.assertEqual(history[0]["role"], SUMMARY_ROLE)
+        self.assertEqual(history[0]["content"], "Summary of the earlier conversation: Student visa, passport done")
+        self.assertEqual(history[-1]["content"], "answer 3")
+        self.assertEqual(ledger.tracked_completion.call_args.kwargs["purpose"], "chat_summary")
+
+    def test_reply_is_done_before_the_summary(self):
+        assistant = make_assistant()
+        assistant.HISTORY_TOKEN_BUDGET = 50
+        assistant._needs_search = lambda message: False
+        assistant.conversations.append("alice", {"role": "user", "content": "detail " * 60},
+                                       {"role": "assistant", "content": "noted"})
+        release = threading.Event()
+
+        def slow_summary(*args, **kwargs):
+            release.wait(5)
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="Student visa"))])
+
+        with patch("services.assistant_service.ledger") as ledger:
+            ledger.tracked_stream.return_value = iter(["Hello", " there"])
+            ledger.tracked_completion.side_effect = slow_summary
+            started = time.monotonic()
+            events = list(assistant.chat_stream("And then?", session_id="alice"))
+            self.assertLess(time.monotonic() - started, 2)  # Not held up by the 5s summary
+            self.assertEqual(events[-1], {'event': 'done', 'data': {'response': "Hello there"}})
+            self.assertEqual(assistant.conversations.history("alice")[-1]["content"], "Hello there")
+            pending = assistant._remember("alice", "Thanks", "You're welcome")
+            release.set()
+            pending.result(timeout=5)
+        self.assertEqual(assistant.conversations.history("alice")[0]["role"], SUMMARY_ROLE)
+
+    def test_oversized_questions_are_flagged_and_cut_to_the_ceiling(self):
+        assistant = make_assistant()
+        assistant.PROMPT_TOKEN_CEILING = 400
+        question = "word " * 2000
+        self.assertTrue(assistant.question_too_long(question))
+        self.assertFalse(assistant.question_too_long("What next?"))
+        self.assertLessEqual(count_message_tokens(assistant._build_messages(question)), 400)
+
+if __name__ == '__main__':
+    unittest.main()
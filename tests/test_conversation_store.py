@@ -0,0 +1,125 @@
+import unittest
+import tempfile
+import shutil
+import time
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from services.database_service import Base, ChatMessage
+from services.conversation_store import ConversationStore, SUMMARY_ROLE, SUMMARY_LABEL
+
+def turn(question, answer):
+    return {"role": "user", "content": question}, {"role": "assistant", "content": answer}
+
+class TestConversationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir, 'test.db')}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_sessions_are_separate_and_bounded(self):
+        store = ConversationStore(max_sessions=2, max_messages=4, persist=False)
+        for i in range(3):
+            store.append('alice', *turn(f"q{i}", f"a{i}"))
+        store.append('bob', *turn("hi", "hello"))
+
+        self.assertEqual(len(store.history('bob')), 2)
+        self.assertEqual([m['content'] for m in store.history('alice')], ['q1', 'a1', 'q2', 'a2'])
+
+        # alice was used last, so a third session pushes bob out
+        store.append('carol', *turn("hey", "hi"))
+        self.assertEqual(store.history('bob'), [])
+        self.assertEqual(len(store.history('alice')), 4)
+
+        store.clear('alice')
+        self.assertEqual(store.history('alice'), [])
+
+    def test_idle_sessions_expire(self):
+        store = ConversationStore(ttl_seconds=0.05, persist=False)
+        store.append('alice', *turn("q", "a"))
+        time.sleep(0.1)
+        self.assertEqual(store.history('alice'), [])
+        self.assertEqual(len(store), 0)
+
+    def test_persisted_history_survives_a_restart(self):
+        store = ConversationStore(max_messages=4, persist=True, session_factory=self.Session)
+        for i in range(3):
+            store.append('alice', *turn(f"q{i}", f"a{i}"))
+
+        restarted = ConversationStore(max_messages=4, persist=True, session_factory=self.Session)
+        self.assertEqual([m['content'] for m in restarted.history('alice')], ['q1', 'a1', 'q2', 'a2'])
+
+        session = self.Session()
+        self.assertEqual(session.query(ChatMessage).count(), 4)
+        session.close()
+
+        restarted.clear('alice')
+        self.assertEqual(ConversationStore(persist=True, session_factory=self.Session).history('alice'), [])
+
+    def test_workers_see_each_others_changes(self):
+        first = ConversationStore(max_messages=4, persist=True, session_factory=self.Session)
+        second = ConversationStore(max_messages=4, persist=True, session_factory=self.Session)
+        first.append('alice', *turn("q0", "a0"))
+        self.assertEqual(len(second.history('alice')), 2)
+
+        first.append('alice', *turn("q1", "a1"))
+        second.append('alice', *turn("q2", "a2"))
+        self.assertEqual([m['content'] for m in first.history('alice')], ['q1', 'a1', 'q2', 'a2'])
+        self.assertTrue(first.compact('alice', first.history('alice')[:2], "Asked q1"))
+        self.assertEqual(second.history('alice')[0], {"role": SUMMARY_ROLE, "content": f"{SUMMARY_LABEL}: Asked q1"})
+
+        second.clear('alice')
+        self.assertEqual(first.history('alice'), [])
+        self.assertEqual(len(first), 0)
+
+    def test_compaction_keeps_the_summary_in_front(self):
+        store = ConversationStore(max_messages=4, persist=True, session_factory=self.Session)
+        for i in range(2):
+            store.append('alice', *turn(f"q{i}", f"a{i}"))
+        older = store.history('alice')[:2]
+
+        self.assertTrue(store.compact('alice', older, "Asked q0"))
+        self.assertFalse(store.compact('alice', older, "Asked q0 again"))
+        for i in range(2, 5):
+            store.append('alice', *turn(f"q{i}", f"a{i}"))
+
+        expected = [(SUMMARY_ROLE, f"{SUMMARY_LABEL}: Asked q0"), ("user", "q3"), ("assistant", "a3"), ("user", "q4"), ("assistant", "a4")]
+        self.assertEqual([(m['role'], m['content']) for m in store.history('alice')], expected)
+        restarted = ConversationStore(max_messages=4, persist=True, session_factory=self.Session)
+        self.assertEqual([(m['role'], m['content']) for m in restarted.history('alice')], expected)
+
+    def test_summaries_stored_as_system_messages_are_read_as_assistant_ones(self):
+        store = ConversationStore(max_messages=2, persist=True, session_factory=self.Session)
+        store.append('alice', *turn("q0", "a0"))
+        session = self.Session()
+        try:
+            first = session.query(ChatMessage).order_by(ChatMessage.id).first()
+            first.role, first.content = "system", "Asked q0"
+            session.delete(session.query(ChatMessage).order_by(ChatMessage.id.desc()).first())
+            session.commit()
+        finally:
+            session.close()
+
+        restarted = ConversationStore(max_messages=2, persist=True, session_factory=self.Session)
+        restarted.append('alice', *turn("q1", "a1"))
+        restarted.append('alice', *turn("q2", "a2"))
+        history = restarted.history('alice')
+        self.assertEqual(history[0], {"role": SUMMARY_ROLE, "content": f"{SUMMARY_LABEL}: Asked q0"})
+        self.assertEqual([m['content'] for m in history[1:]], ['q2', 'a2'])
+        self.assertTrue(restarted.compact('alice', history[:2], "Asked q0 and q2"))
+        self.assertEqual(ConversationStore(persist=True, session_factory=self.Session).history('alice')[0],
+                         {"role": SUMMARY_ROLE, "content": f"{SUMMARY_LABEL}: Asked q0 and q2"})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+import tempfile
+import shutil
+import threading
+from contextlib import contextmanager
+from types import SimpleNamespace
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+
+from services.database_service import Base, SessionLocal, VisaApplication, DocumentLease
+from services.openai_service import OpenAIService
+from core.agent import VisaAgent
+from core.dispatcher import Dispatcher, LocalExecutor, ModalExecutor, run_task
+from benchmarks.corpus import generate_corpus
+from benchmarks.fake_drive import FakeDriveService
+from benchmarks.fake_openai import FakeOpenAIClient, LatencyModel
+
+MAIL_CONFIG = {'email_templates': {'verified': {'subject': '{file_name}', 'body': '{score}'}}}
+
+class TestDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.original_cwd = os.getcwd()
+        self.original_bind = SessionLocal.kw['bind']
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir, 'test.db')}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        SessionLocal.configure(bind=engine)
+        os.chdir(self.tmpdir)
+
+        self.drive = FakeDriveService()
+        self.files = generate_corpus(os.path.join(self.tmpdir, 'corpus'), 4, mix={'text_pdf': 0.5, 'zip': 0.5})
+        for path in self.files:
+            self.drive.add_file('incoming', path)
+        self.client = FakeOpenAIClient(latency=LatencyModel('constant', 0))
+
+    def tearDown(self):
+        os.chdir(self.original_cwd)
+        SessionLocal.configure(bind=self.original_bind)
+        shutil.rmtree(self.tmpdir)
+
+    def make_agent(self):
+        openai_service = OpenAIService(api_key="test")
+        openai_service.client = self.client
+        agent = VisaAgent(drive=self.drive, openai_service=openai_service, mail_config=MAIL_CONFIG)
+        agent.incoming_folder_id, agent.processing_folder_id = 'incoming', 'processing'
+        agent.verified_folder_id, agent.needs_review_folder_id = 'verified', 'needs_review'
+        return agent
+
+    def count_downloads(self):
+        downloads = []
+        download_file = self.drive.download_file
+        self.drive.download_file = lambda file_id, path: downloads.append(file_id) or download_file(file_id, path)
+        return downloads
+
+    def test_fans_out_files_and_archive_members(self):
+        archives = [p for p in self.files if p.endswith('.zip')]
+        dispatcher = Dispatcher(self.make_agent(), LocalExecutor(max_concurrency=3, agent_factory=self.make_agent))
+        downloads = self.count_downloads()
+
+        summary = dispatcher.run()
+
+        # Each file is downloaded once; member tasks share the dispatcher's copy of the archive
+        self.assertEqual(len(downloads), 4)
+
+        self.assertEqual(summary['files'], 4)
+        self.assertEqual(summary['tasks'], 4 - len(archives) + 3 * len(archives))
+        self.assertEqual(summary['outcomes'].get('error', 0), 0)
+        self.assertEqual(self.drive.count('verified'), 4)
+
+        session = SessionLocal()
+        try:
+            self.assertEqual(session.query(VisaApplication).count(), summary['tasks'])
+            leases = session.query(DocumentLease).all()
+            self.assertTrue(all(lease.status == 'done' for lease in leases))
+            self.assertEqual(sorted(lease.result['tasks'] for lease in leases),
+                             sorted(3 if lease.file_name.endswith('.zip') else 1 for lease in leases))
+        finally:
+            session.close()
+
+        # Nothing is left for a second dispatcher
+        self.assertEqual(Dispatcher(self.make_agent(), LocalExecutor()).run()['files'], 0)
+
+    def test_remote_member_tasks_carry_their_member(self):
+        # A remote executor's containers can't see the dispatcher's copy of the archive
+        function = SimpleNamespace(map=lambda tasks, **options: [run_task(task, self.make_agent) for task in tasks])
+        downloads = self.count_downloads()
+
+        summary = Dispatcher(self.make_agent(), ModalExecutor(function)).run()
+
+        self.assertEqual(summary['outcomes'].get('error', 0), 0)
+        self.assertEqual(len(downloads), 4)
+        self.assertEqual(self.drive.count('verified'), 4)
+
+    def test_failed_documents_and_lost_leases_are_not_completed(self):
+        agent = self.make_agent()
+        pdf = next(f for f in self.drive.list_files_in_folder('incoming') if f['name'].endswith('.pdf'))
+
+        # OpenAIService returns None on API errors; the file must stay retryable
+        agent.openai.classify_document = lambda text: None
+        self.assertTrue(agent.leases.claim(pdf['id'], pdf['name']))
+        agent.process_claimed_file(pdf)
+        self.assertEqual(agent.leases.get(pdf['id']).status, 'released')
+        self.assertEqual(self.drive.count('processing'), 1)
+
+        # A worker whose lease was lost writes nothing and leaves the lease alone
+        agent = self.make_agent()
+        lost = threading.Event()
+        lost.set()
+
+        @contextmanager
+        def lost_keep_alive(file_ids):
+            yield lost
+
+        agent.leases.keep_alive = lost_keep_alive
+        self.assertTrue(agent.leases.claim(pdf['id'], pdf['name']))
+        agent.process_claimed_file(pdf, source_folder_id='processing')
+        self.assertEqual(agent.leases.get(pdf['id']).status, 'claimed')
+        session = SessionLocal()
+        try:
+            self.assertEqual(session.query(VisaApplication).count(), 0)
+        finally:
+            session.close()
+
+    def test_processed_file_put_back_into_incoming_is_processed_again(self):
+        executor = lambda: LocalExecutor(agent_factory=self.make_agent)
+        self.assertEqual(Dispatcher(self.make_agent(), executor()).run()['files'], 4)
+        done = next(f for f in self.drive.list_files_in_folder('verified') if f['name'].endswith('.pdf'))
+        self.drive.move_file(done['id'], 'verified', 'incoming')
+
+        summary = Dispatcher(self.make_agent(), executor()).run()
+
+        self.assertEqual((summary['files'], summary['tasks']), (1, 1))
+        self.assertEqual(self.drive.count('incoming'), 0)
+        lease = self.make_agent().leases.get(done['id'])
+        self.assertEqual((lease.status, lease.attempts), ('done', 1))
+
+if __name__ == '__main__':
+    unittest.main()
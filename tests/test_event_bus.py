@@ -0,0 +1,93 @@
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from services.database_service import Base, VisaApplication, Notification, ChangeEvent
+from services.application_store import upsert_applications
+from services.event_bus import EventBus, format_sse
+
+class TestEventBus(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir, 'test.db')}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        self.bus = EventBus(session_factory=self.Session, poll_interval=3600, stats_provider=lambda: {'total': 1})
+
+    def tearDown(self):
+        self.bus.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, job):
+        session = self.Session()
+        try:
+            job(session)
+            session.commit()
+        finally:
+            session.close()
+
+    def drain(self, subscription):
+        messages = []
+        while True:
+            message = subscription.get(timeout=0.05)
+            if message is None:
+                return messages
+            messages.append(message)
+
+    def test_changes_from_orm_and_upserts_reach_subscribers(self):
+        subscription = self.bus.subscribe()
+        self.write(lambda s: upsert_applications(s, [{'document_id': 'd1', 'file_name': 'passport.pdf'}]))
+        self.write(lambda s: s.add(Notification(document_id='d1', notification_type='verification_needed')))
+        self.write(lambda s: setattr(s.query(VisaApplication).one(), 'status', 'Passed'))
+        self.bus.poll_once()
+
+        messages = self.drain(subscription)
+        self.assertEqual([(m['event'], m['data'].get('action')) for m in messages], [
+            ('application', 'upserted'), ('notification', 'created'), ('application', 'updated'), ('stats', None)])
+        self.assertEqual(messages[1]['data']['payload']['notification_type'], 'verification_needed')
+        self.assertTrue(format_sse(messages[0]).startswith(f"id: {messages[0]['id']}\nevent: application\n"))
+
+    def test_resume_replays_missed_events_or_resets(self):
+        for name in ('a.pdf', 'b.pdf', 'c.pdf'):
+            self.write(lambda s, name=name: upsert_applications(s, [{'document_id': name, 'file_name': name}]))
+        session = self.Session()
+        first = session.query(ChangeEvent).order_by(ChangeEvent.id).first().id
+        session.close()
+
+        resumed = self.bus.subscribe(last_event_id=first)
+        self.assertEqual([m['data']['entity_id'] for m in self.drain(resumed)], ['2', '3'])
+
+        self.write(lambda s: s.query(ChangeEvent).filter(ChangeEvent.id <= first + 1).delete())
+        behind = self.bus.subscribe(last_event_id=first)
+        self.assertEqual([m['event'] for m in self.drain(behind)], ['reset'])
+
+    def test_events_committed_out_of_id_order_are_still_delivered(self):
+        event = lambda id: ChangeEvent(id=id, topic='application', action='updated', entity_id=str(id), payload={})
+        subscription = self.bus.subscribe()
+        self.bus.stop()  # Poll by hand only, so the ids land in a known order
+        self.write(lambda s: s.add(event(1)))
+        self.bus.poll_once()
+        # Id 2 was handed out first but its transaction commits after id 3's
+        self.write(lambda s: s.add(event(3)))
+        self.bus.poll_once()
+        self.assertEqual(self.bus.cursor, 1)
+        self.write(lambda s: s.add(event(2)))
+        self.bus.poll_once()
+
+        events = [m for m in self.drain(subscription) if m['event'] == 'application']
+        self.assertEqual([m['data']['id'] for m in events], [1, 3, 2])
+        # Resuming from 3's SSE id must not skip 2, which was still in flight
+        self.assertEqual([m['id'] for m in events], [1, 1, 3])
+        self.assertEqual(self.bus.cursor, 3)
+
+if __name__ == '__main__':
+    unittest.main()
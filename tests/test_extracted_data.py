@@ -0,0 +1,77 @@
+import unittest
+import datetime
+import tempfile
+import shutil
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from services.database_service import Base, ExtractedDate, ExtractedReference
+from services.application_store import upsert_applications
+from services.extracted_data_service import ExtractedDataService, backfill
+
+def analysis(reference, expiry, names=('Alex Citizen',)):
+    return {'extracted_data': {
+        'names': list(names),
+        'dates': {'expiry_date': expiry, 'issue_date': 'YYYY-MM-DD', 'other_dates': {'Translation Date': '2026-09-01'}},
+        'reference_numbers': [reference]
+    }}
+
+class TestExtractedData(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir, 'test.db')}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        self.service = ExtractedDataService(session_factory=self.Session)
+        session = self.Session()
+        try:
+            upsert_applications(session, [
+                {'document_id': 'd1', 'file_name': 'Alex/passport.pdf', 'applicant_id': '1', 'document_type': 'Passport',
+                 'ai_analysis': analysis('PA 123-4567', '2030-05-01')},
+                {'document_id': 'd2', 'file_name': 'Sam/translation.pdf', 'applicant_id': '2',
+                 'document_type': 'Certified Translation', 'ai_analysis': analysis('pa1234567', '2026-10-20', ['Sam Lee'])},
+            ])
+            session.commit()
+        finally:
+            session.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_cross_document_lookups(self):
+        expiring = self.service.documents_with_date('expiry_date', datetime.datetime(2026, 10, 1),
+                                                    datetime.datetime(2026, 11, 1), document_type='translation')
+        self.assertEqual([(d['document_id'], d['date']) for d in expiring], [('d2', '2026-10-20')])
+        self.assertEqual(len(self.service.documents_with_date('translation_date')), 2)
+        self.assertEqual([d['document_id'] for d in self.service.documents_with_reference('PA1234567')], ['d1', 'd2'])
+        self.assertEqual([d['document_id'] for d in self.service.documents_with_name('  sam LEE ')], ['d2'])
+        self.assertEqual(self.service.shared_references(),
+                         [{'reference': 'PA1234567', 'applicants': 2, 'documents': 2}])
+
+    def test_reprocessing_and_backfill_replace_rows(self):
+        session = self.Session()
+        try:
+            upsert_applications(session, [{'document_id': 'd2', 'file_name': 'Sam/translation.pdf',
+                                           'ai_analysis': analysis('X999', '2027-01-01')}])
+            session.commit()
+            self.assertEqual(self.service.documents_with_reference('PA1234567')[0]['document_id'], 'd1')
+
+            session.query(ExtractedReference).delete()
+            session.query(ExtractedDate).delete()
+            session.commit()
+        finally:
+            session.close()
+
+        self.assertEqual(backfill(self.Session, batch_size=1), 2)
+        self.assertEqual([d['document_id'] for d in self.service.documents_with_reference('x-999')], ['d2'])
+        self.assertEqual(len(self.service.documents_with_date('expiry_date')), 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from types import SimpleNamespace
+import time
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from services.database_service import Base, LLMCall
+from services.llm_ledger_service import LLMLedgerService
+from services.openai_service import OpenAIService
+from benchmarks.fake_openai import CompletionSimulator, LatencyModel
+from benchmarks.fake_openai_server import FakeOpenAIServer
+
+class TestFakeOpenAIServer(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        ledger = LLMLedgerService(session_factory=self.Session, backoff_seconds=0)
+        self.ledger_patcher = patch('services.openai_service.ledger', ledger)
+        self.ledger_patcher.start()
+
+    def tearDown(self):
+        self.ledger_patcher.stop()
+        self.server.stop()
+
+    def start_server(self, **options):
+        simulator = CompletionSimulator(latency=LatencyModel('constant', 0), **options)
+        self.server = FakeOpenAIServer(simulator, port=0).start()
+        return OpenAIService(api_key="test", base_url=self.server.url)
+
+    def test_service_schemas_and_token_accounting(self):
+        service = self.start_server()
+
+        classification = service.classify_document("Document Type: Passport\nFull Name: Alex Citizen")
+        analysis = service.analyze_document("Document Type: Passport", "189", "Passport")
+
+        self.assertEqual(classification["document_type"], "Passport")
+        self.assertIn("expiry_date", analysis["extracted_data"]["dates"])
+        self.assertIn("confidence_score", analysis)
+
+        session = self.Session()
+        calls = session.query(LLMCall).order_by(LLMCall.id).all()
+        session.close()
+        self.assertEqual([c.purpose for c in calls], ["classify", "analyze"])
+        self.assertEqual(sum(c.prompt_tokens for c in calls), self.server.simulator.stats["prompt_tokens"])
+
+    def test_rate_limits_are_retried_by_the_ledger(self):
+        service = self.start_server(rate_limit_rate=1.0)
+
+        sleep = MagicMock()
+        with patch('services.llm_ledger_service.time', SimpleNamespace(perf_counter=time.perf_counter, sleep=sleep)):
+            self.assertIsNone(service.classify_document("Document Type: Passport"))
+        # The server's Retry-After: 1 wins over the ledger's zero backoff
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [1.0, 1.0])
+
+        session = self.Session()
+        call = session.query(LLMCall).one()
+        session.close()
+        self.assertFalse(call.success)
+        self.assertEqual(self.server.simulator.stats["rate_limited"], call.retries + 1)
+
+if __name__ == '__main__':
+    unittest.main()
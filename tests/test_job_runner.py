@@ -0,0 +1,128 @@
+import unittest
+import datetime
+import tempfile
+import shutil
+import time
+import threading
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from services.database_service import Base, Job
+from services.job_runner import JobRunner, stage_progress
+
+class TestJobRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir, 'test.db')}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        self.runner = JobRunner(session_factory=self.Session, max_workers=1)
+
+    def tearDown(self):
+        self.runner.shutdown(wait=True)
+        shutil.rmtree(self.tmpdir)
+
+    def wait(self, job_id, timeout=5):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = self.runner.get(job_id)
+            if job['status'] in ('succeeded', 'failed'):
+                return job
+            time.sleep(0.02)
+        self.fail(f"Job {job_id} did not finish")
+
+    def test_jobs_run_in_the_background_and_record_results(self):
+        def count(params, progress):
+            report = stage_progress(progress, 1, 2, 'Counting')
+            for done in range(params['n']):
+                report(done, params['n'])
+            return {'counted': params['n']}
+
+        def broken(params, progress):
+            raise RuntimeError("mail server down")
+
+        self.runner.register('count', count)
+        self.runner.register('broken', broken)
+        submitted = self.runner.submit('count', {'n': 3})
+        self.assertEqual(submitted['status'], 'queued')
+
+        done = self.wait(submitted['id'])
+        self.assertEqual((done['status'], done['progress'], done['result']), ('succeeded', 1.0, {'counted': 3}))
+        failed = self.wait(self.runner.submit('broken')['id'])
+        self.assertEqual((failed['status'], failed['error']), ('failed', 'mail server down'))
+        self.assertEqual([job['kind'] for job in self.runner.recent()], ['broken', 'count'])
+        with self.assertRaises(ValueError):
+            self.runner.submit('unknown')
+
+    def test_jobs_of_a_dead_worker_are_marked_failed(self):
+        stale = datetime.datetime.now() - datetime.timedelta(hours=1)
+        session = self.Session()
+        try:
+            session.add(Job(id='abc', kind='count', status='running', created_at=stale, updated_at=stale))
+            session.commit()
+        finally:
+            session.close()
+
+        self.assertEqual(self.runner.fail_interrupted(), 1)
+        self.assertEqual(self.runner.get('abc')['status'], 'failed')
+
+    def test_quiet_running_jobs_keep_a_heartbeat(self):
+        runner = JobRunner(session_factory=self.Session, max_workers=1, heartbeat_interval=0.05)
+        release = threading.Event()
+        runner.register('quiet', lambda params, progress: release.wait(5))
+        try:
+            job_id = runner.submit('quiet')['id']
+            time.sleep(0.5)
+            # No progress for longer than stale_after, yet another worker sees the job alive
+            self.assertEqual(self.runner.fail_interrupted(stale_after=0.3), 0)
+            self.assertEqual(runner.get(job_id)['status'], 'running')
+            release.set()
+            self.assertEqual(self.wait(job_id)['status'], 'succeeded')
+        finally:
+            release.set()
+            runner.shutdown(wait=True)
+
+    def test_orphaned_jobs_fail_while_the_runner_is_up(self):
+        stale = datetime.datetime.now() - datetime.timedelta(hours=1)
+        session = self.Session()
+        try:
+            session.add(Job(id='polled', kind='count', status='running', created_at=stale, updated_at=stale))
+            session.add(Job(id='listed', kind='count', status='queued', created_at=stale, updated_at=stale))
+            older = stale - datetime.timedelta(hours=1)
+            session.add(Job(id='swept', kind='count', status='running', created_at=older, updated_at=older))
+            session.commit()
+        finally:
+            session.close()
+
+        # A poll ends even though no runner started since the job's worker died
+        self.assertEqual(self.runner.get('polled')['status'], 'failed')
+        self.assertEqual({job['id']: job['status'] for job in self.runner.recent(limit=2)},
+                         {'polled': 'failed', 'listed': 'failed'})
+
+        runner = JobRunner(session_factory=self.Session, max_workers=1, heartbeat_interval=0.05, stale_after=0.2)
+        try:
+            runner.register('noop', lambda params, progress: None)
+            runner.submit('noop')
+            deadline = time.monotonic() + 5
+            while time.monotonic() < deadline and self.status('swept') != 'failed':
+                time.sleep(0.05)
+            self.assertEqual(self.status('swept'), 'failed')
+        finally:
+            runner.shutdown(wait=True)
+
+    def status(self, job_id):
+        session = self.Session()
+        try:
+            return session.get(Job, job_id).status
+        finally:
+            session.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest
+import datetime
+import tempfile
+import threading
+import shutil
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from services.database_service import Base
+from services.lease_service import LeaseService
+
+class TestDocumentLeases(unittest.TestCase):
+
+    def setUp(self):
+        # A file database so concurrent claims use separate connections
+        self.tmpdir = tempfile.mkdtemp()
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir, 'leases.db')}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def worker(self, name, **options):
+        return LeaseService(session_factory=self.Session, worker_id=name, **options)
+
+    def test_only_one_concurrent_claim_wins(self):
+        workers = [self.worker(f"w{i}") for i in range(8)]
+        results = {}
+        barrier = threading.Barrier(len(workers))
+
+        def claim(service):
+            barrier.wait()
+            results[service.worker_id] = service.claim("file-1", "passport.pdf")
+
+        threads = [threading.Thread(target=claim, args=(w,)) for w in workers]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(sum(results.values()), 1)
+
+    def test_expired_lease_is_reclaimed_and_old_owner_loses_it(self):
+        crashed = self.worker("crashed", ttl_seconds=-1)  # Lease is expired as soon as it is taken
+        healthy = self.worker("healthy")
+
+        self.assertTrue(crashed.claim("file-1"))
+        self.assertTrue(healthy.claim("file-1"))
+        self.assertFalse(crashed.heartbeat("file-1"))
+
+        lease = healthy.get("file-1")
+        self.assertEqual(lease.owner, "healthy")
+        self.assertEqual(lease.attempts, 2)
+
+        self.assertTrue(healthy.complete("file-1"))
+        self.assertFalse(self.worker("late").claim("file-1"))
+
+    def test_failures_are_retried_until_attempts_run_out(self):
+        first = self.worker("first", max_attempts=2)
+        second = self.worker("second", max_attempts=2)
+
+        self.assertTrue(first.claim("file-1"))
+        self.assertEqual(first.release("file-1", error="OCR timeout"), "released")
+        self.assertTrue(second.claim("file-1"))
+        self.assertEqual(second.release("file-1", error="OCR timeout"), "failed")
+        self.assertFalse(first.claim("file-1"))
+
+    def test_file_put_back_into_incoming_is_claimed_again(self):
+        worker = self.worker("w", max_attempts=1)
+        self.assertTrue(worker.claim("done-file"))
+        self.assertTrue(worker.complete("done-file"))
+        self.assertTrue(worker.claim("failed-file"))
+        self.assertEqual(worker.release("failed-file", error="OCR timeout"), "failed")
+
+        # A listing from before the lease ended is stale; the file was still being processed
+        stale = datetime.datetime.now() - datetime.timedelta(seconds=5)
+        self.assertFalse(worker.claim("done-file", seen_at=stale))
+        self.assertFalse(worker.claim("done-file"))
+
+        # Re-uploaded with the same Drive ID and listed again
+        listed_at = datetime.datetime.now() + datetime.timedelta(seconds=1)
+        other = self.worker("other", max_attempts=1)
+        self.assertTrue(other.claim("done-file", seen_at=listed_at))
+        self.assertTrue(other.claim("failed-file", seen_at=listed_at))
+        self.assertFalse(worker.claim("failed-file", seen_at=listed_at))
+        lease = other.get("failed-file")
+        self.assertEqual((lease.owner, lease.status, lease.attempts, lease.error), ("other", "claimed", 1, None))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import unittest
+from unittest.mock import MagicMock
+from types import SimpleNamespace
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import httpx
+import openai
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from services.database_service import Base, LLMCall, VisaApplication
+from services.llm_ledger_service import LLMLedgerService, estimate_cost, retry_after_seconds, MAX_RETRY_AFTER_SECONDS
+
+def make_response(model="gpt-4o-mini", prompt_tokens=1000, completion_tokens=200, cached_tokens=0):
+    usage = SimpleNamespace(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens)
+    )
+    return SimpleNamespace(model=model, usage=usage, choices=[])
+
+def rate_limit_error(headers=None):
+    request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+    return openai.RateLimitError("Rate limited", response=httpx.Response(429, request=request, headers=headers),
+                                 body=None)
+
+class TestLLMLedger(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        self.ledger = LLMLedgerService(session_factory=self.Session, backoff_seconds=0)
+        self.client = MagicMock()
+        self.create = self.client.with_options.return_value.chat.completions.create
+
+    def test_records_usage_retries_and_cost(self):
+        self.create.side_effect = [rate_limit_error(), make_response(cached_tokens=400)]
+
+        self.ledger.tracked_completion(self.client, purpose="classify", document_id="doc-1",
+                                       applicant_id=7, model="gpt-4o-mini", messages=[])
+
+        session = self.Session()
+        call = session.query(LLMCall).one()
+        session.close()
+        self.assertEqual(call.retries, 1)
+        self.assertTrue(call.cache_hit)
+        self.assertEqual(call.prompt_tokens, 1000)
+        self.assertEqual(call.applicant_id, "7")
+        self.assertAlmostEqual(call.cost_usd, estimate_cost("gpt-4o-mini", 1000, 200, 400))
+
+    def test_failures_are_recorded_and_raised(self):
+        self.create.side_effect = rate_limit_error()
+
+        with self.assertRaises(openai.RateLimitError):
+            self.ledger.tracked_completion(self.client, purpose="analyze", model="gpt-4o", messages=[])
+
+        session = self.Session()
+        call = session.query(LLMCall).one()
+        session.close()
+        self.assertFalse(call.success)
+        self.assertEqual(call.retries, self.ledger.max_retries)
+
+    def test_streams_record_usage_from_the_final_chunk(self):
+        def chunk(text=None, usage=None):
+            choices = [SimpleNamespace(delta=SimpleNamespace(content=text))] if text is not None else []
+            return SimpleNamespace(model="gpt-4o", choices=choices, usage=usage)
+
+        final = make_response(model="gpt-4o", prompt_tokens=120, completion_tokens=3).usage
+        self.create.side_effect = [rate_limit_error(), iter([chunk(""), chunk("Hel"), chunk("lo"), chunk(usage=final)])]
+
+        parts = list(self.ledger.tracked_stream(self.client, purpose="chat", model="gpt-4o", messages=[]))
+
+        self.assertEqual(parts, ["Hel", "lo"])
+        self.assertTrue(self.create.call_args.kwargs["stream"])
+        session = self.Session()
+        call = session.query(LLMCall).one()
+        session.close()
+        self.assertEqual((call.success, call.retries, call.prompt_tokens, call.completion_tokens), (True, 1, 120, 3))
+
+    def test_aggregates_attribute_calls_through_documents(self):
+        session = self.Session()
+        session.add(VisaApplication(document_id="doc-1", document_type="Passport", applicant_id="3"))
+        session.commit()
+        session.close()
+
+        self.create.return_value = make_response(model="gpt-4o", prompt_tokens=100, completion_tokens=50)
+        for purpose in ("classify", "analyze"):
+            self.ledger.tracked_completion(self.client, purpose=purpose, document_id="doc-1", model="gpt-4o", messages=[])
+
+        tokens = self.ledger.tokens_by_document_type()
+        self.assertEqual(tokens["Passport"]["calls"], 2)
+        self.assertEqual(tokens["Passport"]["tokens_per_document"], 300)
+        self.assertEqual(self.ledger.cost_by_applicant()["3"]["calls"], 2)
+        self.assertEqual(self.ledger.latency_p95_by_model()["gpt-4o"]["calls"], 2)
+
+    def test_retry_after_is_honoured_and_capped(self):
+        self.assertEqual(retry_after_seconds(rate_limit_error({"retry-after": "3"})), 3.0)
+        self.assertEqual(retry_after_seconds(rate_limit_error({"retry-after-ms": "250"})), 0.25)
+        self.assertEqual(retry_after_seconds(rate_limit_error({"retry-after": "3600"})), MAX_RETRY_AFTER_SECONDS)
+        self.assertIsNone(retry_after_seconds(rate_limit_error()))
+        self.assertEqual(self.ledger._retry_delay(rate_limit_error(), 2), 0)  # Falls back to the backoff
+
+if __name__ == '__main__':
+    unittest.main()
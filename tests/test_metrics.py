@@ -0,0 +1,56 @@
+import unittest
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from services.database_service import Base
+from services.metrics_service import MetricsService, format_labels, parse_labels
+
+class TestMetricsService(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+
+    def test_flushes_from_several_processes_accumulate(self):
+        agent = MetricsService(session_factory=self.Session)
+        scheduler = MetricsService(session_factory=self.Session)
+
+        agent.inc("visa_agent_files_total", outcome="processed")
+        agent.inc("visa_agent_files_total", outcome="processed")
+        scheduler.inc("visa_agent_files_total", outcome="processed")
+        agent.set_gauge("visa_agent_inbox_depth", 4)
+        agent.flush()
+        scheduler.flush()
+
+        text = agent.render_prometheus()
+        self.assertIn('visa_agent_files_total{outcome="processed"} 3', text)
+        self.assertIn('# TYPE visa_agent_inbox_depth gauge', text)
+        self.assertIn('visa_agent_inbox_depth 4', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        service = MetricsService(session_factory=self.Session, buckets=(1, 5))
+        service.observe("visa_agent_file_seconds", 0.5)
+        service.observe("visa_agent_file_seconds", 3)
+        service.flush()
+
+        text = service.render_prometheus()
+        self.assertIn('visa_agent_file_seconds_bucket{le="1"} 1', text)
+        self.assertIn('visa_agent_file_seconds_bucket{le="5"} 2', text)
+        self.assertIn('visa_agent_file_seconds_bucket{le="+Inf"} 2', text)
+        self.assertIn('visa_agent_file_seconds_sum 3.5', text)
+
+    def test_labels_round_trip(self):
+        labels = {'endpoint': '/api/applicant/<applicant_id>/readiness', 'status': 200}
+        self.assertEqual(parse_labels(format_labels(labels)),
+                         {'endpoint': '/api/applicant/<applicant_id>/readiness', 'status': '200'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+import tempfile
+import shutil
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from services.database_service import Base, DocumentAnalysis, build_engine
+from services.migrations import MIGRATIONS, applied_versions, run_migrations, check_query_plans
+
+class TestMigrations(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.engine = build_engine(f"sqlite:///{os.path.join(self.tmpdir, 'legacy.db')}")
+        # A database from before the trust features and the index set
+        with self.engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE visa_applications (id INTEGER PRIMARY KEY, document_id VARCHAR(255) UNIQUE NOT NULL, "
+                "applicant_id VARCHAR(255), file_name VARCHAR(500), status VARCHAR(50), upload_date TIMESTAMP, "
+                "expiry_date TIMESTAMP, updated_at TIMESTAMP, ai_analysis JSON)"
+            ))
+            conn.execute(text("INSERT INTO visa_applications (document_id, file_name) VALUES ('doc-1', 'passport.pdf')"))
+            conn.execute(text("INSERT INTO visa_applications (document_id, file_name, ai_analysis) VALUES "
+                              "('doc-2', 'passport.pdf', '{\"summary\": \"Valid passport\", \"missing_elements\": []}')"))
+        Base.metadata.create_all(bind=self.engine)
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.tmpdir)
+
+    def test_upgrades_legacy_schema_once(self):
+        self.assertEqual(run_migrations(self.engine), [version for version, _, _ in MIGRATIONS])
+        self.assertEqual(run_migrations(self.engine), [])
+        self.assertEqual(applied_versions(self.engine), {version for version, _, _ in MIGRATIONS})
+
+        inspector = inspect(self.engine)
+        self.assertIn('confidence_score', {c['name'] for c in inspector.get_columns('visa_applications')})
+        indexes = {i['name']: i for i in inspector.get_indexes('visa_applications')}
+        self.assertTrue(indexes['uq_visa_applications_file_name']['unique'])
+        with self.engine.connect() as conn:
+            # The newer of the two duplicate rows stays hot, the other is archived
+            self.assertEqual(conn.execute(text("SELECT document_id, verification_status FROM visa_applications")).all(),
+                             [('doc-2', 'pending')])
+            self.assertEqual(conn.execute(text("SELECT archive_reason FROM visa_applications_archive")).scalar(), 'duplicate')
+
+    def test_moves_analysis_to_side_table(self):
+        run_migrations(self.engine)
+
+        self.assertNotIn('ai_analysis', {c['name'] for c in inspect(self.engine).get_columns('visa_applications')})
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.execute(text("SELECT summary, missing_elements_count FROM visa_applications")).all(),
+                             [('Valid passport', 0)])
+        session = sessionmaker(bind=self.engine)()
+        try:
+            self.assertEqual(session.query(DocumentAnalysis).one().data['ai_analysis'],
+                             {'summary': 'Valid passport', 'missing_elements': []})
+        finally:
+            session.close()
+
+    def test_hot_queries_use_their_indexes(self):
+        run_migrations(self.engine)
+        for name, (uses_index, plan) in check_query_plans(self.engine).items():
+            self.assertTrue(uses_index, f"{name} does not use its index: {plan}")
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import datetime
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from services.database_service import Base, VisaApplication, AuditLog, ArchivedVisaApplication
+from services.retention_service import RetentionService
+
+class TestRetention(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        self.retention = RetentionService(session_factory=self.Session, hot_days=30, audit_hot_days=30, batch_size=2)
+
+        now = datetime.datetime.now()
+        old = now - datetime.timedelta(days=400)
+        session = self.Session()
+        try:
+            for i in range(5):
+                session.add(VisaApplication(document_id=f"old-{i}", applicant_id="7", file_name=f"old-{i}.pdf",
+                                            upload_date=old, updated_at=old, verification_status='verified'))
+            session.add(VisaApplication(document_id="pending", applicant_id="7", upload_date=old, updated_at=old,
+                                        verification_status='pending'))
+            session.add(VisaApplication(document_id="expiring", applicant_id="7", upload_date=old, updated_at=old,
+                                        verification_status='verified', expiry_date=now + datetime.timedelta(days=60)))
+            session.add(VisaApplication(document_id="recent", applicant_id="7", upload_date=now, updated_at=now,
+                                        verification_status='verified'))
+            session.add(AuditLog(document_id="old-0", action="processed", timestamp=old))
+            session.add(AuditLog(document_id="recent", action="processed", timestamp=now))
+            session.commit()
+        finally:
+            session.close()
+
+    def hot_document_ids(self):
+        session = self.Session()
+        try:
+            return sorted(row.document_id for row in session.query(VisaApplication))
+        finally:
+            session.close()
+
+    def test_moves_only_cold_rows_in_batches(self):
+        self.assertEqual(self.retention.run(max_batches=1), {'visa_applications': 2, 'audit_log': 1})
+        self.assertEqual(self.retention.run(), {'visa_applications': 3, 'audit_log': 0})
+        self.assertEqual(self.hot_document_ids(), ['expiring', 'pending', 'recent'])
+
+        session = self.Session()
+        try:
+            self.assertEqual(session.query(ArchivedVisaApplication).count(), 5)
+        finally:
+            session.close()
+
+    def test_archived_documents_stay_searchable(self):
+        self.retention.run()
+
+        record = self.retention.find_application(file_name="old-3.pdf")
+        self.assertEqual(record['tier'], 'archive')
+        self.assertEqual(record['document_id'], "old-3")
+        self.assertEqual(self.retention.find_application(document_id="recent")['tier'], 'hot')
+
+        history = self.retention.applicant_history("7")
+        self.assertEqual(len(history), 8)
+        self.assertEqual(history[0]['document_id'], "recent")
+
+if __name__ == '__main__':
+    unittest.main()
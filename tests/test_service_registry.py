@@ -0,0 +1,53 @@
+import unittest
+import threading
+import time
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from services.service_registry import ServiceRegistry
+
+class TestServiceRegistry(unittest.TestCase):
+
+    def test_built_once_across_threads(self):
+        registry = ServiceRegistry()
+        built = []
+
+        def slow_factory():
+            time.sleep(0.05)
+            built.append(object())
+            return built[-1]
+
+        registry.register('slow', slow_factory)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.get('slow'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(built), 1)
+        self.assertTrue(all(result is built[0] for result in results))
+
+    def test_failed_builds_are_retried_and_close_hooks_run(self):
+        registry = ServiceRegistry()
+        attempts, closed = [], []
+
+        def flaky_factory():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ValueError("not configured")
+            return 'client'
+
+        registry.register('flaky', flaky_factory, close=closed.append)
+        with self.assertRaises(ValueError):
+            registry.get('flaky')
+        self.assertEqual(registry.get('flaky'), 'client')
+        self.assertEqual(registry.started(), ['flaky'])
+
+        registry.shutdown()
+        self.assertEqual((closed, registry.started()), (['client'], []))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+import unittest
+import datetime
+import tempfile
+import shutil
+import subprocess
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from services.database_service import Base, VisaApplication, Notification, StatCounter
+from services.application_store import upsert_applications
+from services.stats_counters import dashboard_stats, read_counters, reconcile
+
+class TestStatsCounters(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        engine = create_engine(f"sqlite:///{os.path.join(self.tmpdir, 'test.db')}", connect_args={"timeout": 30})
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, job):
+        session = self.Session()
+        try:
+            job(session)
+            session.commit()
+        finally:
+            session.close()
+
+    def counters(self, scope=''):
+        session = self.Session()
+        try:
+            return read_counters(session, scope)
+        finally:
+            session.close()
+
+    def test_counters_follow_orm_and_upsert_writes(self):
+        self.write(lambda s: upsert_applications(s, [
+            {'document_id': 'd1', 'file_name': 'a.pdf', 'applicant_id': '7', 'status': 'Needs Review', 'confidence_score': 50},
+            {'document_id': 'd2', 'file_name': 'b.pdf', 'status': 'Passed', 'confidence_score': 90}]))
+        self.write(lambda s: upsert_applications(s, [
+            {'document_id': 'd1', 'file_name': 'a.pdf', 'status': 'Passed', 'confidence_score': 95}]))
+        self.write(lambda s: s.add(VisaApplication(document_id='d3', file_name='c.pdf', status='Needs Review')))
+        self.write(lambda s: setattr(s.query(VisaApplication).filter_by(document_id='d2').one(), 'verification_status', 'verified'))
+        self.write(lambda s: s.delete(s.query(VisaApplication).filter_by(document_id='d3').one()))
+        self.write(lambda s: s.add(Notification(applicant_id='7', notification_type='expiry_30d', severity='high')))
+        self.write(lambda s: setattr(s.query(Notification).one(), 'read_at', datetime.datetime.now()))
+
+        self.assertEqual(dashboard_stats(self.Session), {'total': 2, 'passed': 2, 'needs_review': 0})
+        applicant = self.counters('7')
+        self.assertEqual((applicant['applications'], applicant['applications.confidence_sum'],
+                          applicant['notifications.type.expiry_30d'], applicant['notifications.unread']), (1, 95, 1, 0))
+        self.assertEqual(self.counters()['applications.verification.verified'], 1)
+        self.assertEqual(reconcile(self.Session), {})
+
+    def test_changes_to_expired_rows_move_counts(self):
+        # One session across commits, so the row is expired when its status is set
+        session = self.Session()
+        try:
+            application = VisaApplication(document_id='d1', file_name='a.pdf', applicant_id='7', status='Needs Review')
+            session.add(application)
+            session.commit()
+            application.status = 'Passed'
+            session.commit()
+            self.assertEqual((self.counters()['applications.status.Needs Review'],
+                              self.counters()['applications.status.Passed']), (0, 1))
+            session.delete(application)
+            session.commit()
+            session.add(Notification(applicant_id='7', notification_type='expiry_30d'))
+            session.commit()
+        finally:
+            session.close()
+
+        counters = self.counters()
+        self.assertEqual((counters['applications'], counters['applications.status.Needs Review'],
+                          counters['applications.status.Passed']), (0, 0, 0))
+        self.assertEqual(self.counters('7')['notifications'], 1)
+        self.assertEqual(reconcile(self.Session), {})
+
+    def test_reconcile_corrects_drift(self):
+        self.write(lambda s: upsert_applications(s, [{'document_id': 'd1', 'file_name': 'a.pdf', 'status': 'Passed'}]))
+        self.write(lambda s: s.query(StatCounter).filter(StatCounter.name == 'applications').update({'value': 40}))
+        self.write(lambda s: s.add(StatCounter(scope='gone', name='applications', value=3)))
+
+        self.assertEqual(reconcile(self.Session), {('', 'applications'): -39, ('gone', 'applications'): -3})
+        self.assertEqual(dashboard_stats(self.Session)['total'], 1)
+        self.assertEqual(self.counters('gone'), {})
+
+    def test_write_queue_can_be_imported_first(self):
+        # database_service registers the counters on import; that must not form a cycle with write_queue
+        root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+        result = subprocess.run([sys.executable, '-c', 'import services.write_queue'], cwd=root,
+                                capture_output=True, text=True, timeout=60,
+                                env=dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(self.tmpdir, 'import.db')}"))
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from services.database_service import Base, PipelineSpan
+from core.tracing import Tracer, stage_latency_percentiles
+
+class TestPipelineTracing(unittest.TestCase):
+
+    def setUp(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        self.Session = sessionmaker(bind=engine)
+        self.tracer = Tracer(session_factory=self.Session)
+        self.tracer.enabled = True
+
+    def test_spans_inherit_file_attributes_and_flush_with_trace(self):
+        # page_count is unknown (None) until extraction finds it
+        with self.tracer.trace("process_file", file_id="abc", file_name="passport.pdf", file_size=1024,
+                               page_count=None):
+            with self.tracer.span("extract") as extract_span:
+                extract_span.set(page_count=3)
+            with self.tracer.span("classify"):
+                pass
+
+        session = self.Session()
+        spans = {s.stage: s for s in session.query(PipelineSpan).all()}
+        session.close()
+
+        self.assertEqual(set(spans), {"process_file", "extract", "classify"})
+        self.assertEqual(spans["classify"].file_id, "abc")
+        self.assertEqual(spans["classify"].file_size, 1024)
+        # Page count discovered during extraction is visible to later stages
+        self.assertEqual(spans["classify"].page_count, 3)
+        self.assertEqual(spans["process_file"].page_count, 3)
+        self.assertEqual(spans["extract"].parent_span_id, spans["process_file"].span_id)
+
+    def test_errors_are_recorded_and_spans_outside_trace_are_dropped(self):
+        with self.tracer.span("render"):
+            pass
+
+        with self.assertRaises(ValueError):
+            with self.tracer.trace("process_file", file_id="xyz"):
+                with self.tracer.span("analyze"):
+                    raise ValueError("model unavailable")
+
+        session = self.Session()
+        spans = session.query(PipelineSpan).all()
+        session.close()
+
+        self.assertEqual(sorted(s.stage for s in spans), ["analyze", "process_file"])
+        self.assertTrue(all(s.outcome == "error" for s in spans))
+
+    def test_stage_latency_percentiles(self):
+        session = self.Session()
+        for duration in range(1, 101):
+            session.add(PipelineSpan(stage="ocr", duration_ms=float(duration), outcome="ok"))
+        session.add(PipelineSpan(stage="classify", duration_ms=5.0, outcome="error"))
+        session.commit()
+
+        report = stage_latency_percentiles(session)
+        session.close()
+
+        self.assertEqual(report["ocr"]["count"], 100)
+        self.assertEqual(report["ocr"]["p50_ms"], 50.0)
+        self.assertEqual(report["ocr"]["p95_ms"], 95.0)
+        self.assertEqual(report["classify"]["errors"], 1)
+
+if __name__ == '__main__':
+    unittest.main()
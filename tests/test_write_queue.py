@@ -0,0 +1,95 @@
+import unittest
+import threading
+import tempfile
+import shutil
+import sys
+import os
+
+# Add project root to sys.path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session, sessionmaker
+
+from services.database_service import Base, AuditLog, build_engine
+from services.write_queue import WriteQueue
+
+class TestWriteQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.engine = build_engine(f"sqlite:///{os.path.join(self.tmpdir, 'writes.db')}")
+        Base.metadata.create_all(bind=self.engine)
+        self.Session = sessionmaker(bind=self.engine)
+        # A long batching window so concurrent submits land in the same commit
+        self.writer = WriteQueue(self.Session, max_delay=0.2)
+
+    def tearDown(self):
+        self.engine.dispose()
+        shutil.rmtree(self.tmpdir)
+
+    def count(self):
+        session = self.Session()
+        try:
+            return session.query(AuditLog).count()
+        finally:
+            session.close()
+
+    def test_concurrent_writes_are_group_committed(self):
+        barrier = threading.Barrier(10)
+
+        def write(i):
+            barrier.wait()
+            self.writer.submit(lambda session: session.add(AuditLog(document_id=f"doc-{i}", action="test")))
+
+        threads = [threading.Thread(target=write, args=(i,)) for i in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(self.count(), 10)
+        self.assertLess(self.writer.stats['batches'], 10)
+
+    def test_failing_job_does_not_lose_its_batch(self):
+        def broken(session):
+            raise ValueError("bad row")
+
+        futures = [self.writer.submit(lambda session: session.add(AuditLog(document_id="ok-1")), wait=False),
+                   self.writer.submit(broken, wait=False),
+                   self.writer.submit(lambda session: session.add(AuditLog(document_id="ok-2")), wait=False)]
+
+        self.assertIsNone(futures[0].result(5))
+        with self.assertRaises(ValueError):
+            futures[1].result(5)
+        self.assertIsNone(futures[2].result(5))
+        self.assertEqual(self.count(), 2)
+
+    def test_writer_survives_a_failing_rollback(self):
+        class DroppedConnectionSession(Session):
+            def rollback(self):
+                raise OperationalError("ROLLBACK", {}, Exception("server closed the connection"))
+
+        writer = WriteQueue(sessionmaker(bind=self.engine, class_=DroppedConnectionSession), max_delay=0.01)
+
+        def broken(session):
+            raise ValueError("bad row")
+
+        with self.assertRaises(ValueError):
+            writer.submit(broken, timeout=5)
+        futures = [writer.submit(broken, wait=False),
+                   writer.submit(lambda session: session.add(AuditLog(document_id="ok")), wait=False)]
+        with self.assertRaises(ValueError):
+            futures[0].result(5)
+        self.assertIsNone(futures[1].result(5))
+        self.assertEqual(self.count(), 1)
+        self.assertTrue(writer._thread.is_alive())
+
+    def test_file_database_runs_in_wal_mode(self):
+        with self.engine.connect() as conn:
+            self.assertEqual(conn.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+            self.assertEqual(conn.execute(text("PRAGMA synchronous")).scalar(), 1)  # NORMAL
+
+if __name__ == '__main__':
+    unittest.main()
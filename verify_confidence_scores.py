@@ -4,8 +4,9 @@ Quick verification script to check if confidence scores are being saved
 import sys
 sys.path.insert(0, '/Users/berry/Antigravity/Australia Agent copy')
 
-from services.database_service import SessionLocal, VisaApplication
+from services.database_service import SessionLocal, VisaApplication, init_db
 
+init_db()
 db = SessionLocal()
 
 # Get recent documents
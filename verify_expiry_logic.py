@@ -54,4 +54,5 @@ def verify_expiry():
     db.close()
 
 if __name__ == "__main__":
+    init_db()
     verify_expiry()